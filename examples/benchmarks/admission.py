@@ -0,0 +1,85 @@
+"""
+Mix of jobs that share a node: `solve` jobs use a solver with two licenses
+(`max_concurrent=2`), `heavy` jobs claim 20 GB of a 64 GB node (`memory`) and
+many `tiny` jobs need nothing special. Without admission control all threads
+take whatever job comes next, so the licenses and memory are oversubscribed;
+with `resources` the jobs are only released when they fit, and the tiny jobs
+fill up the remaining threads.
+"""
+
+import argparse
+import threading
+import time
+
+import noodles
+from noodles.run.threading.vanilla import run_parallel
+
+
+class Usage:
+    lock = threading.Lock()
+    solvers = memory = max_solvers = max_memory = 0
+
+    @classmethod
+    def claim(cls, solvers, memory):
+        with cls.lock:
+            cls.solvers += solvers
+            cls.memory += memory
+            cls.max_solvers = max(cls.max_solvers, cls.solvers)
+            cls.max_memory = max(cls.max_memory, cls.memory)
+
+    @classmethod
+    def reset(cls):
+        cls.solvers = cls.memory = cls.max_solvers = cls.max_memory = 0
+
+
+@noodles.schedule_hint(max_concurrent=2)
+def solve(x, dt):
+    Usage.claim(1, 0)
+    time.sleep(dt)
+    Usage.claim(-1, 0)
+    return x
+
+
+@noodles.schedule_hint(memory=20)
+def heavy(x, dt):
+    Usage.claim(0, 20)
+    time.sleep(dt)
+    Usage.claim(0, -20)
+    return x
+
+
+@noodles.schedule
+def tiny(x, dt):
+    time.sleep(dt)
+    return x
+
+
+@noodles.schedule
+def total(xs):
+    return sum(xs)
+
+
+def mixed(n, dt):
+    return total(noodles.gather(
+        *(solve(1, dt) for _ in range(n)),
+        *(heavy(1, dt) for _ in range(n)),
+        *(tiny(1, dt / 10) for _ in range(10 * n))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=20)
+    parser.add_argument("-threads", type=int, default=8)
+    parser.add_argument("-dt", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print("{:>12} {:>10} {:>12} {:>12}".format(
+        "admission", "time (s)", "max solvers", "max GB"))
+    for resources in (None, {'memory': 64}):
+        Usage.reset()
+        start = time.perf_counter()
+        run_parallel(mixed(args.n, args.dt), n_threads=args.threads,
+                     resources=resources)
+        print("{:>12} {:>10.2f} {:>12} {:>12}".format(
+            str(resources is not None), time.perf_counter() - start,
+            Usage.max_solvers, Usage.max_memory))
@@ -0,0 +1,38 @@
+"""
+Measure the throughput of `run_process` for many tiny jobs, as a function
+of the number of jobs that are sent to (and from) the worker processes in a
+single message. Scheduled functions and the registry have to be importable
+by the workers, so we use the ones that come with Noodles.
+"""
+
+import argparse
+import time
+
+import noodles
+from noodles import serial
+from noodles.tutorial import add
+
+
+def run(n_jobs, n_processes, batch_size, batch_linger):
+    wf = noodles.gather(*(add(i, 1) for i in range(n_jobs)))
+
+    start = time.perf_counter()
+    noodles.run_process(
+        wf, n_processes=n_processes, registry=serial.base,
+        batch_size=batch_size, batch_linger=batch_linger)
+    return n_jobs / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-jobs", type=int, default=10000)
+    parser.add_argument("-processes", type=int, default=2)
+    parser.add_argument("-linger", type=float, default=0.01)
+    parser.add_argument(
+        "-sizes", type=int, nargs='+', default=[1, 10, 100, 1000])
+    args = parser.parse_args()
+
+    print("{:>8} {:>12}".format("batch", "jobs/s"))
+    for batch_size in args.sizes:
+        rate = run(args.jobs, args.processes, batch_size, args.linger)
+        print("{:>8} {:>12.0f}".format(batch_size, rate))
@@ -0,0 +1,66 @@
+"""
+Compare memory use of a `Workflow` and a `CompactWorkflow` holding the
+same graph: a tree of additions reduced by a single `gather`. Also times
+the conversion and running the compact form in a single thread.
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+import noodles
+from noodles.lib import Queue
+from noodles.run.scheduler import Scheduler
+from noodles.run.worker import worker
+from noodles.workflow import (get_workflow, CompactWorkflow)
+
+
+@noodles.schedule
+def add(a, b):
+    return a + b
+
+
+def make_workflow(n):
+    xs = [add(i, add(i, 1)) for i in range(n)]
+    return get_workflow(noodles.gather(*xs))
+
+
+def measure(n):
+    gc.collect()
+    tracemalloc.start()
+    wf = make_workflow(n)
+    gc.collect()
+    workflow_size = tracemalloc.get_traced_memory()[0]
+
+    cwf = CompactWorkflow.from_workflow(wf)
+    del wf
+    gc.collect()
+    compact_size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del cwf
+
+    wf = make_workflow(n)
+    start = time.perf_counter()
+    cwf = CompactWorkflow.from_workflow(wf)
+    convert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    Scheduler().run(Queue() >> worker, cwf)
+    run_time = time.perf_counter() - start
+
+    return workflow_size, compact_size, convert_time, run_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-sizes", type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print("{:>8} {:>12} {:>12} {:>10} {:>10}".format(
+        "nodes", "workflow", "compact", "convert", "run"))
+    for n in args.sizes:
+        w, c, t_convert, t_run = measure(n)
+        print("{:>8} {:>10.1f}MB {:>10.1f}MB {:>9.3f}s {:>9.3f}s".format(
+            2*n + 1, w / 2**20, c / 2**20, t_convert, t_run))
@@ -0,0 +1,64 @@
+"""
+Time the construction of workflows from scheduled calls: a deep chain, where
+every call takes the previous one as argument, and a balanced binary tree of
+additions. The time to collect the nodes and links (first access to
+`Workflow.nodes`) is reported separately.
+"""
+
+import argparse
+import time
+
+import noodles
+from noodles.workflow import get_workflow
+
+
+@noodles.schedule
+def inc(x):
+    return x + 1
+
+
+@noodles.schedule
+def add(a, b):
+    return a + b
+
+
+def chain(n):
+    x = inc(0)
+    for _ in range(n - 1):
+        x = inc(x)
+    return x
+
+
+def tree(n):
+    xs = [inc(i) for i in range(n)]
+    while len(xs) > 1:
+        xs = [add(*xs[i:i+2]) if i + 1 < len(xs) else xs[i]
+              for i in range(0, len(xs), 2)]
+    return xs[0]
+
+
+def measure(build, n):
+    start = time.perf_counter()
+    wf = get_workflow(build(n))
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    n_nodes = len(wf.nodes)
+    resolve_time = time.perf_counter() - start
+
+    return n_nodes, build_time, resolve_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-sizes", type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    print("{:>6} {:>8} {:>10} {:>10}".format(
+        "shape", "nodes", "build", "resolve"))
+    for build in [chain, tree]:
+        for n in args.sizes:
+            n_nodes, t_build, t_resolve = measure(build, n)
+            print("{:>6} {:>8} {:>9.3f}s {:>9.3f}s".format(
+                build.__name__, n_nodes, t_build, t_resolve))
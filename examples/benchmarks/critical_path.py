@@ -0,0 +1,69 @@
+"""
+Makespan of unbalanced workflows with and without critical-path priorities:
+a chain of `chain` jobs runs next to `width` independent jobs of the same
+duration. In order of arrival, every next step of the chain waits behind
+the independent jobs that are ready; with a `CriticalPath` the chain goes
+first and the independent jobs fill up the other workers.
+"""
+
+import argparse
+import time
+
+import noodles
+from noodles import serial
+from noodles.run.priority import CriticalPath
+from noodles.run.threading.vanilla import run_parallel
+
+
+@noodles.schedule
+def work(x, dt):
+    time.sleep(dt)
+    return x + 1
+
+
+@noodles.schedule
+def total(xs):
+    return sum(xs)
+
+
+def unbalanced(width, chain, dt):
+    short = [work(i, dt) for i in range(width)]
+    x = 0
+    for _ in range(chain):
+        x = work(x, dt)
+    return total(noodles.gather(*short, x))
+
+
+def run(args, priority):
+    wf = unbalanced(args.width, args.chain, args.dt)
+    start = time.perf_counter()
+    if args.processes:
+        noodles.run_process(
+            wf, n_processes=args.processes, registry=serial.base,
+            selector='least-loaded', max_in_flight=1, priority=priority)
+    else:
+        run_parallel(wf, n_threads=args.threads, priority=priority)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-width", type=int, default=100)
+    parser.add_argument("-chain", type=int, default=25)
+    parser.add_argument("-threads", type=int, default=4)
+    parser.add_argument("-processes", type=int, default=0,
+                        help="run in this many processes in stead of threads")
+    parser.add_argument("-dt", type=float, default=0.02)
+    args = parser.parse_args()
+
+    # the pilot job looks up `work` by module name, which can't be __main__
+    from critical_path import unbalanced
+
+    n = args.processes or args.threads
+    print("lower bound: {:.2f} s".format(
+        max(args.chain, (args.width + args.chain) / n) * args.dt))
+    print("{:>10} {:>10}".format("priority", "time (s)"))
+    for priority in (None, CriticalPath()):
+        duration = run(args, priority)
+        print("{:>10} {:>10.2f}".format(
+            'critical' if priority else 'fifo', duration))
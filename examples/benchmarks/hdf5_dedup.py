@@ -0,0 +1,37 @@
+"""
+Time encoding arrays with `arrays_to_hdf5` as the number of arrays already
+stored in the HDF5 file grows. Each encode looks up the hash of the array
+in the file before storing it.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy
+
+from noodles import serial
+from noodles.serial.numpy import arrays_to_hdf5
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-arrays", type=int, default=20000)
+    parser.add_argument("-size", type=int, default=100)
+    parser.add_argument("-every", type=int, default=5000)
+    parser.add_argument("-keep-open", action='store_true')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir='.') as tmp:
+        reg = serial.base() + arrays_to_hdf5(
+            os.path.join(tmp, 'cache.hdf5'), keep_open=args.keep_open)
+
+        print("{:>10} {:>14}".format("arrays", "ms / encode"))
+        start = time.perf_counter()
+        for i in range(1, args.arrays + 1):
+            reg.deep_encode(numpy.random.random(args.size))
+            if i % args.every == 0:
+                t = time.perf_counter() - start
+                print("{:>10} {:>14.3f}".format(i, t / args.every * 1000))
+                start = time.perf_counter()
@@ -0,0 +1,51 @@
+"""
+Peak memory of the scheduler on a wide `gather` of jobs that are all ready
+at once. Without a window, every job is registered and put on the job queue
+as a `JobMessage` up front; with a `window`, at most that many jobs are in
+flight and the others wait in the scheduler as `(workflow, node)` pairs.
+"""
+
+import argparse
+import time
+import tracemalloc
+from itertools import repeat
+
+import noodles
+from noodles.lib import Queue, thread_pool
+from noodles.run.scheduler import Scheduler
+from noodles.run.worker import worker
+from noodles.workflow import get_workflow
+
+
+@noodles.schedule
+def inc(x):
+    return x + 1
+
+
+def run(args, window):
+    wf = get_workflow(noodles.gather(*(inc(i) for i in range(args.n))))
+    maxsize = window or 0
+    threaded_worker = Queue(maxsize=maxsize) >> thread_pool(
+        *repeat(worker, args.threads), maxsize=maxsize)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    Scheduler(window=window).run(threaded_worker, wf)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20, duration
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100000)
+    parser.add_argument("-threads", type=int, default=4)
+    parser.add_argument("-window", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("{:>10} {:>14} {:>10}".format("window", "peak (MB)", "time (s)"))
+    for window in (None, args.window):
+        peak, duration = run(args, window)
+        print("{:>10} {:>14.1f} {:>10.2f}".format(
+            str(window), peak, duration))
@@ -0,0 +1,78 @@
+"""
+Measure time and peak memory of writing a large result message through
+`JSONObjectWriter` and reading it back with `JSONObjectReader`, compared to
+building the encoded tree first (the `tree` method), as `to_json` and
+`from_json` used to do.
+"""
+
+import argparse
+import io
+import time
+import tracemalloc
+
+from noodles import serial
+from noodles.run.messages import ResultMessage
+from noodles.run.remote.io import (JSONObjectReader, JSONObjectWriter)
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+
+def large_result(n):
+    return ResultMessage(
+        'key', 'done',
+        [{'index': i, 'label': 'item {}'.format(i), 'pair': (i, -i),
+          'values': [i * 0.25] * 20} for i in range(n)],
+        None)
+
+
+def peak_memory(f):
+    tracemalloc.start()
+    f()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20
+
+
+def timed(f):
+    start = time.perf_counter()
+    f()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100000)
+    args = parser.parse_args()
+
+    reg = serial.base()
+    msg = large_result(args.n)
+
+    def tree_write():
+        fo = io.StringIO()
+        print(json.dumps(reg.deep_encode(msg)), file=fo)
+        return fo
+
+    def stream_write():
+        fo = io.StringIO()
+        JSONObjectWriter(reg, fo).send(msg)
+        return fo
+
+    line = stream_write().getvalue()
+
+    def tree_read():
+        reg.deep_decode(json.loads(line), deref=True)
+
+    def stream_read():
+        list(JSONObjectReader(reg, io.StringIO(line), deref=True))
+
+    print("{:>8} {:>12} {:>10} {:>16}".format(
+        "", "method", "time (s)", "peak mem (MB)"))
+    for name, method, f in [("write", "tree", tree_write),
+                            ("write", "stream", stream_write),
+                            ("read", "tree", tree_read),
+                            ("read", "stream", stream_read)]:
+        print("{:>8} {:>12} {:>10.3f} {:>16.1f}".format(
+            name, method, timed(f), peak_memory(f)))
@@ -0,0 +1,51 @@
+"""
+Time decoding a large array from file and reading a small slice from it,
+with and without memory mapping, for the `arrays_to_file` and
+`arrays_to_hdf5` registries. Files are written to the current directory;
+drop the page cache between runs (or use an array larger than memory) to
+see the effect of cold reads.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy
+
+from noodles import serial
+from noodles.serial.numpy import (arrays_to_file, arrays_to_hdf5)
+
+
+def run(registry, a, window):
+    reg = serial.base() + registry
+    rec = reg.to_json(a)
+
+    start = time.perf_counter()
+    b = reg.from_json(rec, deref=True)
+    b[:window].sum()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-size", type=float, default=2.0, help="array size in GB")
+    parser.add_argument(
+        "-window", type=int, default=1000,
+        help="number of elements read from the decoded array")
+    args = parser.parse_args()
+
+    a = numpy.random.random(int(args.size * 2**30 / 8))
+
+    with tempfile.TemporaryDirectory(dir='.') as tmp:
+        prefix = os.path.join(tmp, '')
+        hdf5 = os.path.join(tmp, 'cache.hdf5')
+
+        print("{:>8} {:>8} {:>10}".format("format", "mmap", "time (s)"))
+        for mmap in [False, True]:
+            t = run(arrays_to_file(prefix, mmap=mmap), a, args.window)
+            print("{:>8} {:>8} {:>10.3f}".format("npy", str(mmap), t))
+        for mmap in [False, True]:
+            t = run(arrays_to_hdf5(hdf5, mmap=mmap), a, args.window)
+            print("{:>8} {:>8} {:>10.3f}".format("hdf5", str(mmap), t))
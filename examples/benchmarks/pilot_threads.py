@@ -0,0 +1,53 @@
+"""
+Run jobs in a single pilot job process, one at a time, in several threads,
+or in a pool of processes. Sleeping jobs (waiting for I/O) run well in
+threads; jobs computing in Python need processes, because of the GIL.
+"""
+
+import argparse
+import time
+
+import noodles
+from noodles import serial
+
+
+@noodles.schedule
+def sleep(t):
+    time.sleep(t)
+    return t
+
+
+@noodles.schedule
+def count(n):
+    return sum(i * i for i in range(n))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-jobs", type=int, default=32)
+    parser.add_argument("-threads", type=int, default=4)
+    args = parser.parse_args()
+
+    # the pilot job looks up the functions by module name
+    from pilot_threads import sleep, count
+
+    workloads = {
+        'sleep': lambda: noodles.gather(
+            *(sleep(0.05) for _ in range(args.jobs))),
+        'compute': lambda: noodles.gather(
+            *(count(1000000) for _ in range(args.jobs)))}
+
+    modes = [
+        ('one at a time', dict(n_threads=1)),
+        ('threads', dict(n_threads=args.threads)),
+        ('processes', dict(n_threads=args.threads, subprocesses=True))]
+
+    print("{:>14} {:>10} {:>12}".format("mode", "sleep (s)", "compute (s)"))
+    for name, options in modes:
+        times = []
+        for workload in workloads.values():
+            start = time.perf_counter()
+            noodles.run_process(workload(), n_processes=1,
+                                registry=serial.base, **options)
+            times.append(time.perf_counter() - start)
+        print("{:>14} {:>10.2f} {:>12.2f}".format(name, *times))
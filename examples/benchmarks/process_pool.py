@@ -0,0 +1,59 @@
+"""
+Compare `run_process` (pilot job subprocesses talking JSON, random choice of
+worker) with `run_pool` (multiprocessing workers, pickled messages, least
+loaded dispatch), on many tiny jobs and on jobs of uneven duration.
+"""
+
+import argparse
+import time
+
+import noodles
+from noodles import serial
+from noodles.run.pool import run_pool
+from noodles.tutorial import add
+
+
+@noodles.schedule
+def sleep(t):
+    time.sleep(t)
+    return t
+
+
+def tiny(n):
+    return noodles.gather(*(add(i, 1) for i in range(n)))
+
+
+def uneven(n):
+    return noodles.gather(*(sleep(0.2 if i % 10 == 0 else 0.01)
+                            for i in range(n)))
+
+
+def timeit(run, wf):
+    start = time.perf_counter()
+    run(wf)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-jobs", type=int, default=1000)
+    parser.add_argument("-processes", type=int, default=4)
+    args = parser.parse_args()
+
+    # the pilot job looks up `sleep` by module name, which can't be __main__
+    from process_pool import tiny, uneven
+
+    runners = {
+        'run_process': lambda wf: noodles.run_process(
+            wf, n_processes=args.processes, registry=serial.base),
+        'run_pool': lambda wf: run_pool(
+            wf, n_processes=args.processes),
+        'run_pool json': lambda wf: run_pool(
+            wf, n_processes=args.processes, registry=serial.base,
+            transport='json')}
+
+    print("{:>14} {:>12} {:>12}".format("runner", "tiny (s)", "uneven (s)"))
+    for name, run in runners.items():
+        print("{:>14} {:>12.2f} {:>12.2f}".format(
+            name, timeit(run, tiny(args.jobs)),
+            timeit(run, uneven(args.jobs // 10))))
@@ -0,0 +1,56 @@
+"""
+Measure the cost of computing the provenance key of a job, as a function of
+the size of a Numpy array argument: hashing the fully encoded job (as done
+before content hashes), against hashing the job with the array replaced by
+its content hash, for the available hash functions.
+"""
+
+import argparse
+import hashlib
+import time
+
+import numpy
+
+from noodles import serial
+from noodles.prov.key import (prov_key, hash_functions, json)
+from noodles.tutorial import add
+
+
+def encoded_key(registry, node):
+    msg = registry.deep_encode(node)
+    m = hashlib.md5()
+    for x in [msg['data']['function'], msg['data']['arguments'],
+              msg['data']['hints']['version']]:
+        m.update(json.dumps(x, sort_keys=True).encode())
+    return m.hexdigest()
+
+
+def timeit(f, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - start) / repeat * 1e3
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-max-size", type=int, default=10**7)
+    parser.add_argument("-repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    registry = serial.base() + serial.numpy()
+    names = sorted(hash_functions)
+    print(("{:>10} {:>12}" + " {:>12}" * len(names)).format(
+        "elements", "encoded (ms)", *names))
+
+    size = 1000
+    while size <= args.max_size:
+        node = add(numpy.random.random(size), 1)._workflow.root_node
+        times = [timeit(lambda: encoded_key(registry, node), args.repeat)]
+        for name in names:
+            times.append(timeit(lambda: prov_key(
+                registry.hash_encode(node), hash_function=name),
+                args.repeat))
+        print(("{:>10} {:>12.2f}" + " {:>12.2f}" * len(names)).format(
+            size, *times))
+        size *= 10
@@ -0,0 +1,74 @@
+"""
+Measure the cost of provenance keys for a deep workflow of shared
+subworkflows (a Fibonacci-like graph with array leaves): computing global
+provenance keys before the run, then the local key of each job when it is
+dispatched, as the Sqlite3 job database does. Compare to computing each key
+anew every time, which is what happened before keys were cached on the
+nodes.
+"""
+
+import argparse
+import time
+
+import numpy
+
+from noodles import serial
+from noodles.prov.workflow import (set_global_provenance, node_prov_key)
+from noodles.tutorial import add
+from noodles.workflow import (
+    insert_result, is_node_ready, get_workflow)
+
+
+class CountingRegistry:
+    """Counts calls to `hash_encode`."""
+    def __init__(self, registry):
+        self.registry = registry
+        self.count = 0
+
+    def hash_encode(self, obj):
+        self.count += 1
+        return self.registry.hash_encode(obj)
+
+    def __getattr__(self, name):
+        return getattr(self.registry, name)
+
+
+def fib(depth, size):
+    a = numpy.ones(size)
+    b = numpy.ones(size)
+    for _ in range(depth):
+        a, b = b, add(a, b)
+    return get_workflow(b)
+
+
+def run(wf, registry, memo):
+    set_global_provenance(wf, registry)
+
+    done = set()
+    while len(done) < len(wf.nodes):
+        for i, n in wf.nodes.items():
+            if i in done or not is_node_ready(n):
+                continue
+            if not memo:
+                n.local_prov = None
+            node_prov_key(n, registry)
+            result = n.apply()
+            for tgt, address in wf.links[i]:
+                insert_result(wf.nodes[tgt], address, result)
+            done.add(i)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-depth", type=int, default=200)
+    parser.add_argument("-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    print("{:>8} {:>10} {:>12}".format("memo", "time (s)", "encodings"))
+    for memo in [False, True]:
+        registry = CountingRegistry(serial.base() + serial.numpy())
+        wf = fib(args.depth, args.size)
+        start = time.perf_counter()
+        run(wf, registry, memo)
+        print("{:>8} {:>10.3f} {:>12}".format(
+            str(memo), time.perf_counter() - start, registry.count))
@@ -0,0 +1,49 @@
+"""
+Time `Registry.to_json` and `Registry.from_json` on large nested
+structures: plain JSON data, containers holding many objects that need a
+serialiser.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from noodles import serial
+
+
+def plain(n):
+    return [{'id': i, 'name': str(i), 'values': [i * 0.5] * 10,
+             'ok': True, 'none': None} for i in range(n)]
+
+
+def objects(n):
+    return [{'path': Path('/tmp') / str(i),
+             'pair': (i, str(i)), 'set': {i}} for i in range(n)]
+
+
+def run(reg, data, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        text = reg.to_json(data)
+    t_encode = (time.perf_counter() - start) / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        reg.from_json(text, deref=True)
+    t_decode = (time.perf_counter() - start) / repeat
+
+    return t_encode, t_decode
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=10000)
+    parser.add_argument("-repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    reg = serial.base()
+    print("{:>10} {:>12} {:>12}".format("data", "encode (s)", "decode (s)"))
+    for name, data in [('plain', plain(args.n)),
+                       ('objects', objects(args.n))]:
+        t_encode, t_decode = run(reg, data, args.repeat)
+        print("{:>10} {:>12.4f} {:>12.4f}".format(name, t_encode, t_decode))
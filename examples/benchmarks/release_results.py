@@ -0,0 +1,68 @@
+"""
+Peak memory of a wide map-then-reduce workflow: every item goes through a
+pipeline of `stages` jobs, each producing a new buffer, and the sizes are
+summed at the end. The scheduler runs the jobs breadth first, so without
+`release_results` all buffers of all stages are alive at the end; with it,
+a buffer is freed once the next stage is done with it.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import noodles
+from noodles.lib import Queue
+from noodles.run.scheduler import Scheduler
+from noodles.run.worker import worker
+from noodles.workflow import get_workflow
+
+
+@noodles.schedule
+def load(i, size):
+    return bytearray(size)
+
+
+@noodles.schedule
+def transform(data):
+    return bytearray(len(data))
+
+
+@noodles.schedule
+def total(data):
+    return sum(len(x) for x in data)
+
+
+def map_reduce(width, stages, size):
+    items = [load(i, size) for i in range(width)]
+    for _ in range(stages - 1):
+        items = [transform(x) for x in items]
+    return total(noodles.gather(*items))
+
+
+def run(args, release_results):
+    wf = get_workflow(map_reduce(args.width, args.stages, args.size << 20))
+    scheduler = Scheduler(release_results=release_results)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    scheduler.run(Queue() >> worker, wf)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20, duration
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-width", type=int, default=50)
+    parser.add_argument("-stages", type=int, default=4)
+    parser.add_argument("-size", type=int, default=4,
+                        help="size of each buffer in megabytes")
+    args = parser.parse_args()
+
+    print("{:>16} {:>14} {:>10}".format(
+        "release_results", "peak (MB)", "time (s)"))
+    for release_results in (False, True):
+        peak, duration = run(args, release_results)
+        print("{:>16} {:>14.1f} {:>10.2f}".format(
+            str(release_results), peak, duration))
@@ -0,0 +1,77 @@
+"""
+Peak memory of a workflow whose intermediate results wait for a slow input:
+`width` buffers are loaded, and each is combined with the next step of a
+chain of `width` jobs. The scheduler loads all buffers before the chain gets
+far, so even with `release_results` all buffers are alive at once. With a
+`memory_budget`, the buffers above the budget are written to disk until
+their turn comes.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import noodles
+from noodles.lib import Queue
+from noodles.run.scheduler import Scheduler
+from noodles.run.spill import ResultStore
+from noodles.run.worker import worker
+from noodles.workflow import get_workflow
+
+
+@noodles.schedule
+def load(i, size):
+    return bytearray(size)
+
+
+@noodles.schedule
+def step(i, previous):
+    return previous + i
+
+
+@noodles.schedule
+def combine(data, n):
+    return len(data) + n
+
+
+def waiting(width, size):
+    chain = [0]
+    for i in range(1, width):
+        chain.append(step(i, chain[-1]))
+    return noodles.gather(*(combine(load(i, size), c)
+                            for i, c in enumerate(chain)))
+
+
+def run(args, memory_budget):
+    wf = get_workflow(waiting(args.width, args.size << 20))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    if memory_budget is None:
+        Scheduler(release_results=True).run(Queue() >> worker, wf)
+        spilled = 0
+    else:
+        with ResultStore(memory_budget) as store:
+            Scheduler(result_store=store).run(Queue() >> worker, wf)
+            spilled = store.n_spilled
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 2**20, duration, spilled
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-width", type=int, default=50)
+    parser.add_argument("-size", type=int, default=4,
+                        help="size of each buffer in megabytes")
+    parser.add_argument("-budget", type=int, default=32,
+                        help="memory budget in megabytes")
+    args = parser.parse_args()
+
+    print("{:>14} {:>14} {:>10} {:>10}".format(
+        "budget (MB)", "peak (MB)", "time (s)", "spilled"))
+    for memory_budget in (None, args.budget << 20):
+        peak, duration, spilled = run(args, memory_budget)
+        print("{:>14} {:>14.1f} {:>10.2f} {:>10}".format(
+            str(memory_budget and args.budget), peak, duration, spilled))
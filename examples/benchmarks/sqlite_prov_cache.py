@@ -0,0 +1,63 @@
+"""
+Measure the cost of looking up jobs in a job database that already holds
+many results with large values, for jobs that were run before and for new
+jobs, with and without the in-memory provenance cache.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from noodles import serial
+from noodles.prov.sqlite import JobDB
+from noodles.run.messages import ResultMessage
+from noodles.run.scheduler import Job
+from noodles.tutorial import add
+
+
+def job(i):
+    wf = add(i, 1)
+    return Job(wf._workflow, wf._workflow.root)
+
+
+def fill(path, n_stored, result_size):
+    with JobDB(path, serial.base, cache=False) as db:
+        value = 'x' * result_size
+        for i in range(n_stored):
+            key, node = db.register(job(i))
+            db.add_job_to_db(key, node)
+            db.store_result_in_db(ResultMessage(key, 'done', value, None))
+
+
+def lookup(path, cache, jobs):
+    with JobDB(path, serial.base, cache=cache) as db:
+        start = time.perf_counter()
+        for i in jobs:
+            key, node = db.register(job(i))
+            db.add_job_to_db(key, node)
+        elapsed = time.perf_counter() - start
+        stats = db.cache.stats() if db.cache else {}
+    return elapsed / len(jobs) * 1e6, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-stored", type=int, default=5000)
+    parser.add_argument("-jobs", type=int, default=2000)
+    parser.add_argument("-result-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir='.') as tmp:
+        path = os.path.join(tmp, 'cache.db')
+        fill(path, args.stored, args.result_size)
+
+        print("{:>8} {:>8} {:>14}  {}".format(
+            "jobs", "cache", "us/lookup", "counters"))
+        for name, jobs in [
+                ("new", range(args.stored, args.stored + args.jobs)),
+                ("stored", [i % 100 for i in range(args.jobs)])]:
+            for cache in [False, True]:
+                t, stats = lookup(path, cache, jobs)
+                print("{:>8} {:>8} {:>14.1f}  {}".format(
+                    name, str(cache), t, stats))
@@ -0,0 +1,76 @@
+"""
+Compare a job database with results stored in the "jobs" table to one with
+large results in the content-addressed "results" table: the size of the
+database file, the time to open a session (which scans the "jobs" table to
+fill the provenance cache), and the time to look up new jobs and to list all
+jobs.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from noodles import serial
+from noodles.prov.sqlite import JobDB
+from noodles.run.messages import ResultMessage
+from noodles.run.scheduler import Job
+from noodles.tutorial import add
+
+
+def job(i):
+    wf = add(i, 1)
+    return Job(wf._workflow, wf._workflow.root)
+
+
+def fill(path, n_jobs, n_distinct, result_size, **kwargs):
+    values = [str(i) * result_size for i in range(n_distinct)]
+    with JobDB(path, serial.base, cache=False, **kwargs) as db:
+        for i in range(n_jobs):
+            key, node = db.register(job(i))
+            db.add_job_to_db(key, node)
+            db.store_result_in_db(ResultMessage(
+                key, 'done', values[i % n_distinct], None))
+
+
+def measure(path, n_lookups, offset):
+    start = time.perf_counter()
+    with JobDB(path, serial.base):
+        t_open = time.perf_counter() - start
+
+    with JobDB(path, serial.base, cache=False) as db:
+        start = time.perf_counter()
+        for i in range(offset, offset + n_lookups):
+            key, node = db.register(job(i))
+            db.add_job_to_db(key, node)
+        t_lookup = (time.perf_counter() - start) / n_lookups * 1e6
+
+        start = time.perf_counter()
+        db.list_jobs()
+        t_list = time.perf_counter() - start
+
+    return t_open, t_lookup, t_list
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-jobs", type=int, default=5000)
+    parser.add_argument("-distinct", type=int, default=10)
+    parser.add_argument("-result-size", type=int, default=100000)
+    parser.add_argument("-lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("{:>10} {:>10} {:>10} {:>14} {:>10}".format(
+        "storage", "size (MB)", "open (s)", "us/lookup", "list (s)"))
+    for name, kwargs in [
+            ("inline", {'blob_size': float('inf')}),
+            ("blobs", {}),
+            ("zlib", {'compress': True})]:
+        with tempfile.TemporaryDirectory(dir='.') as tmp:
+            path = os.path.join(tmp, 'cache.db')
+            fill(path, args.jobs, args.distinct, args.result_size, **kwargs)
+            size = os.path.getsize(path) / 2**20
+            t_open, t_lookup, t_list = measure(
+                path, args.lookups, args.jobs)
+            print("{:>10} {:>10.1f} {:>10.3f} {:>14.1f} {:>10.3f}".format(
+                name, size, t_open, t_lookup, t_list))
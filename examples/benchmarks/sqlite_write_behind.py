@@ -0,0 +1,38 @@
+"""
+Measure the throughput of the Sqlite3 runner for many tiny jobs, with the
+job database written directly and through the write-behind thread.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import noodles
+from noodles import serial
+from noodles.run.threading.sqlite3 import run_parallel
+from noodles.tutorial import add
+
+
+def run(n_jobs, n_threads, write_behind):
+    wf = noodles.gather(*(add(i, 1) for i in range(n_jobs)))
+
+    with tempfile.TemporaryDirectory(dir='.') as tmp:
+        start = time.perf_counter()
+        run_parallel(
+            wf, n_threads=n_threads, registry=serial.base,
+            db_file=os.path.join(tmp, 'cache.db'), echo_log=False,
+            always_cache=True, write_behind=write_behind)
+        return n_jobs / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-jobs", type=int, default=10000)
+    parser.add_argument("-threads", type=int, default=4)
+    args = parser.parse_args()
+
+    print("{:>14} {:>12}".format("write behind", "jobs/s"))
+    for write_behind in [False, True]:
+        rate = run(args.jobs, args.threads, write_behind)
+        print("{:>14} {:>12.0f}".format(str(write_behind), rate))
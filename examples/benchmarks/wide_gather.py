@@ -0,0 +1,42 @@
+"""
+Benchmark the scheduler on a wide `gather`. Every result that comes in is
+inserted into the single gathering node; with `count_pending=False` the
+scheduler then scans all arguments of that node to see if it is ready,
+making the run quadratic in the width of the gather.
+"""
+
+import argparse
+import time
+
+import noodles
+from noodles.lib import Queue
+from noodles.run.scheduler import Scheduler
+from noodles.run.worker import worker
+from noodles.workflow import get_workflow
+
+
+@noodles.schedule
+def identity(x):
+    return x
+
+
+def run(n, count_pending):
+    wf = noodles.gather(*(identity(i) for i in range(n)))
+    scheduler = Scheduler(count_pending=count_pending)
+
+    start = time.perf_counter()
+    scheduler.run(Queue() >> worker, get_workflow(wf))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-sizes", type=int, nargs='+',
+        default=[1000, 2000, 5000, 10000, 20000])
+    args = parser.parse_args()
+
+    print("{:>8} {:>12} {:>12}".format("width", "counted", "scanned"))
+    for n in args.sizes:
+        print("{:>8} {:>11.3f}s {:>11.3f}s".format(
+            n, run(n, True), run(n, False)))
@@ -0,0 +1,62 @@
+"""
+Compare the JSON and MessagePack wire formats, by streaming result messages
+holding NumPy arrays through an in-memory file. Reports the time to encode
+and decode all messages and the number of bytes on the wire.
+"""
+
+import argparse
+import io
+import time
+import uuid
+
+import numpy
+
+from noodles import serial
+from noodles.run.messages import ResultMessage
+from noodles.run.remote.io import get_format
+
+
+def registry():
+    return serial.base() + serial.numpy()
+
+
+def run(format, messages):
+    reader, writer, binary = get_format(format)
+    f = io.BytesIO() if binary else io.StringIO()
+    reg = registry()
+
+    start = time.perf_counter()
+    sink = writer(reg, f)
+    for msg in messages:
+        sink.send(msg)
+    f.seek(0)
+    for _ in reader(reg, f, deref=True):
+        pass
+    elapsed = time.perf_counter() - start
+
+    size = len(f.getvalue())
+    if not binary:
+        size = len(f.getvalue().encode())
+    return elapsed, size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-messages", type=int, default=1000)
+    parser.add_argument(
+        "-sizes", type=int, nargs='+', default=[10, 1000, 100000])
+    parser.add_argument(
+        "-formats", type=str, nargs='+', default=['json', 'msgpack'])
+    args = parser.parse_args()
+
+    print("{:>8} {:>8} {:>10} {:>14}".format(
+        "size", "format", "time (s)", "bytes"))
+    for size in args.sizes:
+        messages = [
+            ResultMessage(uuid.uuid4().hex, 'done',
+                          numpy.random.random(size), None)
+            for _ in range(args.messages)]
+        for format in args.formats:
+            elapsed, n_bytes = run(format, messages)
+            print("{:>8} {:>8} {:>10.3f} {:>14}".format(
+                size, format, elapsed, n_bytes))
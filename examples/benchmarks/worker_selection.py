@@ -0,0 +1,56 @@
+"""
+Compare the worker selectors of `run_process` on jobs of uneven duration:
+every tenth job takes twenty times longer than the others. With a random
+choice of worker, some workers end up with several long jobs.
+"""
+
+import argparse
+import time
+
+import noodles
+from noodles import serial
+
+
+@noodles.schedule
+def sleep(t):
+    time.sleep(t)
+    return t
+
+
+def uneven(n, dt):
+    return noodles.gather(*(sleep(20 * dt if i % 10 == 0 else dt)
+                            for i in range(n)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-jobs", type=int, default=200)
+    parser.add_argument("-processes", type=int, default=4)
+    parser.add_argument("-dt", type=float, default=0.005)
+    args = parser.parse_args()
+
+    # the pilot job looks up `sleep` by module name, which can't be __main__
+    from worker_selection import uneven
+
+    selectors = [
+        ('random', None), ('round-robin', None), ('least-loaded', None),
+        ('least-loaded', 1), ('work-stealing', 1)]
+
+    start = time.perf_counter()
+    noodles.run_process(uneven(args.processes, 0.0),
+                        n_processes=args.processes, registry=serial.base)
+    print("startup: {:.2f} s".format(time.perf_counter() - start))
+
+    ideal = args.dt * (args.jobs // 10 * 20 + args.jobs - args.jobs // 10) \
+        / args.processes
+    print("ideal, without startup: {:.2f} s".format(ideal))
+    print("{:>14} {:>14} {:>10}".format(
+        "selector", "max_in_flight", "time (s)"))
+    for selector, max_in_flight in selectors:
+        start = time.perf_counter()
+        noodles.run_process(
+            uneven(args.jobs, args.dt), n_processes=args.processes,
+            registry=serial.base, selector=selector,
+            max_in_flight=max_in_flight)
+        print("{:>14} {:>14} {:>10.2f}".format(
+            selector, str(max_in_flight), time.perf_counter() - start))
@@ -5,7 +5,7 @@ import sys
 import inspect
 import operator
 
-from ..workflow import (from_call, get_workflow)
+from ..workflow import (from_call, get_workflow, capture)
 from .maybe import (maybe)
 from ..lib import (decorator)
 from noodles.config import config
@@ -34,7 +34,7 @@ def scheduled_function(f, hints=None):
     @wraps(f)
     def wrapped(*args, **kwargs):
         return PromisedObject(from_call(
-            f, args, kwargs, deepcopy(hints),
+            f, args, kwargs, capture(hints),
             call_by_value=config['call_by_value']))
 
     # add *(scheduled)* to the beginning of the docstring.
@@ -144,8 +144,7 @@ def update_hints(obj, data):
 
     The hints are modified, in place, on the node. All workflows that contain
     the node are affected."""
-    root = obj._workflow.root
-    obj._workflow.nodes[root].hints.update(data)
+    obj._workflow.root_node.hints.update(data)
 
 
 def result(obj):
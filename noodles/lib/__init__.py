@@ -129,7 +129,7 @@ from .connection import (
     Connection)
 
 from .queue import (
-    Queue, EndOfQueue, FlushQueue)
+    Queue, PriorityQueue, EndOfQueue, FlushQueue)
 
 from .thread_pool import (
     thread_counter, thread_pool)
@@ -142,7 +142,7 @@ __all__ = [
     'decorator', 'coroutine',
     'stream', 'pull', 'push', 'pull_map', 'push_map', 'sink_map',
     'broadcast', 'branch', 'patch', 'pull_from', 'push_from',
-    'Connection', 'Queue', 'EndOfQueue', 'FlushQueue',
+    'Connection', 'Queue', 'PriorityQueue', 'EndOfQueue', 'FlushQueue',
     'thread_pool', 'thread_counter',
     'object_name', 'look_up', 'importable', 'deep_map', 'inverse_deep_map',
     'unwrap', 'is_unwrapped']
@@ -1,4 +1,7 @@
 import queue
+from heapq import (heappush, heappop)
+from itertools import count
+
 from .streams import (push, pull)
 from .connection import Connection
 
@@ -28,16 +31,23 @@ class Queue(Connection):
         queue for other sources to pick up. This way, if many threads are
         pulling from this queue, they all get the `end-of-queue` message.
 
+    If `maxsize` is given, the queue holds at most that many items: sending
+    to the sink blocks until there is room, so that a fast producer can't
+    outgrow the memory. Mind that the producer may not be the one that has
+    to make room, or it waits forever.
+
     .. |Queue| replace:: :py:class:`Queue`
     """
-    def __init__(self, end_of_queue=EndOfQueue):
+    def __init__(self, end_of_queue=EndOfQueue, maxsize=0):
         """
         :param end_of_queue: When this object is encountered in both
         the sink and the source, their respective loops are terminated.
         Equality is checked using `is`; usualy this is a stub class
         designed especially for this purpose.
+        :param maxsize: maximum number of items in the queue; unbounded if
+        zero.
         """
-        self._queue = queue.Queue()
+        self._queue = queue.Queue(maxsize)
         self._end_of_queue = end_of_queue
         self._flush_queue = FlushQueue
 
@@ -85,3 +95,50 @@ class Queue(Connection):
 
     def wait(self):
         self._queue.join()
+
+
+class _PriorityBuffer(queue.Queue):
+    """A :py:class:`queue.Queue` giving out items in order of priority.
+    The `sentinels` come after all other items."""
+    def __init__(self, priority, on_get, sentinels, maxsize=0):
+        self.priority = priority
+        self.on_get = on_get
+        self.sentinels = sentinels
+        self.counter = count()
+        super(_PriorityBuffer, self).__init__(maxsize)
+
+    def is_sentinel(self, item):
+        return any(item is s for s in self.sentinels)
+
+    def _init(self, maxsize):
+        self.heap = []
+
+    def _qsize(self):
+        return len(self.heap)
+
+    def _put(self, item):
+        key = float('inf') if self.is_sentinel(item) \
+            else -self.priority(item)
+        heappush(self.heap, (key, next(self.counter), item))
+
+    def _get(self):
+        item = heappop(self.heap)[2]
+        if self.on_get is not None and not self.is_sentinel(item):
+            self.on_get(item)
+        return item
+
+
+class PriorityQueue(Queue):
+    """A |Queue| that hands out the item with the highest priority first.
+    Items of equal priority come out in the order they were put in.
+
+    :param priority: function giving the priority of an item, when it is
+        put on the queue.
+    :param on_get: function called with every item taken from the queue.
+    :param maxsize: maximum number of items in the queue, as for |Queue|.
+    """
+    def __init__(self, priority, on_get=None, end_of_queue=EndOfQueue,
+                 maxsize=0):
+        super(PriorityQueue, self).__init__(end_of_queue=end_of_queue)
+        self._queue = _PriorityBuffer(
+            priority, on_get, (end_of_queue, self._flush_queue), maxsize)
@@ -32,7 +32,7 @@ def thread_counter(finalize):
     return target_modifier
 
 
-def thread_pool(*workers, results=None, end_of_queue=EndOfQueue):
+def thread_pool(*workers, results=None, end_of_queue=EndOfQueue, maxsize=0):
     """Returns a |pull| object, call it ``r``, starting a thread for each given
     worker.  Each thread pulls from the source that ``r`` is connected to, and
     the returned results are pushed to a |Queue|.  ``r`` yields from the other
@@ -50,10 +50,16 @@ def thread_pool(*workers, results=None, end_of_queue=EndOfQueue):
     :param end_of_queue: end-of-queue signal object passed on to the creation
         of the |Queue| object.
 
+    :param maxsize: maximum number of results waiting in the |Queue|; the
+        workers wait when it is full. Mind that whatever reads the results
+        should not wait on the workers, or they wait forever; the
+        :py:class:`Scheduler` should have a `window` of at most `maxsize`
+        jobs.
+
     :rtype: |pull|
     """
     if results is None:
-        results = Queue(end_of_queue=end_of_queue)
+        results = Queue(end_of_queue=end_of_queue, maxsize=maxsize)
 
     count = thread_counter(results.close)
 
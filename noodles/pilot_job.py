@@ -16,23 +16,100 @@ stdout.
 
 import argparse
 import sys
+import threading
 import uuid
 from contextlib import redirect_stdout
+from functools import partial
+from itertools import repeat
 
 import time
 import os
 
 from noodles import __version__
-from .lib import (look_up)
+from .lib import (look_up, Queue, EndOfQueue, thread_pool)
 from .run.messages import (EndOfWork)
 
 from .run.worker import (
-    run_job)
+    run_job, worker)
 
 from .run.messages import (
     JobMessage)
 
-from .run.remote.io import (JSONObjectReader, JSONObjectWriter)
+from .run.pool import (ProcessPool, init_with_stdout_to_stderr)
+from .run.remote.io import (get_format)
+from .run.remote.batch import (BatchWriter, unbatch)
+
+
+def job_runner(args):
+    """Get a :py:class:`Connection` running jobs in `args.n` threads, or in
+    a pool of `args.n` processes if `args.processes` is set. In the latter
+    case the init and finish functions are run in each process."""
+    if not args.processes:
+        return Queue() >> thread_pool(*repeat(worker, args.n))
+
+    init = look_up(args.init) if args.init else None
+    finish = look_up(args.finish) if args.finish else None
+    pool = ProcessPool(
+        args.n, init=partial(init_with_stdout_to_stderr, init),
+        finish=finish)
+    return pool.connection()
+
+
+def run_jobs(args, input_stream, output_stream):
+    """Run the jobs from `input_stream` in several threads or processes,
+    see :py:func:`job_runner`. Results are written to `output_stream` by
+    a separate thread, as soon as they come in."""
+    source, sink = job_runner(args).setup()
+
+    def send_results():
+        for result in source:
+            output_stream.send(result)
+
+    sender = threading.Thread(target=send_results, daemon=True)
+    sender.start()
+
+    for msg in input_stream:
+        if isinstance(msg, JobMessage):
+            key, job = msg
+        elif msg is EndOfWork:
+            print("received EndOfWork, bye", file=sys.stderr)
+            break
+        elif isinstance(msg, tuple):
+            key, job = msg
+        elif msg is None:
+            continue
+        else:
+            raise RuntimeError("Unknown message received: {}".format(msg))
+
+        if args.verbose:
+            print("worker: ",
+                  job.foo.__name__,
+                  job.bound_args.args,
+                  job.bound_args.kwargs,
+                  file=sys.stderr, flush=True)
+
+        sink.send(JobMessage(key, job))
+
+    try:
+        sink.send(EndOfQueue)
+    except StopIteration:
+        pass
+
+    sender.join()
+
+
+def shut_down(output_stream, finish=None):
+    """Send the last results and run the `finish` function if given; the
+    same for all ways of running jobs."""
+    output_stream.close()
+
+    if finish:
+        with redirect_stdout(sys.stderr):
+            finish()
+
+    time.sleep(0.1)
+    sys.stdout.flush()
+    sys.stderr.flush()
 
 
 def run_online_mode(args):
@@ -45,73 +122,91 @@ def run_online_mode(args):
     and writes messages to standard output containing the result.
 
     Messages can be encoded as either JSON or MessagePack.
+
+    With `-n` larger than one, jobs are run in as many threads, or in a pool
+    of processes with `-processes`; results are sent back in the order in
+    which they finish.
     """
     print("\033[47;30m Netherlands\033[48;2;0;174;239;37m▌"
           "\033[38;2;255;255;255me\u20d2Science\u20d2\033[37m▐"
           "\033[47;30mcenter \033[m Noodles worker", file=sys.stderr)
 
-    if args.n == 1:
-        registry = look_up(args.registry)()
-        finish = None
-
-        input_stream = JSONObjectReader(
-            registry, sys.stdin, deref=True)
-        output_stream = JSONObjectWriter(
-            registry, sys.stdout, host=args.name)
-        sys.stdout.flush()
-
-        # run the init function if it is given
-        if args.init:
-            with redirect_stdout(sys.stderr):
+    registry = look_up(args.registry)()
+    finish = None
+
+    reader, writer, binary = get_format(args.format)
+    stdin = sys.stdin.buffer if binary else sys.stdin
+    stdout = sys.stdout.buffer if binary else sys.stdout
+
+    input_stream = unbatch(reader(
+        registry, stdin, deref=True))
+    output_stream = BatchWriter(
+        writer(registry, stdout, host=args.name),
+        args.batch_size, args.batch_linger)
+    sys.stdout.flush()
+
+    if args.n > 1:
+        # the jobs run in other threads, where output to stdout would end
+        # up between the results; in a pool of processes, the processes
+        # run init and finish themselves
+        with redirect_stdout(sys.stderr):
+            if args.init and not args.processes:
                 look_up(args.init)()
 
-        if args.finish:
-            finish = look_up(args.finish)
-
-        for msg in input_stream:
-            if isinstance(msg, JobMessage):
-                key, job = msg
-            elif msg is EndOfWork:
-                print("received EndOfWork, bye", file=sys.stderr)
-                sys.exit(0)
-            elif isinstance(msg, tuple):
-                key, job = msg
-            elif msg is None:
-                continue
-            else:
-                raise RuntimeError("Unknown message received: {}".format(msg))
-
-            if args.jobdirs:
-                # make a directory
-                os.mkdir("noodles-{0}".format(key.hex))
-                # enter it
-                os.chdir("noodles-{0}".format(key.hex))
-
-            if args.verbose:
-                print("worker: ",
-                      job.foo.__name__,
-                      job.bound_args.args,
-                      job.bound_args.kwargs,
-                      file=sys.stderr, flush=True)
-
-            with redirect_stdout(sys.stderr):
-                result = run_job(key, job)
-
-            if args.verbose:
-                print("result: ", result.value, file=sys.stderr, flush=True)
-
-            if args.jobdirs:
-                # parent directory
-                os.chdir("..")
-
-            output_stream.send(result)
+            run_jobs(args, input_stream, output_stream)
 
-        if finish:
-            finish()
-
-        time.sleep(0.1)
-        sys.stdout.flush()
-        sys.stderr.flush()
+        if args.finish and not args.processes:
+            finish = look_up(args.finish)
+        shut_down(output_stream, finish)
+        return
+
+    # run the init function if it is given
+    if args.init:
+        with redirect_stdout(sys.stderr):
+            look_up(args.init)()
+
+    if args.finish:
+        finish = look_up(args.finish)
+
+    for msg in input_stream:
+        if isinstance(msg, JobMessage):
+            key, job = msg
+        elif msg is EndOfWork:
+            print("received EndOfWork, bye", file=sys.stderr)
+            break
+        elif isinstance(msg, tuple):
+            key, job = msg
+        elif msg is None:
+            continue
+        else:
+            raise RuntimeError("Unknown message received: {}".format(msg))
+
+        if args.jobdirs:
+            # make a directory
+            os.mkdir("noodles-{0}".format(key.hex))
+            # enter it
+            os.chdir("noodles-{0}".format(key.hex))
+
+        if args.verbose:
+            print("worker: ",
+                  job.foo.__name__,
+                  job.bound_args.args,
+                  job.bound_args.kwargs,
+                  file=sys.stderr, flush=True)
+
+        with redirect_stdout(sys.stderr):
+            result = run_job(key, job)
+
+        if args.verbose:
+            print("result: ", result.value, file=sys.stderr, flush=True)
+
+        if args.jobdirs:
+            # parent directory
+            os.chdir("..")
+
+        output_stream.send(result)
+
+    shut_down(output_stream, finish)
 
 
 if __name__ == "__main__":
@@ -130,7 +225,12 @@ if __name__ == "__main__":
         help="the serial registry")
     parser.add_argument(
         "-n", type=int,
-        help="the number of threads.", default=1)
+        help="the number of jobs to run at the same time, each in a "
+             "thread of its own.", default=1)
+    parser.add_argument(
+        "-processes",
+        help="with -n, run jobs in a pool of processes in stead of threads",
+        default=False, action='store_true')
     parser.add_argument(
         "-verbose",
         help="output information to stderr for debugging",
@@ -151,5 +251,22 @@ if __name__ == "__main__":
         "-finish", type=str,
         help="a finish function will be send before other jobs",
         default=None)
+    parser.add_argument(
+        "-batch-size", type=int,
+        help="the maximum number of results sent back in one message",
+        default=1)
+    parser.add_argument(
+        "-batch-linger", type=float,
+        help="the maximum time in seconds a result waits for its batch "
+             "to fill up",
+        default=0.01)
+    parser.add_argument(
+        "-format", type=str, choices=['json', 'msgpack'],
+        help="the wire format of messages",
+        default='json')
+
+    args = parser.parse_args()
+    if args.n > 1 and args.jobdirs:
+        parser.error("-jobdirs can not be combined with -n larger than one")
 
-    run_online_mode(parser.parse_args())
+    run_online_mode(args)
@@ -1,4 +1,5 @@
 from .sqlite import JobDB
 from .key import (prov_key)
+from .cache import (ProvCache)
 
-__all__ = ['prov_key', 'JobDB']
+__all__ = ['prov_key', 'JobDB', 'ProvCache']
@@ -0,0 +1,188 @@
+"""
+In-memory provenance cache
+--------------------------
+
+Looking up a job in the database costs a query for every job in the
+workflow, while most jobs in a new workflow have never been run before.
+The :py:class:`ProvCache` sits in front of the database:
+
+    - a :py:class:`BloomFilter` of the `prov` keys that have a result in
+      the database answers "definitely not stored" without a query,
+    - a least-recently-used table keeps the entries of recently stored and
+      retrieved results, bounded in number and in bytes.
+
+The database stays the source of truth: a false positive of the Bloom
+filter only costs a query, and entries are only cached once their result
+is final. The owner adds results stored by other sessions to the filter
+every `refresh_interval` seconds; until then, it should look them up in the
+database when the filter says no.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class BloomFilter:
+    """Set of strings that may give false positives but no false negatives.
+
+    :param size: size of the bit array in bytes.
+    :param n_hashes: number of bits set for each key.
+
+    .. py:attribute:: count
+
+        Number of keys added, not counting keys that were (or seemed to be)
+        present already.
+    """
+    def __init__(self, size=1 << 20, n_hashes=7):
+        self.bits = bytearray(size)
+        self.n_bits = size * 8
+        self.n_hashes = n_hashes
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.n_bits for i in range(self.n_hashes))
+
+    def add(self, key):
+        new = False
+        for p in self._positions(key):
+            bit = 1 << (p & 7)
+            if not self.bits[p >> 3] & bit:
+                self.bits[p >> 3] |= bit
+                new = True
+        self.count += new
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7))
+                   for p in self._positions(key))
+
+
+def entry_size(entry):
+    """Estimate the memory taken by a cached job entry, counting the
+    lengths of its text fields."""
+    return sum(len(x) for x in entry if isinstance(x, str))
+
+
+class ProvCache:
+    """Front cache for a job database, keyed by `prov`.
+
+    :param max_entries: maximum number of entries in the LRU table.
+    :param max_bytes: maximum total size of the entries in the LRU table,
+        as estimated by :py:func:`entry_size`.
+    :param bloom_size: size of the Bloom filter in bytes. The default of
+        one megabyte keeps false positives below one percent up to about
+        900,000 stored results.
+    :param refresh_interval: number of seconds after which the owner
+        should add the results stored by concurrent sessions to the Bloom
+        filter (see :py:meth:`needs_refresh`).
+    """
+    def __init__(self, max_entries=4096, max_bytes=1 << 26,
+                 bloom_size=1 << 20, refresh_interval=10.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bloom = BloomFilter(bloom_size)
+        self.refresh_interval = refresh_interval
+        self.last_refresh = time.monotonic()
+        self.lock = threading.Lock()
+
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.negatives = 0
+        self.evictions = 0
+
+    def may_contain(self, prov):
+        """Check the Bloom filter. If this returns `False`, there is no
+        stored result with this `prov`; counts a negative."""
+        with self.lock:
+            if prov in self.bloom:
+                return True
+            self.negatives += 1
+            return False
+
+    def reset(self, provs):
+        """Rebuild the Bloom filter from the `prov` keys of all stored
+        results. The old filter stays in use until the new one is
+        complete."""
+        bloom = BloomFilter(len(self.bloom.bits), self.bloom.n_hashes)
+        for prov in provs:
+            bloom.add(prov)
+
+        with self.lock:
+            for prov in self.entries:
+                bloom.add(prov)
+            self.bloom = bloom
+
+    def add(self, provs):
+        """Add the `prov` keys of newly stored results to the Bloom
+        filter."""
+        with self.lock:
+            for prov in provs:
+                self.bloom.add(prov)
+
+    def get(self, prov):
+        """Get a cached entry, counting a hit or a miss. Ask
+        :py:meth:`may_contain` first, so that the misses count the lookups
+        that need a query."""
+        with self.lock:
+            entry = self.entries.get(prov)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(prov)
+            self.hits += 1
+            return entry
+
+    def put(self, prov, entry):
+        """Cache an entry that has its final result, evicting the least
+        recently used entries to stay within bounds."""
+        size = entry_size(entry)
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            self.bloom.add(prov)
+            old = self.entries.pop(prov, None)
+            if old is not None:
+                self.bytes -= entry_size(old)
+
+            self.entries[prov] = entry
+            self.bytes += size
+
+            while len(self.entries) > self.max_entries \
+                    or self.bytes > self.max_bytes:
+                _, old = self.entries.popitem(last=False)
+                self.bytes -= entry_size(old)
+                self.evictions += 1
+
+    def needs_refresh(self):
+        """Returns `True` once every `refresh_interval` seconds, to the
+        first caller only."""
+        if self.refresh_interval is None:
+            return False
+
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_refresh < self.refresh_interval:
+                return False
+            self.last_refresh = now
+            return True
+
+    def stats(self):
+        """Get the counters of this cache as a `dict`."""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'negatives': self.negatives,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'bloom_keys': self.bloom.count}
@@ -1,26 +1,88 @@
 import hashlib
+from functools import partial
 
 try:
     import ujson as json
 except ImportError:
     import json
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+hash_functions = {
+    'md5': hashlib.md5,
+    'sha256': hashlib.sha256,
+    'blake2b': partial(hashlib.blake2b, digest_size=16)}
+"""Hash functions available for provenance keys, by name. If the `xxhash`
+package is installed, `'xxh3'` is added."""
+
+if xxhash is not None:
+    hash_functions['xxh3'] = xxhash.xxh3_128
+
+
+def get_hash_function(name):
+    """Get a hash function by name (see :py:data:`hash_functions`); returns
+    a function creating a new `hashlib` style hash object."""
+    if name == 'xxh3' and xxhash is None:
+        raise ImportError("The 'xxh3' hash needs the `xxhash` package.")
+    try:
+        return hash_functions[name]
+    except KeyError:
+        raise ValueError("Unknown hash function: {}".format(name)) from None
+
+
+# separators as written by `json.dumps`, which differ between `json` and
+# `ujson`
+_item_sep = json.dumps([0, 0])[2:-2].encode()
+_key_sep = json.dumps({'a': 0})[4:-2].encode()
+
+
+def update_object_hash(m, obj, chunk_size=1024):
+    """Update hash `m` with the JSON of `obj`, with sorted keys. This gives
+    the same hash as hashing `json.dumps(obj, sort_keys=True)`, but the
+    JSON is written in pieces: dictionaries key by key, lists in chunks of
+    `chunk_size` items."""
+    t = type(obj)
+    if t is dict and all(type(k) is str for k in obj):
+        m.update(b'{')
+        sep = b''
+        for k, v in sorted(obj.items()):
+            m.update(sep + json.dumps(k).encode() + _key_sep)
+            update_object_hash(m, v, chunk_size)
+            sep = _item_sep
+        m.update(b'}')
+
+    elif (t is list or t is tuple) and len(obj) > chunk_size:
+        m.update(b'[')
+        sep = b''
+        for i in range(0, len(obj), chunk_size):
+            chunk = json.dumps(obj[i:i+chunk_size], sort_keys=True)
+            m.update(sep + chunk[1:-1].encode())
+            sep = _item_sep
+        m.update(b']')
+
+    else:
+        m.update(json.dumps(obj, sort_keys=True).encode())
 
-def update_object_hash(m, obj):
-    r = json.dumps(obj, sort_keys=True)
-    m.update(r.encode())
     return m
 
 
-def prov_key(job_msg, extra=None):
+def prov_key(job_msg, extra=None, hash_function='md5'):
     """Retrieves a MD5 sum from a function call. This takes into account the
     name of the function, the arguments and possibly a version number of the
     function, if that is given in the hints.
     This version can also be auto-generated by generating an MD5 hash from the
     function source. However, the source-code may not always be reachable, or
     the result may depend on an external process which has its own
-    versioning."""
-    m = hashlib.md5()
+    versioning.
+
+    The job message should be encoded with :py:meth:`Registry.hash_encode`.
+    Another hash than MD5 can be chosen by name with `hash_function`; keys
+    computed with different hash functions never match."""
+    m = get_hash_function(hash_function)()
     update_object_hash(m, job_msg['data']['function'])
     update_object_hash(m, job_msg['data']['arguments'])
 
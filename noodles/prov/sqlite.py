@@ -2,8 +2,10 @@
 SQLite3 job database
 --------------------
 
-The database contains three tables:
+The database contains five tables:
     - jobs
+    - results
+    - stored
     - sessions
     - timestamps
 
@@ -19,21 +21,40 @@ Each job that is started will get an entry in the "jobs" table.
 In the case that a job returns a new workflow, we'd like to identify the result
 of that workflow with that of the original job. In that case we add a "link"
 once a non-workflow result is known.
+
+Results are stored as JSON in the "result" field of a job, unless they are
+large; then the JSON is stored once in the "results" table, keyed by its
+SHA-256 hash, and the "result" field holds a reference `sha256:<hash>`.
+Jobs with identical results share the same row in "results".
+
+Every time a job gets a result, a trigger adds its "prov" to the "stored"
+table, so that a session can find the results stored by other sessions since
+it last looked, without scanning all jobs.
 """
 
+import hashlib
+import logging
 import sqlite3
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from itertools import groupby
 from pathlib import Path
-from threading import Lock
+from threading import RLock
 from collections import (defaultdict)
 # from typing import NamedTuple
 from collections import (namedtuple)
 # import datetime
 import sys
+import zlib
 from enum import IntEnum
 
 from ..run.messages import (JobMessage, ResultMessage)
 from ..workflow import (is_workflow, get_workflow, FunctionNode, NodeData)
-from .key import (prov_key)
+from .workflow import (node_prov_key)
+from .cache import (ProvCache)
 
 try:
     import ujson as json
@@ -57,6 +78,24 @@ schema = '''
 
     create index if not exists "prov" on "jobs"("prov");
 
+    create table if not exists "results" (
+        "hash"        text unique primary key,
+        "compression" text,
+        "data"        blob );
+
+    create table if not exists "stored" (
+        "id"          integer primary key autoincrement,
+        "prov"        text );
+
+    create index if not exists "stored_prov" on "stored"("prov");
+
+    create trigger if not exists "log_stored"
+        after update of "result" on "jobs"
+        when new."result" is not null and new."prov" is not null
+        begin
+            insert into "stored" ("prov") values (new."prov");
+        end;
+
     create table if not exists "sessions" (
         "id"        integer unique primary key,
         "time"      datetime default current_timestamp,
@@ -120,6 +159,26 @@ TimestampEntry = namedtuple('TimestampEntry', [
 #     what: str
 
 
+wal_pragmas = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -65536,
+    'mmap_size': 1 << 28,
+    'busy_timeout': 60000}
+"""Pragmas for a job database that is shared by concurrent sessions: WAL
+journaling lets readers continue while another session writes."""
+
+
+blob_prefix = 'sha256:'
+"""Prefix of a reference to the "results" table; this can not be the start
+of a JSON text."""
+
+
+_IN_DB = object()
+"""Placeholder for a result in the in-memory copy of a job entry, when
+the result is only kept in the database."""
+
+
 class Status(IntEnum):
     INACTIVE = 0
     WAITING = 1
@@ -129,39 +188,406 @@ class Status(IntEnum):
     LINKEE = 5
 
 
+class WriteBehind:
+    """Writer thread for :py:class:`JobDB`. Statements are queued and
+    executed in batches, grouping runs of the same statement with
+    `executemany`. The database is committed at least every
+    `commit_interval` seconds.
+
+    Each queued item is a tuple `(sql, params, on_done)`, where `on_done`
+    is `None` or a function called after the statement is executed. Both
+    execution and `on_done` happen while holding the lock of the
+    :py:class:`JobDB`."""
+    def __init__(self, db, batch_size=1000, commit_interval=1.0):
+        self.db = db
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, sql, params, on_done=None):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((sql, params, on_done))
+
+    def flush(self):
+        """Wait until all queued statements are executed and committed."""
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """Flush and stop the writer thread."""
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _run(self):
+        last_commit = time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.commit_interval)
+            except queue.Empty:
+                item = ()
+
+            batch = []
+            while item is not None and not isinstance(item, threading.Event):
+                if item:
+                    batch.append(item)
+                if not item or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    item = ()
+
+            stop = item is None or isinstance(item, threading.Event)
+            try:
+                self._execute(batch)
+                if stop or time.monotonic() - last_commit \
+                        >= self.commit_interval:
+                    with self.db.lock:
+                        self.db.connection.commit()
+                    last_commit = time.monotonic()
+            except Exception as e:
+                self.error = e
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def _execute(self, batch):
+        if not batch:
+            return
+
+        with self.db.lock:
+            cur = self.db.connection.cursor()
+            for sql, group in groupby(batch, key=lambda item: item[0]):
+                group = list(group)
+                cur.executemany(sql, [params for _, params, _ in group])
+                for _, _, on_done in group:
+                    if on_done is not None:
+                        on_done()
+
+
 class JobDB:
     """Keeps a database of jobs, with a MD5 hash that encodes the function
     name, version, and all arguments to the function.
+
+    The rows of jobs in the current session are mirrored in memory, so
+    that looking up duplicates only needs to query the database for
+    results of earlier (or concurrent) sessions. Changes are committed at
+    least every `commit_interval` seconds, making results available to
+    other sessions.
+
+    Job ids are assigned by the :py:class:`JobDB`, the session id times
+    2**32 plus a counter, so that concurrent sessions don't need to agree
+    on them. If `write_behind` is true, changes to the database are made
+    by a :py:class:`WriteBehind` thread in batches of at most `batch_size`
+    statements.
+
+    The `pragmas` are set on each connection to the database; use
+    :py:data:`wal_pragmas` when several sessions share a database at the
+    same time. In WAL mode, each thread queries results of other sessions
+    through its own read-only connection.
+
+    Lookups of results from other sessions go through a
+    :py:class:`ProvCache`, which is filled with the `prov` keys of all
+    stored results when the session starts. Results stored later by other
+    sessions are added from the "stored" table at the `refresh_interval`
+    of the cache, and looked up there if the cache doesn't know them yet.
+    Give `cache=False` to disable it, or a :py:class:`ProvCache` to set its
+    bounds; the counters are found through `db.cache.stats()`.
+
+    Results of at least `blob_size` bytes of JSON are kept in the
+    "results" table, compressed with zlib if `compress` is true.
+
+    The `prov` keys of jobs are computed from
+    :py:meth:`Registry.hash_encode`, so that arguments that have a content
+    hash, like Numpy arrays, are not encoded just for the key; the
+    "arguments" field stores the full encoding. The `hash_function` is
+    passed on to :py:func:`prov_key`.
     """
-    def __init__(self, path, registry, info=None):
+    def __init__(self, path, registry, info=None, write_behind=False,
+                 batch_size=1000, commit_interval=1.0, pragmas=None,
+                 cache=True, blob_size=1024, compress=False,
+                 hash_function='md5'):
         self.attached = defaultdict(list)
 
         if isinstance(path, str):
             path = Path(path)
         path.parent.mkdir(exist_ok=True)
 
+        self.path = path
+        self.pragmas = pragmas or {}
         self.connection = sqlite3.connect(
             path.as_posix(), check_same_thread=False)
+        self._set_pragmas(self.connection)
         self.jobs = {}
         self.links = defaultdict(list)
         self.registry = registry()
 
         self.cur = self.connection.cursor()
         self.cur.executescript(schema)
-        self.lock = Lock()
+        self.lock = RLock()
         self.workflows = {}
 
+        # rows of this session, by id and by prov
+        self.rows = {}
+        self.prov_index = defaultdict(list)
+
+        self.blob_size = blob_size
+        self.compress = compress
+        self.hash_function = hash_function
+        # hashes of results written in this session
+        self.blobs = set()
+
         with self.lock:
             self.cur.execute(
                 'insert into "sessions" ("info") values (?)', (info,))
             self.session = self.cur.lastrowid
+            self.connection.commit()
+            self.last_id = self.session << 32
+
+        self.commit_interval = commit_interval
+        self.last_commit = time.monotonic()
+        self.writer = WriteBehind(self, batch_size, commit_interval) \
+            if write_behind else None
+
+        journal_mode = self.connection.execute(
+            'pragma journal_mode').fetchone()[0]
+        self.read_connections = journal_mode == 'wal'
+        self.readers = []
+        self.local = threading.local()
+
+        if cache is True:
+            cache = ProvCache()
+        self.cache = cache or None
+        if self.cache is not None:
+            self._load_cache()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc, exc_type, stacktrace):
-        self.connection.commit()
-        self.connection.close()
+        if self.writer is not None:
+            self.writer.close()
+        if self.cache is not None:
+            logging.getLogger('noodles').getChild('prov').debug(
+                "provenance cache: %s", self.cache.stats())
+        with self.lock:
+            for reader in self.readers:
+                reader.close()
+            self.connection.commit()
+            self.connection.close()
+
+    def _set_pragmas(self, connection, read_only=False):
+        for key, value in self.pragmas.items():
+            if read_only and key in ('journal_mode', 'synchronous'):
+                continue
+            connection.execute('pragma {} = {}'.format(key, value))
+
+    def _write(self, sql, params, on_done=None):
+        """Execute a statement that changes the database, now or through
+        the writer thread. Call this while holding the lock."""
+        if self.writer is not None:
+            self.writer.put(sql, params, on_done)
+            return
+
+        self.cur.execute(sql, params)
+        if on_done is not None:
+            on_done()
+        if time.monotonic() - self.last_commit >= self.commit_interval:
+            self.connection.commit()
+            self.last_commit = time.monotonic()
+
+    @contextmanager
+    def _reading(self):
+        """Connection to query rows from other sessions. In WAL mode this is
+        a read-only connection for the current thread, otherwise the shared
+        connection, locked while in use."""
+        if not self.read_connections:
+            with self.lock:
+                yield self.connection
+            return
+
+        reader = getattr(self.local, 'connection', None)
+        if reader is None:
+            reader = sqlite3.connect(
+                self.path.resolve().as_uri() + '?mode=ro', uri=True,
+                check_same_thread=False)
+            self._set_pragmas(reader, read_only=True)
+            with self.lock:
+                self.readers.append(reader)
+            self.local.connection = reader
+
+        yield reader
+
+    def _read(self, sql, params):
+        """Query a single row from other sessions."""
+        with self._reading() as connection:
+            return connection.execute(sql, params).fetchone()
+
+    def _load_cache(self):
+        """Fill the Bloom filter of the cache with the `prov` keys of all
+        stored results."""
+        with self._reading() as connection:
+            self.last_stored = connection.execute(
+                'select coalesce(max("id"), 0) from "stored"').fetchone()[0]
+            cur = connection.execute(
+                'select "prov" from "jobs" where "result" is not null '
+                'and "prov" is not null')
+            self.cache.reset(prov for prov, in cur)
+
+    def _refresh_cache(self):
+        """Add the `prov` keys of results stored since the last refresh to
+        the Bloom filter of the cache."""
+        with self._reading() as connection:
+            rows = connection.execute(
+                'select "id", "prov" from "stored" where "id" > ? '
+                'order by "id"', (self.last_stored,)).fetchall()
+
+        if rows:
+            self.cache.add(prov for _, prov in rows)
+            self.last_stored = max(self.last_stored, rows[-1][0])
+
+    def _stored_recently(self, prov):
+        """Check whether a result with `prov` was stored since the last
+        refresh of the cache, which the Bloom filter doesn't know yet."""
+        rec = self._read(
+            'select 1 from "stored" where "prov" = ? and "id" > ? limit 1',
+            (prov, self.last_stored))
+        return rec is not None
+
+    def flush(self):
+        """Make sure all changes are written and committed to the
+        database."""
+        if self.writer is not None:
+            self.writer.flush()
+            return
+
+        with self.lock:
+            self.connection.commit()
+            self.last_commit = time.monotonic()
+
+    def _update_row(self, key, **fields):
+        if key in self.rows:
+            self.rows[key] = self.rows[key]._replace(**fields)
+
+    def _result_written(self, key, result, stored):
+        """Drop the copy of a result once it is in the database, keeping
+        the reference if it is stored in the "results" table."""
+        row = self.rows.get(key)
+        if row is not None and row.result is result:
+            self.rows[key] = row._replace(
+                result=stored if stored is not result else _IN_DB)
+
+    def _store_blob(self, result):
+        """Get the text to store in the "result" field for a result in JSON.
+        Large results are written to the "results" table, unless a result
+        with the same hash is there already. Call this while holding the
+        lock."""
+        data = result.encode()
+        if len(data) < self.blob_size:
+            return result
+
+        digest = hashlib.sha256(data).hexdigest()
+        if digest not in self.blobs:
+            compression = None
+            if self.compress:
+                data = zlib.compress(data)
+                compression = 'zlib'
+            self._write(
+                'insert or ignore into "results" ("hash", "compression", '
+                '"data") values (?, ?, ?)', (digest, compression, data))
+            self.blobs.add(digest)
+
+        return blob_prefix + digest
+
+    def _result_text(self, entry):
+        """Get the result of a `JobEntry` in JSON, reading it from the
+        "results" table if needed."""
+        result = entry.result
+        if result is None or not result.startswith(blob_prefix):
+            return result
+
+        sql = 'select "compression", "data" from "results" where "hash" = ?'
+        params = (result[len(blob_prefix):],)
+        if entry.session == self.session:
+            with self.lock:
+                rec = self.connection.execute(sql, params).fetchone()
+        else:
+            rec = self._read(sql, params)
+
+        assert rec is not None, "database integrity violation"
+        compression, data = rec
+        if compression == 'zlib':
+            data = zlib.decompress(data)
+        return bytes(data).decode()
+
+    def _entry(self, db_id):
+        """Get the `JobEntry` of a job."""
+        with self.lock:
+            row = self.rows.get(db_id)
+            if row is not None and row.result is _IN_DB:
+                cached = self.cache and self.cache.get(row.prov)
+                if cached and cached.id == db_id:
+                    return row._replace(result=cached.result)
+                self.cur.execute(
+                    'select "result" from "jobs" where "id" = ?', (db_id,))
+                row = row._replace(result=self.cur.fetchone()[0])
+
+        if row is None:
+            rec = self._read(
+                'select * from "jobs" where "id" = ?', (db_id,))
+            return JobEntry(*rec) if rec is not None else None
+
+        return row
+
+    def _find_stored(self, prov):
+        """Find a job with the same `prov` and a result in another
+        session. The cache may also give a job from the current
+        session, which is equally valid."""
+        if self.cache is not None:
+            if self.cache.needs_refresh():
+                self._refresh_cache()
+            if not self.cache.may_contain(prov) \
+                    and not self._stored_recently(prov):
+                return None
+            entry = self.cache.get(prov)
+            if entry is not None:
+                return entry
+
+        rec = self._read(
+            'select * from "jobs" where "prov" = ? and "session" != ? '
+            'and "result" is not null', (prov, self.session))
+        if rec is None:
+            return None
+
+        entry = JobEntry(*rec)
+        if entry.status != Status.WORKFLOW:
+            entry = entry._replace(result=self._result_text(entry))
+        if self.cache is not None and (
+                entry.status != Status.WORKFLOW or entry.link is not None):
+            self.cache.put(prov, entry)
+        return entry
+
+    def _find_in_session(self, prov):
+        """Find a job with the same `prov` in the current session, that
+        either has a result, or is waiting for one."""
+        with self.lock:
+            for db_id in self.prov_index.get(prov, ()):
+                row = self.rows[db_id]
+                if row.result is not None or row.link is None:
+                    return self._entry(db_id)
+
+        return None
 
     # --------- job-keeper interface ------------
     def __len__(self):
@@ -180,11 +606,17 @@ class JobDB:
         """Takes a job (unencoded) and adorns it with a unique key; this makes
         an entry in the database without any further specification."""
         with self.lock:
-            self.cur.execute(
-                'insert into "jobs" ("name", "session", "status") '
-                'values (?, ?, ?)', (job.name, self.session, Status.INACTIVE))
-            self.jobs[self.cur.lastrowid] = job
-            return JobMessage(self.cur.lastrowid, job.node)
+            self.last_id += 1
+            key = self.last_id
+            self._write(
+                'insert into "jobs" ("id", "name", "session", "status") '
+                'values (?, ?, ?, ?)',
+                (key, job.name, self.session, Status.INACTIVE))
+            self.rows[key] = JobEntry(
+                key, self.session, job.name, Status.INACTIVE,
+                None, None, None, None, None, None)
+            self.jobs[key] = job
+            return JobMessage(key, job.node)
 
     def store_result(self, key, status, value, _):
         """Store the result of a job back in the node; this does nothing to the
@@ -203,6 +635,7 @@ class JobDB:
 
     # --------- database interface ---------------------
     def list_jobs(self):
+        self.flush()
         with self.lock:
             self.cur.execute(
                 'select "id", "function", "arguments" from "jobs"')
@@ -215,24 +648,16 @@ class JobDB:
 
     def get_result(self, db_id):
         with self.lock:
-            self.cur.execute(
-                'select * from "jobs" where "id" = ?',
-                (db_id,))
-            rec = self.cur.fetchone()
+            rec = self._entry(db_id)
             if rec is None:
                 raise ValueError("No record found with id %s", db_id)
-            rec = JobEntry(*rec)
 
             if rec.result is not None and rec.status == Status.WORKFLOW:
                 # the found duplicate returned a workflow
                 if rec.link is not None:
                     # link is set, so result is fully realized
-                    self.cur.execute(
-                        'select * from "jobs" where "id" = ?',
-                        (rec.link,))
-                    rec = self.cur.fetchone()
+                    rec = self._entry(rec.link)
                     assert rec is not None, "database integrity violation"
-                    rec = JobEntry(*rec)
 
                 else:
                     # link is not set, the result is still waited upon
@@ -240,36 +665,40 @@ class JobDB:
 
             assert rec.result is not None, "no result found"
             # result is found! return it
-            result_value = self.registry.from_json(rec.result, deref=True)
+            result_value = self.registry.from_json(
+                self._result_text(rec), deref=True)
             return result_value
 
     def add_job_to_db(self, key, job):
         """Add job info to the database."""
         job_msg = self.registry.deep_encode(job)
-        prov = prov_key(job_msg)
+        prov = node_prov_key(job, self.registry, self.hash_function)
 
         def set_link(duplicate_id):
-            self.cur.execute(
+            self._write(
                 'update "jobs" set "link" = ?, "status" = ? where "id" = ?',
                 (duplicate_id, Status.DUPLICATE, key))
+            self._update_row(
+                key, link=duplicate_id, status=Status.DUPLICATE)
+
+        stored = self._find_stored(prov)
 
         with self.lock:
-            self.cur.execute(
-                'select * from "jobs" where "prov" = ? '
-                'and (("result" is not null) or '
-                '("session" = ? and "link" is null))',
-                (prov, self.session))
-            rec = self.cur.fetchone()
-            rec = JobEntry(*rec) if rec is not None else None
+            rec = stored or self._find_in_session(prov)
 
-            self.cur.execute(
+            version = job_msg['data']['hints'].get('version')
+            self._write(
                 'update "jobs" set "prov" = ?, "version" = ?, "function" = ?, '
                 '"arguments" = ?, "status" = ? where "id" = ?',
-                (prov, job_msg['data']['hints'].get('version'),
+                (prov, version,
                  json.dumps(job_msg['data']['function']),
                  json.dumps(job_msg['data']['arguments']),
                  Status.WAITING,
                  key))
+            if key in self.rows:
+                self._update_row(
+                    key, prov=prov, version=version, status=Status.WAITING)
+                self.prov_index[prov].append(key)
 
             if not rec:
                 # no duplicate found, go on
@@ -281,12 +710,8 @@ class JobDB:
                 # the found duplicate returned a workflow
                 if rec.link is not None:
                     # link is set, so result is fully realized
-                    self.cur.execute(
-                        'select * from "jobs" where "id" = ?',
-                        (rec.link,))
-                    rec = self.cur.fetchone()
+                    rec = self._entry(rec.link)
                     assert rec is not None, "database integrity violation"
-                    rec = JobEntry(*rec)
 
                 else:
                     # link is not set, the result is still waited upon
@@ -297,7 +722,8 @@ class JobDB:
 
             if rec.result is not None:
                 # result is found! return it
-                result_value = self.registry.from_json(rec.result, deref=True)
+                result_value = self.registry.from_json(
+                    self._result_text(rec), deref=True)
                 result = ResultMessage(
                     key, 'retrieved', result_value, None)
                 return 'retrieved', result
@@ -309,10 +735,10 @@ class JobDB:
 
     def job_exists(self, prov):
         """Check if a job exists in the database."""
-        with self.lock:
-            self.cur.execute('select * from "jobs" where "prov" = ?;', (prov,))
-            rec = self.cur.fetchone()
-            return rec is not None
+        if self.prov_index.get(prov):
+            return True
+        rec = self._read('select "id" from "jobs" where "prov" = ?;', (prov,))
+        return rec is not None
 
     def store_result_in_db(self, result, always_cache=True):
         """Store a result in the database."""
@@ -328,10 +754,19 @@ class JobDB:
         def store_result(status):
             result_value_msg = self.registry.to_json(result.value)
             with self.lock:
-                self.cur.execute(
+                self._update_row(
+                    result.key, result=result_value_msg, status=status)
+                row = self.rows.get(result.key)
+                if self.cache is not None and status != Status.WORKFLOW \
+                        and row is not None and row.prov is not None:
+                    self.cache.put(row.prov, row)
+                stored = self._store_blob(result_value_msg)
+                self._write(
                     'update "jobs" set "result" = ?, '
                     '"status" = ? where "id" = ?;',
-                    (result_value_msg, status, result.key))
+                    (stored, status, result.key),
+                    partial(self._result_written, result.key,
+                            result_value_msg, stored))
 
         def acquire_links():
             with self.lock:
@@ -340,10 +775,12 @@ class JobDB:
 
                 # update links for jobs up in the call-stack (parent workflows)
                 n_questions = ','.join('?' * len(linked_keys))
-                self.cur.execute(
+                self._write(
                     'update "jobs" set "link" = ? where "id" in ({});'
                     .format(n_questions),
                     (result.key,) + linked_keys)
+                for k in linked_keys:
+                    self._update_row(k, link=result.key)
 
                 # jobs that were attached to the parent workflow(s) will not
                 # receive the current result automatically, so we need to force
@@ -391,6 +828,6 @@ class JobDB:
     def add_time_stamp(self, db_id, name):
         """Add a timestamp to the database."""
         with self.lock:
-            self.cur.execute(
+            self._write(
                 'insert into "timestamps" ("job", "what")'
                 'values (?, ?);', (db_id, name))
@@ -1,5 +1,4 @@
-from ..workflow import (Workflow, is_node_ready, Empty)
-from ..workflow.arguments import (serialize_arguments, ref_argument)
+from ..workflow import (Workflow, is_node_ready, node_arguments, Empty)
 from ..serial import (Registry)
 from .key import (prov_key)
 
@@ -12,12 +11,26 @@ def links(wf, i, deps):
 
 
 def empty_args(n):
-    for arg in serialize_arguments(n.bound_args):
-        if ref_argument(n.bound_args, arg) == Empty:
+    for arg, value in node_arguments(n):
+        if value is Empty:
             yield arg
 
 
-def set_global_provenance(wf: Workflow, registry: Registry):
+def node_prov_key(node, registry: Registry, hash_function='md5'):
+    """Compute the local provenance key of `node` from its encoding by
+    :py:meth:`Registry.hash_encode`. The key is cached on the node for the
+    given registry and hash function, until an argument is inserted."""
+    cached = node.local_prov
+    if cached is None or cached[0] is not registry \
+            or cached[1] != hash_function:
+        key = prov_key(
+            registry.hash_encode(node), hash_function=hash_function)
+        node.local_prov = cached = (registry, hash_function, key)
+    return cached[2]
+
+
+def set_global_provenance(wf: Workflow, registry: Registry,
+                          hash_function='md5'):
     """Compute a global provenance key for the entire workflow
     before evaluation. This key can be used to store and retrieve
     results in a database. The key computed in this stage is different
@@ -38,7 +51,9 @@ def set_global_provenance(wf: Workflow, registry: Registry):
     In this algorithm we traverse from the bottom of the DAG to the top
     and back using a stack. This allows us to compute the keys for each
     node without modifying the node other than setting the `prov` attribute
-    with the resulting key."""
+    with the resulting key.
+
+    The `hash_function` is passed on to :py:func:`prov_key`."""
     stack = [wf.root]
 
     while stack:
@@ -49,8 +64,7 @@ def set_global_provenance(wf: Workflow, registry: Registry):
             continue
 
         if is_node_ready(n):
-            job_msg = registry.deep_encode(n)
-            n.prov = prov_key(job_msg)
+            n.prov = node_prov_key(n, registry, hash_function)
             continue
 
         deps = wf.inverse_links[i]
@@ -60,8 +74,8 @@ def set_global_provenance(wf: Workflow, registry: Registry):
             link_dict = dict(links(wf, i, deps))
             link_prov = registry.deep_encode(
                 [link_dict[arg] for arg in empty_args(n)])
-            job_msg = registry.deep_encode(n)
-            n.prov = prov_key(job_msg, link_prov)
+            job_msg = registry.hash_encode(n)
+            n.prov = prov_key(job_msg, link_prov, hash_function)
             continue
 
         stack.append(i)
@@ -124,6 +124,38 @@ runners = [
         'command': 'noodles.run.process.run_process',
         'arguments': {
         }
+    },
+
+    {
+        'name': 'pool',
+        'features': ['msgpack'],
+        'description': """
+            Run jobs in a pool of worker processes started by
+            `multiprocessing`. Each job goes to the worker with the fewest
+            jobs in flight; workers can be replaced after a number of jobs
+            to bound memory leaks.""",
+        'command': 'noodles.run.pool.run_pool',
+        'arguments': {
+            'n_processes': {
+                'default': '1',
+                'reader': 'integer',
+                'help': 'the number of worker processes'
+            },
+            'registry': {
+                'default': 'noodles.serial.base',
+                'reader': 'look-up',
+                'help': 'the serialisation registry to use'
+            },
+            'transport': {
+                'default': 'pickle',
+                'help': "how to send messages: 'pickle', 'json' or 'msgpack'"
+            },
+            'max_in_flight': {
+                'default': '2',
+                'reader': 'integer',
+                'help': 'the maximum number of jobs sent to one worker'
+            }
+        }
     }
 ]
 
@@ -1,8 +1,12 @@
+import queue
 import threading
+from collections import deque
 
 from ..workflow import get_workflow
 from ..lib import Queue, Connection, push, patch, EndOfQueue, FlushQueue
+from .messages import ResultMessage
 from .scheduler import Scheduler
+from .selectors import Selector
 from .worker import run_job
 
 
@@ -64,7 +68,13 @@ def hybrid_threaded_worker(selector, workers):
     done in a separate thread for each worker. In this design it is
     assumed that dispatching a job takes little time, while waiting for
     one to return a result may take a long time.
+
+    If `selector` is a :py:class:`Selector` object, the jobs are
+    dispatched by :py:func:`hybrid_balanced_worker` instead.
     """
+    if isinstance(selector, Selector):
+        return hybrid_balanced_worker(selector, workers)
+
     result_queue = Queue()
 
     job_sink = {k: w.sink() for k, w in workers.items()}
@@ -108,7 +118,115 @@ def hybrid_threaded_worker(selector, workers):
     return Connection(result_queue.source, dispatch_job)
 
 
-def run_hybrid(wf, selector, workers):
+def hybrid_balanced_worker(selector, workers):
+    """Runs a set of workers, each in a separate thread, sending jobs to the
+    workers chosen by a :py:class:`Selector`, which keeps track of the
+    jobs in flight on each worker.
+
+    :param selector:
+        The selector object.
+    :type selector: Selector
+    :param workers:
+        A dictionary of workers.
+
+    :returns:
+        A connection for the scheduler.
+    :rtype: Connection
+
+    Jobs may wait in the selector until a worker has room for them, so
+    jobs are sent to the workers from a separate thread, which receives
+    new jobs from the scheduler and keys of finished jobs from the threads
+    reading results. After a flush, waiting jobs are dropped; once the
+    jobs in flight are done, the workers are sent `EndOfQueue` and the
+    results end.
+    """
+    result_queue = Queue()
+    events = queue.Queue()
+    job_sink = {k: w.sink() for k, w in workers.items()}
+    selector.setup(workers.keys())
+
+    def send_all(msg):
+        for k in workers.keys():
+            try:
+                job_sink[k].send(msg)
+            except StopIteration:
+                pass
+
+    def dispatch():
+        error_sink = result_queue.sink()
+        flushing = False
+
+        while True:
+            kind, msg = events.get()
+            if kind == 'end':
+                send_all(EndOfQueue)
+                return
+
+            if kind == 'flush':
+                flushing = True
+                selector.flush()
+                sends = []
+            elif kind == 'done':
+                sends = selector.complete(msg)
+            elif flushing:
+                continue
+            else:
+                try:
+                    sends = selector.submit(msg)
+                except ValueError as exc:
+                    error_sink.send(ResultMessage(msg.key, 'error', None, exc))
+                    continue
+
+            sends = deque(sends)
+            while sends:
+                worker, job = sends.popleft()
+                try:
+                    job_sink[worker].send(job)
+                except StopIteration:
+                    error_sink.send(ResultMessage(
+                        job.key, 'error', None,
+                        RuntimeError("Worker {} has stopped.".format(worker))))
+                    sends.extend(selector.complete(job.key))
+
+            if flushing and selector.idle():
+                send_all(EndOfQueue)
+                result_queue.close()
+                return
+
+    def read_results(worker):
+        sink = result_queue.sink()
+        for result in worker.source():
+            sink.send(result)
+            events.put(('done', result.key))
+
+    dispatcher = threading.Thread(target=dispatch, daemon=True)
+    dispatcher.start()
+
+    for worker in workers.values():
+        t = threading.Thread(target=read_results, args=(worker,))
+        t.daemon = True
+        t.start()
+
+    @push
+    def send_job():
+        while True:
+            msg = yield
+
+            if msg is EndOfQueue:
+                events.put(('end', None))
+                dispatcher.join()
+                return
+
+            if msg is FlushQueue:
+                events.put(('flush', None))
+                continue
+
+            events.put(('job', msg))
+
+    return Connection(result_queue.source, send_job)
+
+
+def run_hybrid(wf, selector, workers, priority=None):
     """
     Returns the result of evaluating the workflow; runs through several
     supplied workers in as many threads.
@@ -118,12 +236,18 @@ def run_hybrid(wf, selector, workers):
     :type wf: :py:class:`Workflow` or :py:class:`PromisedObject`
 
     :param selector:
-        A function selecting the worker that should be run, given a hint.
+        A function selecting the worker that should be run, given a hint,
+        or a :py:class:`Selector` object.
     :param workers:
         A dictionary of workers
 
+    :param priority:
+        A :py:class:`noodles.run.priority.CriticalPath` giving priorities to
+        the jobs; the selector, or the job queues of the workers, should
+        use the same object.
+
     :returns:
         result of running the workflow
     """
     worker = hybrid_threaded_worker(selector, workers)
-    return Scheduler().run(worker, get_workflow(wf))
+    return Scheduler(priority=priority).run(worker, get_workflow(wf))
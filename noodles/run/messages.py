@@ -6,6 +6,9 @@ There are currently three types of messages:
     * ``ResultMessage``, a worker returning a result.
     * ``PilotMessage``, extra communication back and forth, status updates,
     performance information, but also stopping a worker in a nice way.
+
+Any of these may be grouped in a ``BatchMessage`` to save on the overhead of
+sending many small messages.
 """
 
 from ..serial import Reasonable
@@ -43,3 +46,14 @@ class PilotMessage(Reasonable):
     def __init__(self, msg, **kwargs):
         self.msg = msg
         self.__dict__.update(kwargs)
+
+
+class BatchMessage(Reasonable):
+    def __init__(self, messages):
+        self.messages = messages
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self):
+        return len(self.messages)
@@ -0,0 +1,450 @@
+"""
+Process pool backend
+====================
+
+Run jobs in a pool of Python processes started with :py:mod:`multiprocessing`.
+Unlike :py:func:`run_process`, no new interpreter is started through the
+command-line, and messages are sent over :py:func:`multiprocessing.Pipe`
+connections, pickled by default. Scheduled functions are pickled by name, so
+that the worker finds the undecorated function, and promised objects are
+pickled as their workflow.
+
+Each job goes to the worker with the fewest jobs in flight. A worker is
+given at most `max_in_flight` jobs at a time; other jobs wait in the
+scheduler process until a worker has room. If `max_jobs_per_worker` is
+given, a worker is replaced by a fresh process after running that many
+jobs, to bound the memory leaked by long running workers.
+
+Every worker has a thread of its own sending it jobs, so that a large job
+being written to a worker never stops the results of other jobs from being
+read, which would deadlock if the worker is itself writing a large result.
+"""
+
+import io
+import multiprocessing
+import os
+import pickle
+import queue
+import sys
+import threading
+import types
+from collections import deque
+from multiprocessing.connection import wait
+
+from ..lib import (
+    Connection, Queue, push, EndOfQueue, FlushQueue,
+    object_name, look_up, unwrap, is_unwrapped)
+from ..interface import (PromisedObject)
+from ..workflow import (get_workflow)
+from .messages import (ResultMessage)
+from .scheduler import (Scheduler)
+from .worker import (run_job)
+
+
+transports = ['pickle', 'json', 'msgpack']
+"""Ways to send messages between scheduler and workers: pickled by
+:py:mod:`multiprocessing`, or encoded by the serialisation registry."""
+
+
+class Pickler(pickle.Pickler):
+    """Pickles scheduled functions and methods by name. Pickling them by
+    reference would fail, since the name refers to the decorated
+    function. A :py:class:`PromisedObject` is pickled as its workflow."""
+    def persistent_id(self, obj):
+        if type(obj) is PromisedObject:
+            return ('promise', obj._workflow)
+
+        if type(obj) is not types.FunctionType:
+            return None
+
+        cls = getattr(obj, '__member_of__', None)
+        if cls:
+            return ('method', object_name(cls), obj.__name__)
+        if is_unwrapped(obj):
+            return ('unwrapped', object_name(obj))
+        return None
+
+
+class Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        if pid[0] == 'promise':
+            return PromisedObject(pid[1])
+        if pid[0] == 'method':
+            return unwrap(getattr(look_up(pid[1]), pid[2]))
+        return unwrap(look_up(pid[1]))
+
+
+def _pickle(msg):
+    fo = io.BytesIO()
+    Pickler(fo, pickle.HIGHEST_PROTOCOL).dump(msg)
+    return fo.getvalue()
+
+
+def _unpickle(data):
+    return Unpickler(io.BytesIO(data)).load()
+
+
+def _encoder(registry, transport, host=None):
+    """Function encoding a message to bytes."""
+    if transport == 'pickle':
+        return _pickle
+    if transport == 'json':
+        return lambda msg: registry.to_json(msg, host=host).encode()
+    return lambda msg: registry.to_msgpack(msg, host=host)
+
+
+def _decoder(registry, transport, deref=False):
+    """Function decoding a message from bytes."""
+    if transport == 'pickle':
+        return _unpickle
+    if transport == 'json':
+        return lambda data: registry.from_json(data.decode(), deref=deref)
+    return lambda data: registry.from_msgpack(data, deref=deref)
+
+
+def init_with_stdout_to_stderr(init=None):
+    """Init function for workers that may not write to standard output,
+    because it is used to send messages, as in the pilot job. Runs `init`
+    if given."""
+    sys.stdout = sys.stderr
+    if init:
+        init()
+
+
+def pool_worker(conn, registry, transport, init, finish, scheduler_pid):
+    """Main function of a worker process: receives jobs from `conn` and
+    sends back results, until an empty message is received."""
+    os.environ['NOODLES_SCHEDULER_PID'] = str(scheduler_pid)
+    reg = registry() if registry else None
+    name = 'pool-worker-{}'.format(os.getpid())
+    encode = _encoder(reg, transport, host=name)
+    decode = _decoder(reg, transport, deref=True)
+
+    if init:
+        init()
+
+    while True:
+        msg = conn.recv_bytes()
+        if not msg:
+            break
+
+        key, job = decode(msg)
+        result = run_job(key, job)
+        try:
+            conn.send_bytes(encode(result))
+        except Exception as exc:
+            conn.send_bytes(encode(ResultMessage(
+                key, 'error', None, RuntimeError(
+                    "could not send result: {!r}".format(exc)))))
+
+    if finish:
+        finish()
+    conn.close()
+
+
+class PoolWorker:
+    """Scheduler side record of a worker process.
+
+    .. py:attribute:: in_flight
+
+        Set of keys of the jobs sent to this worker, without a result yet.
+
+    .. py:attribute:: n_jobs
+
+        Number of jobs sent to this worker.
+
+    .. py:attribute:: retiring
+
+        Set when the worker should not receive more jobs.
+
+    .. py:attribute:: outbox
+
+        Queue of job messages to be sent by the sender thread; `None` tells
+        the worker to stop.
+    """
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.in_flight = set()
+        self.n_jobs = 0
+        self.retiring = False
+        self.outbox = queue.Queue()
+
+
+class ProcessPool:
+    """Pool of worker processes, giving a :py:class:`Connection` to the
+    scheduler through :py:meth:`connection`. See :py:func:`run_pool` for
+    the meaning of the arguments."""
+    def __init__(self, n_processes, registry=None, transport='pickle',
+                 max_in_flight=2, max_jobs_per_worker=None,
+                 init=None, finish=None, context=None):
+        if transport not in transports:
+            raise ValueError("Unknown transport: {}".format(transport))
+        if transport != 'pickle' and registry is None:
+            raise ValueError(
+                "The '{}' transport needs a registry.".format(transport))
+
+        self.registry = registry
+        self.transport = transport
+        self.max_in_flight = max_in_flight
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.init = init
+        self.finish = finish
+        self.context = multiprocessing.get_context(context)
+
+        reg = registry() if registry else None
+        self.encode = _encoder(reg, transport, host='localhost')
+        self.decode = _decoder(reg, transport)
+
+        self.lock = threading.Lock()
+        self.waiting = deque()
+        self.workers = []
+        self.results = Queue()
+        self.flushing = False
+        self.ending = False
+        self.closed = False
+
+        with self.lock:
+            for _ in range(n_processes):
+                self._start_worker()
+
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def _start_worker(self):
+        conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=pool_worker, daemon=True,
+            args=(child_conn, self.registry, self.transport,
+                  self.init, self.finish, os.getpid()))
+        process.start()
+        child_conn.close()
+        worker = PoolWorker(process, conn)
+        self.workers.append(worker)
+        threading.Thread(
+            target=self._send, args=(worker,), daemon=True).start()
+
+    def _send(self, worker):
+        """Sender thread of a worker: encodes and writes the messages in its
+        outbox, until the worker is told to stop or its pipe is closed."""
+        sink = self.results.sink()
+        while True:
+            msg = worker.outbox.get()
+            if msg is None:
+                data = b''
+            else:
+                try:
+                    data = self.encode(msg)
+                except Exception as exc:
+                    with self.lock:
+                        worker.in_flight.discard(msg.key)
+                    sink.send(ResultMessage(msg.key, 'error', None, exc))
+                    continue
+
+            try:
+                worker.conn.send_bytes(data)
+            except (OSError, ValueError):
+                return
+            if msg is None:
+                return
+
+    def _retire(self, worker):
+        worker.retiring = True
+        worker.outbox.put(None)
+
+    def _dispatch(self):
+        """Pass waiting jobs to the sender threads of the least loaded
+        workers. Call this while holding the lock."""
+        while self.waiting:
+            active = [w for w in self.workers if not w.retiring
+                      and len(w.in_flight) < self.max_in_flight]
+            if not active:
+                return
+
+            worker = min(active, key=lambda w: (len(w.in_flight), w.n_jobs))
+            msg = self.waiting.popleft()
+            worker.in_flight.add(msg.key)
+            worker.n_jobs += 1
+            worker.outbox.put(msg)
+
+            if self.max_jobs_per_worker is not None \
+                    and worker.n_jobs >= self.max_jobs_per_worker:
+                self._retire(worker)
+                self._start_worker()
+
+    def _finished(self):
+        """Whether all work is done after a flush or the end of the jobs.
+        Call this while holding the lock."""
+        if self.flushing:
+            return not any(w.in_flight for w in self.workers)
+        if self.ending:
+            return not self.waiting \
+                and not any(w.in_flight for w in self.workers)
+        return False
+
+    def _read(self):
+        sink = self.results.sink()
+        while True:
+            with self.lock:
+                conns = {w.conn: w for w in self.workers}
+            if not conns:
+                return
+
+            for conn in wait(list(conns), timeout=0.1):
+                worker = conns[conn]
+                try:
+                    result = self.decode(conn.recv_bytes())
+                except (EOFError, OSError):
+                    self._worker_exited(worker, sink)
+                    continue
+
+                with self.lock:
+                    worker.in_flight.discard(result.key)
+                    if not self.flushing:
+                        self._dispatch()
+                    done = self._finished()
+
+                sink.send(result)
+                if done:
+                    try:
+                        sink.send(EndOfQueue)
+                    except StopIteration:
+                        pass
+                    if self.ending:
+                        self.close()
+                    return
+
+    def _worker_exited(self, worker, sink):
+        with self.lock:
+            self.workers.remove(worker)
+            worker.outbox.put(None)
+            worker.conn.close()
+            lost = list(worker.in_flight)
+            if not worker.retiring and not self.closed:
+                self._start_worker()
+                self._dispatch()
+
+        for key in lost:
+            sink.send(ResultMessage(key, 'aborted', None, RuntimeError(
+                "worker process {} exited with code {}".format(
+                    worker.process.pid, worker.process.exitcode))))
+
+    def connection(self):
+        """Get the :py:class:`Connection` to pass to the scheduler. After
+        `EndOfQueue` is sent, the jobs sent before are still run, and the
+        results end and the workers are stopped once they are all
+        returned; after `FlushQueue`, the
+        jobs that were not yet sent to a worker are dropped."""
+        @push
+        def send_job():
+            while True:
+                msg = yield
+                if msg is EndOfQueue:
+                    with self.lock:
+                        self.ending = True
+                        done = self._finished()
+                    if done:
+                        self.results.close()
+                        self.close()
+                    return
+
+                with self.lock:
+                    if msg is FlushQueue:
+                        self.flushing = True
+                        self.waiting.clear()
+                        if self._finished():
+                            self.results.close()
+                        continue
+
+                    self.waiting.append(msg)
+                    self._dispatch()
+
+        return Connection(self.results.source, send_job)
+
+    def close(self):
+        """Stop all workers, waiting for them to finish their jobs."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            workers = list(self.workers)
+            for worker in workers:
+                if not worker.retiring:
+                    self._retire(worker)
+
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+
+def run_pool(workflow, *, n_processes, registry=None, transport='pickle',
+             max_in_flight=2, max_jobs_per_worker=None,
+             init=None, finish=None, context=None, deref=False,
+             release_results=False):
+    """Run the workflow in a pool of worker processes.
+
+    :param workflow:
+        The workflow.
+    :type workflow: `Workflow` or `PromisedObject`
+
+    :param n_processes:
+        Number of processes to start.
+
+    :param registry:
+        The serial registry; needed for the `'json'` and `'msgpack'`
+        transports.
+
+    :param transport:
+        How to send jobs and results: `'pickle'` (the default) lets
+        :py:mod:`multiprocessing` pickle them, `'json'` and `'msgpack'`
+        encode them with the `registry`.
+    :type transport: str
+
+    :param max_in_flight:
+        Maximum number of jobs sent to a worker at the same time. Values
+        larger than one let a worker receive its next job while running
+        the current one.
+    :type max_in_flight: int
+
+    :param max_jobs_per_worker:
+        If given, a worker process is replaced by a new one after it was
+        sent this many jobs.
+    :type max_jobs_per_worker: int
+
+    :param init:
+        A function to run in each worker process before running jobs.
+
+    :param finish:
+        A function to run in each worker process when it is stopped.
+
+    :param context:
+        The :py:mod:`multiprocessing` start method, `'fork'`, `'spawn'` or
+        `'forkserver'`; by default that of the platform.
+
+    :param deref:
+        Set this to True to pass the result through one more encoding and
+        decoding step with object derefencing turned on.
+    :type deref: bool
+
+    :param release_results:
+        Free intermediate results as soon as no job needs them anymore (see
+        :py:class:`Scheduler`).
+    :type release_results: bool
+
+    :returns: the result of evaluating the workflow
+    :rtype: any
+    """
+    pool = ProcessPool(
+        n_processes, registry, transport, max_in_flight,
+        max_jobs_per_worker, init, finish, context)
+    try:
+        result = Scheduler(release_results=release_results).run(
+            pool.connection(), get_workflow(workflow))
+    finally:
+        pool.close()
+
+    if deref:
+        return registry().dereference(result, host='localhost')
+    else:
+        return result
@@ -0,0 +1,232 @@
+"""
+Priority scheduling
+===================
+
+By default jobs go to the workers in the order in which they become ready.
+If a workflow has a long chain of jobs next to many short ones, and the chain
+starts late, the chain sets the time the whole workflow takes. A
+:py:class:`CriticalPath` gives every job a priority: the length of the
+longest path from its node to the root of the workflow, so that the jobs on
+the critical path go first.
+
+At first the length of a path is its number of nodes. Once jobs are done, a
+node counts with the mean duration of the jobs of its function (see
+:py:class:`DurationStats`), relative to the mean duration of all jobs; nodes
+of functions that didn't run yet count as one. A job with a `priority` hint
+gets that priority instead.
+
+The priorities are used by a ready queue that hands out jobs with the highest
+priority first: a :py:class:`noodles.lib.PriorityQueue` in front of a thread
+pool, or the waiting jobs of a :py:class:`noodles.run.selectors.Selector`. ::
+
+    priority = CriticalPath()
+    threaded_worker = priority.queue() >> thread_pool(*repeat(worker, 4))
+    Scheduler(priority=priority).run(threaded_worker, get_workflow(wf))
+"""
+
+import time
+from bisect import insort
+from itertools import count
+
+from ..lib import PriorityQueue
+
+
+def path_lengths(wf, cost, tail=0):
+    """Compute the length of the longest path from every node in `wf` to its
+    root, counting each node with `cost(node)`. The root counts as having a
+    path of length `tail` after it.
+
+    :returns: `dict` of lengths by node id.
+    """
+    lengths = {}
+    for start in wf.nodes:
+        if start in lengths:
+            continue
+
+        stack = [start]
+        while stack:
+            n = stack[-1]
+            todo = [t for t, _ in wf.links[n] if t not in lengths]
+            if todo:
+                stack.extend(todo)
+                continue
+
+            stack.pop()
+            if n not in lengths:
+                lengths[n] = cost(wf.nodes[n]) + max(
+                    (lengths[t] for t, _ in wf.links[n]), default=tail)
+
+    return lengths
+
+
+class DurationStats:
+    """Mean duration of the jobs of each function, by function name."""
+    def __init__(self):
+        self.n = {}
+        self.total = {}
+
+    def record(self, name, duration):
+        """Record the duration of a job; returns `True` if this is the first
+        job of its function."""
+        new = name not in self.n
+        self.n[name] = self.n.get(name, 0) + 1
+        self.total[name] = self.total.get(name, 0.0) + duration
+        return new
+
+    def mean(self, name=None):
+        """Mean duration of the jobs of function `name`, or of all jobs;
+        `None` if there are no such jobs."""
+        if name is None:
+            n = sum(self.n.values())
+            return sum(self.total.values()) / n if n else None
+        if name not in self.n:
+            return None
+        return self.total[name] / self.n[name]
+
+
+class ReadyQueue:
+    """Jobs waiting to be sent, ordered by `priority`: a drop-in replacement
+    for a :py:class:`collections.deque` of waiting jobs in a selector. The
+    front of the queue has the highest priority; of equal priorities, jobs
+    that were `append` ed come after, and jobs that were put back with
+    `extendleft` before the jobs that are there already.
+
+    The first element of each item is a job message, which `priority` is
+    called with."""
+    def __init__(self, priority):
+        self.priority = priority
+        self.items = []
+        self.back = count()
+        self.front = count(-1, -1)
+
+    def _insert(self, item, seq):
+        insort(self.items, (self.priority(item[0]), -seq, item))
+
+    def append(self, item):
+        self._insert(item, next(self.back))
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def extendleft(self, items):
+        for item in items:
+            self._insert(item, next(self.front))
+
+    def popleft(self):
+        return self.items.pop()[2]
+
+    def pop(self):
+        return self.items.pop(0)[2]
+
+    def __getitem__(self, i):
+        return self.items[-1 - i][2]
+
+    def remove(self, item):
+        for i, entry in enumerate(self.items):
+            if entry[2] is item:
+                del self.items[i]
+                return
+        raise ValueError("item not in queue")
+
+    def clear(self):
+        self.items.clear()
+
+    def __iter__(self):
+        return (entry[2] for entry in reversed(self.items))
+
+    def __reversed__(self):
+        return (entry[2] for entry in self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class CriticalPath:
+    """Gives jobs a priority by the estimated length of the critical path
+    from their node to the end of the workflow.
+
+    :param learn: refine the estimates with the durations of finished jobs.
+    :type learn: bool
+
+    The :py:class:`Scheduler` tells the object about new workflows and jobs;
+    the object itself is the priority function of job messages. The ready
+    queue calls :py:meth:`started` when a job leaves the queue, so that its
+    duration can be measured.
+
+    .. py:attribute:: stats
+
+        The :py:class:`DurationStats` of the finished jobs.
+    """
+    def __init__(self, learn=True):
+        self.learn = learn
+        self.stats = DurationStats()
+        self.version = 0
+        self.workflows = {}
+        self.priorities = {}
+        self.names = {}
+        self.start_times = {}
+
+    def cost(self, node):
+        """Estimated duration of a job, relative to the mean duration of
+        all jobs."""
+        mean = self.stats.mean(node.foo.__name__)
+        if mean is None:
+            return 1.0
+        return mean / (self.stats.mean() or 1.0)
+
+    def add_workflow(self, wf, parent=None):
+        """Start tracking `wf`. If the workflow is the result of a node in
+        another workflow, `parent` gives the `(workflow, node_id)` of that
+        node."""
+        tail = 0
+        if parent is not None:
+            tail = self.length(*parent)
+        self.workflows[id(wf)] = [wf, tail, -1, None]
+
+    def remove_workflow(self, wf_id):
+        """Stop tracking the workflow with id `wf_id`."""
+        self.workflows.pop(wf_id, None)
+
+    def length(self, wf, n):
+        """Estimated length of the critical path from node `n` in `wf`."""
+        entry = self.workflows.get(id(wf))
+        if entry is None:
+            return 0
+        if entry[2] != self.version:
+            entry[3] = path_lengths(wf, self.cost, entry[1])
+            entry[2] = self.version
+        return entry[3][n]
+
+    def job_priority(self, job):
+        """The priority of a :py:class:`Job`."""
+        hints = job.node.hints or {}
+        if 'priority' in hints:
+            return hints['priority']
+        return self.length(job.workflow, job.node_id)
+
+    def schedule(self, key, job):
+        """Give the job with `key` its priority."""
+        self.priorities[key] = self.job_priority(job)
+        self.names[key] = job.node.foo.__name__
+
+    def __call__(self, msg):
+        return self.priorities.get(msg.key, 0)
+
+    def started(self, msg):
+        """Called when the job in `msg` is sent to a worker."""
+        self.start_times[msg.key] = time.perf_counter()
+
+    def done(self, key):
+        """Called when the job with `key` is finished."""
+        self.priorities.pop(key, None)
+        name = self.names.pop(key, None)
+        start = self.start_times.pop(key, None)
+        if self.learn and start is not None:
+            if self.stats.record(name, time.perf_counter() - start):
+                self.version += 1
+
+    def queue(self, maxsize=0):
+        """A :py:class:`noodles.lib.PriorityQueue` of jobs in order of
+        priority, measuring the durations of the jobs."""
+        return PriorityQueue(self, on_get=self.started, maxsize=maxsize)
@@ -5,29 +5,46 @@ Process backend
 Run jobs using a process backend.
 """
 
+import os
 import sys
 import uuid
 from subprocess import Popen, PIPE
 import threading
 # import logging
 
-import random
 from ..workflow import get_workflow
 # from ..logger import log
 from .scheduler import Scheduler
 # from .protect import CatchExceptions
 from .hybrid import hybrid_threaded_worker
+from .selectors import get_selector
 
 from ..lib import (pull, push, Connection, object_name, EndOfQueue, FlushQueue)
 from .messages import (EndOfWork)
 
-from .remote.io import (JSONObjectReader, JSONObjectWriter)
+from .remote.io import (get_format)
+from .remote.batch import (BatchWriter, unbatch)
 
 
 def process_worker(registry, verbose=False, jobdirs=False,
-                   init=None, finish=None, status=True):
-    """Process worker"""
+                   init=None, finish=None, status=True,
+                   batch_size=1, batch_linger=0.01, format='json',
+                   n_threads=1, subprocesses=False):
+    """Process worker
+
+    If `batch_size` is larger than one, jobs are sent to the worker in
+    batches of at most `batch_size` jobs, waiting at most `batch_linger`
+    seconds for a batch to fill up. The worker sends back results in
+    batches in the same way.
+
+    The `format` of messages is either `'json'` or `'msgpack'`; the
+    latter is a binary format that sends byte strings (and NumPy arrays)
+    without Base64 encoding.
+
+    The worker runs `n_threads` jobs at the same time, in as many threads,
+    or in a pool of processes if `subprocesses` is set."""
     name = "process-" + str(uuid.uuid4())
+    reader, writer, binary = get_format(format)
 
     cmd = [sys.prefix + "/bin/python", "-m", "noodles.pilot_job",
            "-name", name, "-registry", object_name(registry)]
@@ -41,14 +58,26 @@ def process_worker(registry, verbose=False, jobdirs=False,
         cmd.extend(["-init", object_name(init)])
     if finish:
         cmd.extend(["-finish", object_name(finish)])
+    if batch_size > 1:
+        cmd.extend(["-batch-size", str(batch_size),
+                    "-batch-linger", str(batch_linger)])
+    if format != 'json':
+        cmd.extend(["-format", format])
+    if n_threads > 1:
+        cmd.extend(["-n", str(n_threads)])
+        if subprocesses:
+            cmd.append("-processes")
 
     remote = Popen(
         cmd,
-        stdin=PIPE, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        stdin=PIPE, stdout=PIPE, stderr=PIPE, universal_newlines=not binary,
+        env=dict(os.environ, NOODLES_SCHEDULER_PID=str(os.getpid())))
 
     def read_stderr():
         """Read stderr of remote process and sends lines to logger."""
         for line in remote.stderr:
+            if binary:
+                line = line.decode(errors='replace')
             print(name + ": " + line.rstrip())
 
     stderr_reader_thread = threading.Thread(target=read_stderr, daemon=True)
@@ -59,13 +88,14 @@ def process_worker(registry, verbose=False, jobdirs=False,
         """Coroutine, sends jobs to remote worker over standard input."""
         reg = registry()
 
-        sink = JSONObjectWriter(reg, remote.stdin)
+        sink = BatchWriter(
+            writer(reg, remote.stdin), batch_size, batch_linger)
 
         while True:
             msg = yield
             if msg is EndOfQueue:
                 try:
-                    sink.send(EndOfWork)
+                    sink.close(EndOfWork)
                 except StopIteration:
                     pass
 
@@ -83,14 +113,18 @@ def process_worker(registry, verbose=False, jobdirs=False,
     def get_result():
         """Generator, reading results from process standard output."""
         reg = registry()
-        yield from JSONObjectReader(reg, remote.stdout)
+        yield from unbatch(reader(reg, remote.stdout))
 
     return Connection(get_result, send_job)
 
 
 def run_process(workflow, *, n_processes, registry,
                 verbose=False, jobdirs=False,
-                init=None, finish=None, deref=False):
+                init=None, finish=None, deref=False,
+                batch_size=1, batch_linger=0.01, format='json',
+                selector='random', max_in_flight=None, resources=None,
+                n_threads=1, subprocesses=False, release_results=False,
+                priority=None, window=None):
     """Run the workflow using a number of new python processes. Use this
     runner to test the workflow in a situation where data serial
     is needed.
@@ -124,22 +158,88 @@ def run_process(workflow, *, n_processes, registry,
         decoding step with object derefencing turned on.
     :type deref: bool
 
+    :param batch_size:
+        Maximum number of jobs (and results) sent to (and from) a worker in
+        a single message. Batching saves on overhead when running many short
+        jobs.
+    :type batch_size: int
+
+    :param batch_linger:
+        Maximum time in seconds that a job or result waits for a batch to
+        fill up.
+    :type batch_linger: float
+
+    :param format:
+        Wire format of messages between scheduler and workers, either
+        `'json'` or `'msgpack'`. MessagePack sends binary data (like NumPy
+        arrays) as is, and needs the `msgpack` package.
+    :type format: str
+
+    :param selector:
+        How to choose the worker for a job: `'random'` (the default),
+        `'round-robin'`, `'least-loaded'` or `'work-stealing'` (see
+        :py:data:`noodles.run.selectors.selectors`), or a
+        :py:class:`Selector` object.
+
+    :param max_in_flight:
+        Maximum number of jobs sent to a worker at the same time. Jobs
+        that are ready at the same time are spread over the workers when
+        they are sent, so set this to balance jobs of uneven duration.
+    :type max_in_flight: int
+
+    :param resources:
+        Resources of each worker, matched to the hints of the jobs, for
+        instance `{'memory': 16e9}`. Jobs wait in the selector until they
+        fit; the `max_concurrent` hint of a function limits the number of
+        its jobs running over all workers.
+    :type resources: dict
+
+    :param n_threads:
+        Number of jobs each worker process runs at the same time.
+    :type n_threads: int
+
+    :param subprocesses:
+        Set this to run the jobs of a worker in a pool of `n_threads`
+        processes, in stead of threads; for jobs that hold on to the GIL.
+    :type subprocesses: bool
+
+    :param release_results:
+        Free intermediate results as soon as no job needs them anymore (see
+        :py:class:`Scheduler`).
+    :type release_results: bool
+
+    :param priority:
+        A :py:class:`noodles.run.priority.CriticalPath`, to send the jobs on
+        the critical path first. Jobs wait in the selector to be ordered,
+        so `max_in_flight` defaults to `n_threads`.
+
+    :param window:
+        Maximum number of jobs in flight over all workers; other ready jobs
+        wait in the scheduler, so that they are not all encoded and sent at
+        once (see :py:class:`Scheduler`).
+    :type window: int
+
     :returns: the result of evaluating the workflow
     :rtype: any
     """
     workers = {}
     for i in range(n_processes):
-        new_worker = process_worker(registry, verbose, jobdirs, init, finish)
+        new_worker = process_worker(
+            registry, verbose, jobdirs, init, finish,
+            batch_size=batch_size, batch_linger=batch_linger, format=format,
+            n_threads=n_threads, subprocesses=subprocesses)
         workers['worker {0:2}'.format(i)] = new_worker
 
-    worker_names = list(workers.keys())
-
-    def random_selector(_):
-        """Selects a worker to send a job to at random."""
-        return random.choice(worker_names)
-
-    master_worker = hybrid_threaded_worker(random_selector, workers)
-    result = Scheduler().run(master_worker, get_workflow(workflow))
+    if priority is not None and max_in_flight is None:
+        max_in_flight = n_threads
+    selector = get_selector(
+        selector, max_in_flight=max_in_flight, resources=resources,
+        priority=priority)
+    master_worker = hybrid_threaded_worker(selector, workers)
+    result = Scheduler(
+        release_results=release_results, priority=priority,
+        window=window).run(
+            master_worker, get_workflow(workflow))
 
     for worker in workers.values():
         try:
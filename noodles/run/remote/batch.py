@@ -0,0 +1,128 @@
+"""
+Batching of messages
+====================
+
+Sending a single job to a remote worker means a round of encoding, writing
+and flushing a pipe. For many short jobs this overhead dominates. A
+|BatchWriter| collects messages and sends them on in a |BatchMessage| once
+`max_size` messages are collected, or when the oldest message has been
+waiting for `max_linger` seconds, whichever comes first. On the receiving
+end, |unbatch| unpacks batches into single messages again.
+
+.. |BatchWriter| replace:: :py:class:`BatchWriter`
+.. |BatchMessage| replace:: :py:class:`BatchMessage`
+.. |unbatch| replace:: :py:func:`unbatch`
+"""
+
+import threading
+import time
+
+from ..messages import (BatchMessage)
+
+
+def unbatch(source):
+    """Generator; yields messages from `source`, unpacking any
+    |BatchMessage|."""
+    for msg in source:
+        if isinstance(msg, BatchMessage):
+            yield from msg.messages
+        else:
+            yield msg
+
+
+class BatchWriter(object):
+    """Sink; groups messages into |BatchMessage| objects, before sending
+    them to `sink`. Messages are sent on by the thread calling :py:meth:`send`
+    if a batch is full, otherwise by a separate thread once the batch has
+    lingered long enough.
+
+    :param sink: coroutine receiving the batches.
+    :param max_size: maximum number of messages in a batch. If this is 1,
+        messages are passed on directly and no thread is started.
+    :param max_linger: maximum time in seconds that a message waits
+        for a batch to fill up.
+
+    All sending is done while holding a lock, so that several threads can
+    share a |BatchWriter| to write to the same stream.
+
+    In normal use the sink may stop, for instance when the pipe to the remote
+    process is broken. In that case, the messages that are still waiting are
+    discarded, and :py:meth:`send` raises :py:exc:`StopIteration`."""
+    def __init__(self, sink, max_size=1, max_linger=0.01):
+        self.sink = sink
+        self.max_size = max_size
+        self.max_linger = max_linger
+        self.buffer = []
+        self.deadline = None
+        self.closed = False
+        self.cond = threading.Condition()
+
+        if max_size > 1:
+            threading.Thread(target=self._linger, daemon=True).start()
+
+    def send(self, msg):
+        """Add a message to the current batch. This may be called from
+        several threads at once."""
+        if self.max_size <= 1:
+            with self.cond:
+                self.sink.send(msg)
+            return
+
+        with self.cond:
+            if self.closed:
+                raise StopIteration
+
+            if not self.buffer:
+                self.deadline = time.monotonic() + self.max_linger
+                self.cond.notify()
+
+            self.buffer.append(msg)
+            if len(self.buffer) >= self.max_size:
+                self._flush()
+
+    def flush(self):
+        """Send the current batch, even if it is not full."""
+        with self.cond:
+            self._flush()
+
+    def close(self, msg=None):
+        """Send the current batch, followed by `msg` if given, and stop
+        batching."""
+        with self.cond:
+            self._flush()
+            self.closed = True
+            self.cond.notify()
+
+            if msg is not None:
+                self.sink.send(msg)
+
+    def _flush(self):
+        if not self.buffer or self.closed:
+            return
+
+        messages, self.buffer = self.buffer, []
+        try:
+            if len(messages) == 1:
+                self.sink.send(messages[0])
+            else:
+                self.sink.send(BatchMessage(messages))
+        except StopIteration:
+            self.closed = True
+            raise
+
+    def _linger(self):
+        with self.cond:
+            while not self.closed:
+                if not self.buffer:
+                    self.cond.wait()
+                    continue
+
+                remaining = self.deadline - time.monotonic()
+                if remaining > 0:
+                    self.cond.wait(remaining)
+                    continue
+
+                try:
+                    self._flush()
+                except StopIteration:
+                    return
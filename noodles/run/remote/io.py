@@ -3,8 +3,15 @@ Manage IO between remote worker/pilot job, and the scheduler. Here there are
 two options: use json, or msgpack.
 """
 
+import struct
+
 from ...lib import coroutine
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 
 def JSONObjectReader(registry, fi, deref=False):
     """Stream objects from a JSON file.
@@ -27,13 +34,77 @@ def JSONObjectWriter(registry, fo, host=None):
     :param host: name of the host that encodes the JSON. This is relevant if
         the encoded data refers to external files for mass storage.
 
+    Each object is encoded as a whole before it is written, so that an
+    error while encoding does not leave half a message in the file.
+
     In normal use, it may occur that the pipe to which we write is broken,
     for instance when the remote process shuts down. In that case, this
     coroutine exits.
     """
     while True:
         obj = yield
+        data = registry.to_json(obj, host=host)
+        try:
+            fo.write(data + '\n')
+            fo.flush()
+        except BrokenPipeError:
+            return
+
+
+_length = struct.Struct('>I')
+
+
+def MsgPackObjectReader(registry, fi, deref=False):
+    """Stream objects from a binary file of MessagePack messages, each
+    preceded by its length as a four byte unsigned integer.
+
+    :param registry: serialisation registry.
+    :param fi: input file, opened in binary mode.
+    :param deref: flag, if True, objects will be dereferenced on decoding.
+    """
+    while True:
+        header = fi.read(_length.size)
+        if len(header) < _length.size:
+            return
+
+        size, = _length.unpack(header)
+        yield registry.from_msgpack(fi.read(size), deref=deref)
+
+
+@coroutine
+def MsgPackObjectWriter(registry, fo, host=None):
+    """Sink; writes object as length-prefixed MessagePack to a file.
+    Binary data is written as is, saving the Base64 encoding needed for JSON.
+
+    :param registry: serialisation registry.
+    :param fo: output file, opened in binary mode.
+    :param host: name of the host that encodes the data.
+    """
+    while True:
+        obj = yield
+        data = registry.to_msgpack(obj, host=host)
         try:
-            print(registry.to_json(obj, host=host), file=fo, flush=True)
+            fo.write(_length.pack(len(data)) + data)
+            fo.flush()
         except BrokenPipeError:
             return
+
+
+formats = {
+    'json': (JSONObjectReader, JSONObjectWriter, False),
+    'msgpack': (MsgPackObjectReader, MsgPackObjectWriter, True)
+}
+"""Readers and writers by name of the wire format; the last item tells
+whether the stream should be opened in binary mode."""
+
+
+def get_format(name):
+    """Get the `(reader, writer, binary)` triple for a wire format."""
+    if name not in formats:
+        raise ValueError("Unknown wire format: {}".format(name))
+
+    if name == 'msgpack' and msgpack is None:
+        raise ImportError(
+            "The 'msgpack' wire format needs the msgpack package.")
+
+    return formats[name]
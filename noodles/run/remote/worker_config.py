@@ -37,6 +37,10 @@ class WorkerConfig(object):
     :param finish:
         This function may do some clean up, after all jobs have been done.
 
+    :param n_threads:
+        Number of jobs the pilot job runs at the same time, each in a
+        thread of its own.
+
     :param verbose:
         Be verbose about what we're doing. This is for debugging purposes only.
     """
@@ -70,4 +74,7 @@ class WorkerConfig(object):
         if self.verbose:
             arguments.append("-verbose")
 
+        if self.n_threads > 1:
+            arguments.extend(["-n", str(self.n_threads)])
+
         return executable, arguments
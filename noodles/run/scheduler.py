@@ -1,9 +1,13 @@
 from ..lib import (Connection, FlushQueue, EndOfQueue)
 from .job_keeper import (JobKeeper)
 
+from collections import deque
+from heapq import (heappush, heappop)
+from itertools import count
+
 from ..workflow import (
     is_workflow, get_workflow, insert_result,
-    Workflow, is_node_ready)
+    Workflow, is_node_ready, n_empty_arguments, Empty)
 import sys
 
 
@@ -55,8 +59,44 @@ class Scheduler:
     Schedules jobs, recieves results, then schedules more jobs as they
     become ready to compute. This class communicates with a pool of workers
     by means of coroutines.
+
+    By default the scheduler keeps a counter of the arguments that each node
+    is still waiting for. This counter is computed once when a workflow is
+    added, and decremented every time a result is inserted, so that checking
+    whether a node became ready takes constant time, regardless of the number
+    of arguments the node has. Set `count_pending` to `False` to scan all
+    arguments of a node with :py:func:`is_node_ready` instead.
+
+    By default all results stay in the workflow until the run ends, so that
+    :py:func:`noodles.result` can get intermediate results afterwards. Set
+    `release_results` to keep results only as long as they are needed: the
+    result of a node is then held by the nodes that take it as an argument
+    until these nodes are done, and only the result of the root node stays
+    with the node itself. This bounds the memory used by map-reduce style
+    workflows by the results in use.
+
+    If the results in use don't fit in memory either, give a `result_store`
+    (see :py:class:`noodles.run.spill.ResultStore`) to write them to disk
+    until they are needed; this implies `release_results`.
+
+    To send the jobs on the critical path of a workflow first, give a
+    `priority` object (see :py:class:`noodles.run.priority.CriticalPath`);
+    the connection should hand out jobs by the same priority.
+
+    Normally every job is sent to the connection as soon as it is ready. To
+    keep at most `window` jobs in flight, give a `window`: the other ready
+    jobs are held by the scheduler, as `(workflow, node_id)` pairs (ordered
+    by `priority` if given), and sent as results come in. Results spilled to
+    a `result_store` are then read back only when the job is sent.
     """
-    def __init__(self, verbose=False, error_handler=None, job_keeper=None):
+    def __init__(self, verbose=False, error_handler=None, job_keeper=None,
+                 count_pending=True, release_results=False,
+                 result_store=None, priority=None, window=None):
+        if window is not None and window < 1:
+            raise ValueError(
+                "The window should allow at least one job in flight, "
+                "got {}.".format(window))
+
         if job_keeper is None:
             self.jobs = JobKeeper()
         else:
@@ -66,6 +106,16 @@ class Scheduler:
         self.key_map = {}
         self.verbose = verbose
         self.handle_error = error_handler
+        self.count_pending = count_pending
+        self.pending = {}
+        self.release_results = release_results or result_store is not None
+        self.result_store = result_store
+        self.filled = {}
+        self.priority = priority
+        self.window = window
+        self.in_flight = 0
+        self.held = deque() if priority is None else []
+        self.held_counter = count()
 
     def run(self, connection: Connection, master: Workflow):
         """Run a workflow.
@@ -90,9 +140,15 @@ class Scheduler:
         # process results
         for job_key, status, result, err_msg in source:
             wf, n = self.jobs[job_key]
+            self.in_flight -= 1
+            if self.priority is not None:
+                self.priority.done(job_key)
+            if self.release_results and status not in ('error', 'aborted'):
+                self.release_arguments(wf, n)
             if status == 'error':
                 graceful_exit = True
                 errors.append(err_msg)
+                self.held.clear()
 
                 try:
                     sink.send(FlushQueue)
@@ -111,6 +167,7 @@ class Scheduler:
                       file=sys.stderr, flush=True)
                 graceful_exit = True
                 errors.append(err_msg)
+                self.held.clear()
                 try:
                     sink.send(FlushQueue)
                 except StopIteration:
@@ -135,19 +192,37 @@ class Scheduler:
                 child = id(wf)
                 _, wf, n = self.dynamic_links[child]
                 del self.dynamic_links[child]
+                self.pending.pop(child, None)
+                self.filled.pop(child, None)
+                if self.priority is not None:
+                    self.priority.remove_workflow(child)
 
             # if we retrieve a workflow, push a child
             if is_workflow(result) and not graceful_exit:
                 child_wf = get_workflow(result)
                 self.add_workflow(child_wf, wf, n, sink)
+                self.send_held(sink)
                 continue
 
             # insert the result in the nodes that need it
             wf.nodes[n].result = result
+            ready = []
             for (tgt, address) in wf.links[n]:
                 insert_result(wf.nodes[tgt], address, result)
-                if is_node_ready(wf.nodes[tgt]) and not graceful_exit:
-                    self.schedule(Job(workflow=wf, node_id=tgt), sink)
+                if self.release_results:
+                    self.filled[id(wf)].setdefault(tgt, []).append(address)
+                if self.argument_filled(wf, tgt) and not graceful_exit:
+                    ready.append(tgt)
+
+            if self.result_store is not None and wf.links[n]:
+                self.result_store.add((id(wf), n), result, [
+                    ((id(wf), tgt), wf.nodes[tgt], address)
+                    for tgt, address in wf.links[n]])
+
+            for tgt in ready:
+                self.schedule(Job(workflow=wf, node_id=tgt), sink)
+            if self.result_store is not None:
+                self.result_store.evict()
 
             # see if we're done
             if wf == master and n == master.root:
@@ -156,15 +231,91 @@ class Scheduler:
                 except StopIteration:
                     pass
 
+                self.pending.pop(id(master), None)
+                self.filled.pop(id(master), None)
+                if self.priority is not None:
+                    self.priority.remove_workflow(id(master))
                 return result
 
+            # the targets hold the result now
+            if self.release_results:
+                wf.nodes[n].result = Empty
+
+            self.send_held(sink)
+
+        # the results ended after a flush, before all jobs returned
+        if graceful_exit:
+            raise errors[0]
+
     def schedule(self, job, sink):
-        sink.send(self.jobs.register(job))
+        """Send a job that is ready, or hold it if the window is full."""
+        if self.window is not None and \
+                (self.held or self.in_flight >= self.window):
+            if self.priority is None:
+                self.held.append((job.workflow, job.node_id))
+            else:
+                heappush(self.held, (-self.priority.job_priority(job),
+                                     next(self.held_counter),
+                                     job.workflow, job.node_id))
+            return
+
+        self.send(job, sink)
+
+    def send_held(self, sink):
+        """Send held jobs while the window has room."""
+        while self.held and self.in_flight < self.window:
+            if self.priority is None:
+                wf, n = self.held.popleft()
+            else:
+                _, _, wf, n = heappop(self.held)
+            self.send(Job(workflow=wf, node_id=n), sink)
+
+    def send(self, job, sink):
+        if self.result_store is not None:
+            self.result_store.load((id(job.workflow), job.node_id))
+        msg = self.jobs.register(job)
+        if self.priority is not None:
+            self.priority.schedule(msg.key, job)
+        self.in_flight += 1
+        sink.send(msg)
 
     def add_workflow(self, wf, target, node, sink):
         self.dynamic_links[id(wf)] = DynamicLink(
             source=wf, target=target, node=node)
-
+        if self.release_results:
+            self.filled[id(wf)] = {}
+        if self.priority is not None:
+            self.priority.add_workflow(
+                wf, None if wf is target else (target, node))
+
+        if not self.count_pending:
+            for n in wf.nodes:
+                if is_node_ready(wf.nodes[n]):
+                    self.schedule(Job(workflow=wf, node_id=n), sink)
+            return
+
+        pending = self.pending[id(wf)] = {}
         for n in wf.nodes:
-            if is_node_ready(wf.nodes[n]):
+            pending[n] = n_empty_arguments(wf.nodes[n])
+            if pending[n] == 0:
                 self.schedule(Job(workflow=wf, node_id=n), sink)
+
+    def release_arguments(self, wf, n):
+        """Called when the job for node `n` in workflow `wf` is done. Clears
+        the arguments that were filled in with the results of other nodes,
+        so that these results can be freed once no other node needs them."""
+        node = wf.nodes[n]
+        for address in self.filled.get(id(wf), {}).pop(n, ()):
+            insert_result(node, address, Empty)
+        if self.result_store is not None:
+            self.result_store.release((id(wf), n))
+
+    def argument_filled(self, wf, n):
+        """Called after an argument of node `n` in workflow `wf` was filled
+        in. Returns `True` if the node is now ready to be scheduled."""
+        if not self.count_pending:
+            return is_node_ready(wf.nodes[n])
+
+        pending = self.pending[id(wf)]
+        pending[n] -= 1
+        return pending[n] == 0
@@ -0,0 +1,490 @@
+"""
+Worker selection
+================
+
+The hybrid runner sends every job to a worker chosen by a *selector*. A plain
+selector is a function of the job node, returning the key of a worker. Such a
+function has no idea how busy the workers are: when job durations vary, a
+random choice leaves some workers idle while others have a long queue.
+
+A :py:class:`Selector` object keeps track of the jobs in flight on each
+worker, from the keys of the job and result messages passing through the
+hybrid runner. Jobs that can not be sent yet wait in the selector, so that
+they go to the first worker that has room. The policy choosing between
+workers is set by the subclass:
+
+    - :py:class:`RoundRobinSelector` takes the workers in turn,
+    - :py:class:`LeastLoadedSelector` takes the worker with the fewest jobs
+      in flight,
+    - :py:class:`WorkStealingSelector` gives every worker a queue of its
+      own; a worker with an empty queue takes jobs from the back of the
+      longest other queue,
+    - :py:class:`RandomSelector` picks a worker at random.
+
+Limits on the number of jobs in flight per worker are set by `max_in_flight`.
+Resource hints are matched to the `resources` of the workers: a job with the
+hint `n_cores=4` is only sent to a worker that has four cores to spare,
+counting the hints of the jobs it is running already. A job that does not
+give a hint for a resource is counted with the value in
+:py:data:`default_needs`, or zero. A worker that has used up all of its
+resources takes no other jobs until one of its jobs is done. Waiting jobs
+are sent in the order they arrived, or by `priority` (see
+:py:mod:`noodles.run.priority`); a job may pass waiting jobs that don't fit
+on any worker yet.
+
+The hint `max_concurrent` limits the number of jobs of a function that run
+at the same time, over all workers; for instance for a solver that has a
+limited number of licenses. ::
+
+    @schedule_hint(n_cores=4, memory=8e9)
+    def simulate(x):
+        ...
+
+    @schedule_hint(max_concurrent=2)
+    def solve(x):
+        ...
+
+    selector = LeastLoadedSelector(resources={'n_cores': 8, 'memory': 32e9})
+    run_hybrid(wf, selector, workers)
+"""
+
+import random
+from abc import (ABC, abstractmethod)
+from collections import deque
+from itertools import count
+
+from .priority import ReadyQueue
+
+
+default_needs = {'n_cores': 1}
+"""Resources used by a job that does not give a hint for them."""
+
+
+def function_of(node):
+    """The function of a job node, which is the key of `max_concurrent`
+    limits."""
+    return getattr(node, 'foo', None) or node.function
+
+
+class Pending:
+    """Jobs waiting in a selector. Jobs that need the same resources and
+    have the same `max_concurrent` limit are kept in a bucket: if the first
+    job of a bucket can not be sent, neither can the others, so a selector
+    only needs to look at the first job of each bucket. Jobs are in order
+    of arrival, or of `priority`, both within a bucket and over the first
+    jobs of all buckets.
+
+    The items are `(job_message, needs)` pairs.
+
+    .. py:attribute:: buckets
+
+        A `dict` of queues of jobs, by :py:meth:`bucket_key`.
+    """
+    def __init__(self, priority=None):
+        self.priority = priority
+        self.buckets = {}
+        self.seq = count()
+        self.size = 0
+
+    @staticmethod
+    def bucket_key(msg, needs):
+        """The key of the bucket of a job: its function and limit if it has
+        a `max_concurrent` hint, and the resources it needs."""
+        limit = (msg.node.hints or {}).get('max_concurrent')
+        function = None if limit is None else function_of(msg.node)
+        return (function, limit, tuple(sorted(needs.items())))
+
+    def _rank(self, entry):
+        """Jobs with a higher rank come first."""
+        if self.priority is None:
+            return -entry[2]
+        return (self.priority(entry[0]), -entry[2])
+
+    def append(self, item):
+        """Add a job to its bucket."""
+        msg, needs = item
+        key = self.bucket_key(msg, needs)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = deque() if self.priority is None \
+                else ReadyQueue(self.priority)
+            self.buckets[key] = bucket
+        bucket.append((msg, needs, next(self.seq)))
+        self.size += 1
+
+    def heads(self, last=False):
+        """Iterate over the keys and first jobs of all buckets, or the last
+        jobs if `last` is set."""
+        for key, bucket in self.buckets.items():
+            yield key, bucket[-1 if last else 0][:2]
+
+    def first(self, keys, last=False):
+        """Of the buckets with `keys`, find the one with the job that comes
+        first, or the job that comes last if `last` is set."""
+        if last:
+            return min(keys, key=lambda k: self._rank(self.buckets[k][-1]))
+        return max(keys, key=lambda k: self._rank(self.buckets[k][0]))
+
+    def pop(self, key, last=False):
+        """Take the first job from a bucket, or the last if `last` is
+        set."""
+        bucket = self.buckets[key]
+        entry = bucket.pop() if last else bucket.popleft()
+        if not bucket:
+            del self.buckets[key]
+        self.size -= 1
+        return entry[:2]
+
+    def clear(self):
+        self.buckets.clear()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+
+class Selector(ABC):
+    """Base class of selectors that track the load of workers.
+
+    :param max_in_flight:
+        Maximum number of jobs sent to a worker at the same time; by default
+        there is no limit other than the resources.
+    :type max_in_flight: int
+
+    :param resources:
+        Resources of every worker, as a `dict` of amounts by hint name, like
+        `{'n_cores': 4, 'memory': 16e9}`. For workers with different
+        resources, give a `dict` of such `dict` objects by worker key.
+        Resources that are not given are not limited.
+    :type resources: dict
+
+    :param priority:
+        Function giving the priority of a job message; waiting jobs with
+        the highest priority are sent first. If it has a `started` method,
+        that is called with every job sent to a worker, like
+        :py:meth:`noodles.run.priority.CriticalPath.started`.
+
+    The runner calls :py:meth:`setup` with the worker keys, passes jobs to
+    :py:meth:`submit` and reports finished jobs to :py:meth:`complete`.
+    Both return a list of `(worker, job_message)` pairs to send.
+
+    .. py:attribute:: in_flight
+
+        For each worker, a `dict` giving the resources used by each job in
+        flight, by job key.
+
+    .. py:attribute:: running
+
+        Number of jobs in flight for each function that has a
+        `max_concurrent` hint.
+
+    .. py:attribute:: blocked
+
+        Buckets of waiting jobs (see :py:class:`Pending`) that are not
+        looked at until a job is done. The value tells why: `'fit'` if the
+        first job didn't fit on any worker, `'limit'` if its function
+        reached its `max_concurrent` limit.
+    """
+    def __init__(self, max_in_flight=None, resources=None, priority=None):
+        self.max_in_flight = max_in_flight
+        self.resources = resources or {}
+        self.priority = priority
+        self.workers = []
+        self.capacity = {}
+        self.used = {}
+        self.in_flight = {}
+        self.owner = {}
+        self.running = {}
+        self.limited = {}
+        self.blocked = {}
+        self.pending = self.new_queue()
+
+    def new_queue(self):
+        """A queue for waiting jobs, ordered by priority if one is given."""
+        return Pending(self.priority)
+
+    def setup(self, workers):
+        """Start tracking the given workers."""
+        self.workers = list(workers)
+        per_worker = self.resources and all(
+            isinstance(v, dict) for v in self.resources.values())
+
+        for w in self.workers:
+            self.capacity[w] = dict(
+                self.resources.get(w, {}) if per_worker else self.resources)
+            self.used[w] = dict.fromkeys(self.capacity[w], 0)
+            self.in_flight[w] = {}
+
+    def needs(self, node):
+        """Amounts of resources needed by a job, from its hints."""
+        hints = node.hints or {}
+        names = set().union(*(c.keys() for c in self.capacity.values()))
+        return {r: hints.get(r, default_needs.get(r, 0)) for r in names}
+
+    def fits(self, worker, needs):
+        """Check whether `worker` has room for a job with `needs` now."""
+        if self.full(worker):
+            return False
+
+        used = self.used[worker]
+        return all(used[r] + needs[r] <= c
+                   for r, c in self.capacity[worker].items())
+
+    def admissible(self, node):
+        """Check whether the `max_concurrent` limit of the function of `node`
+        allows another job."""
+        limit = (node.hints or {}).get('max_concurrent')
+        return limit is None or \
+            self.running.get(function_of(node), 0) < limit
+
+    def can_run(self, worker, needs):
+        """Check whether `worker` could ever run a job with `needs`."""
+        return all(needs[r] <= c for r, c in self.capacity[worker].items())
+
+    def full(self, worker):
+        """Check whether `worker` takes no more jobs for now: it has
+        `max_in_flight` jobs, or it has jobs in flight and has used up all of
+        its resources."""
+        jobs = self.in_flight[worker]
+        if self.max_in_flight is not None and len(jobs) >= self.max_in_flight:
+            return True
+
+        capacity = self.capacity[worker]
+        return bool(jobs) and bool(capacity) and all(
+            self.used[worker][r] >= c for r, c in capacity.items())
+
+    def has_room(self):
+        """Check whether any worker may take another job."""
+        return not all(self.full(w) for w in self.workers)
+
+    @abstractmethod
+    def choose(self, candidates, node):
+        """Choose a worker from the non-empty list of `candidates`, all of
+        which have room for the job. Override this to set a policy."""
+        pass
+
+    def assign(self, worker, msg, needs):
+        """Book the job in `msg` on `worker`."""
+        self.in_flight[worker][msg.key] = needs
+        self.owner[msg.key] = worker
+        for r in self.used[worker]:
+            self.used[worker][r] += needs[r]
+        if 'max_concurrent' in (msg.node.hints or {}):
+            f = function_of(msg.node)
+            self.limited[msg.key] = f
+            self.running[f] = self.running.get(f, 0) + 1
+
+        started = getattr(self.priority, 'started', None)
+        if started is not None:
+            started(msg)
+
+    def submit(self, msg):
+        """Take a new job. Raises :py:exc:`ValueError` if no worker has the
+        resources to run it."""
+        needs = self.needs(msg.node)
+        if not any(self.can_run(w, needs) for w in self.workers):
+            raise ValueError(
+                "No worker has the resources {} needed by {}.".format(
+                    needs, msg.node))
+
+        self.pending.append((msg, needs))
+        return self.fill()
+
+    def complete(self, key):
+        """Release the resources of the job with `key`."""
+        worker = self.owner.pop(key, None)
+        if worker is None:
+            return []
+
+        needs = self.in_flight[worker].pop(key)
+        for r in self.used[worker]:
+            self.used[worker][r] -= needs[r]
+        f = self.limited.pop(key, None)
+        if f is not None:
+            self.running[f] -= 1
+
+        # resources are freed, and maybe a slot of function `f`
+        self.blocked = {
+            k: why for k, why in self.blocked.items()
+            if why == 'limit' and (f is None or k[0] != f)}
+        return self.fill()
+
+    def fill(self):
+        """Assign waiting jobs to workers that have room for them. A job
+        may pass a waiting job that needs more resources, or that is held
+        back by a `max_concurrent` limit. Only the first job of each bucket
+        that is not blocked is looked at, and the search stops once all
+        workers are full."""
+        sends = []
+        while self.has_room():
+            keys = [k for k in self.pending.buckets if k not in self.blocked]
+            if not keys:
+                break
+
+            key = self.pending.first(keys)
+            msg, needs = self.pending.buckets[key][0][:2]
+            if not self.admissible(msg.node):
+                self.blocked[key] = 'limit'
+                continue
+
+            candidates = [w for w in self.workers if self.fits(w, needs)]
+            if not candidates:
+                self.blocked[key] = 'fit'
+                continue
+
+            self.pending.pop(key)
+            worker = self.choose(candidates, msg.node)
+            self.assign(worker, msg, needs)
+            sends.append((worker, msg))
+
+        return sends
+
+    def flush(self):
+        """Drop all jobs that are not sent yet."""
+        self.pending.clear()
+        self.blocked.clear()
+
+    def idle(self):
+        """Check whether no jobs are in flight."""
+        return not self.owner
+
+
+class RandomSelector(Selector):
+    """Send each job to a random worker that has room for it."""
+    def choose(self, candidates, node):
+        return random.choice(candidates)
+
+
+class RoundRobinSelector(Selector):
+    """Send jobs to the workers in turn, skipping workers that have no room
+    for the job."""
+    def __init__(self, max_in_flight=None, resources=None, priority=None):
+        super(RoundRobinSelector, self).__init__(
+            max_in_flight, resources, priority)
+        self.next = 0
+
+    def choose(self, candidates, node):
+        n = len(self.workers)
+        position = {w: (self.workers.index(w) - self.next) % n
+                    for w in candidates}
+        worker = min(candidates, key=position.get)
+        self.next = (self.workers.index(worker) + 1) % n
+        return worker
+
+
+class LeastLoadedSelector(Selector):
+    """Send each job to the worker with the fewest jobs in flight. Of
+    equally loaded workers, the one that was sent a job longest ago is
+    chosen."""
+    def __init__(self, max_in_flight=None, resources=None, priority=None):
+        super(LeastLoadedSelector, self).__init__(
+            max_in_flight, resources, priority)
+        self.counter = count()
+        self.last_sent = {}
+
+    def choose(self, candidates, node):
+        worker = min(candidates, key=lambda w: (
+            len(self.in_flight[w]), self.last_sent.get(w, -1)))
+        self.last_sent[worker] = next(self.counter)
+        return worker
+
+
+class WorkStealingSelector(Selector):
+    """Give every worker a queue of its own, filled in turn. A worker with
+    room for another job takes it from the front of its own queue; if its
+    queue is empty, it steals a job from the back of the longest other
+    queue. Set `max_in_flight` to keep jobs in the queues, where they can be
+    stolen; the default is one.
+
+    .. py:attribute:: steals
+
+        Number of jobs taken from the queue of another worker.
+    """
+    def __init__(self, max_in_flight=1, resources=None, priority=None):
+        super(WorkStealingSelector, self).__init__(
+            max_in_flight, resources, priority)
+        self.queues = {}
+        self.next = 0
+        self.steals = 0
+
+    def setup(self, workers):
+        super(WorkStealingSelector, self).setup(workers)
+        self.queues = {w: self.new_queue() for w in self.workers}
+
+    def choose(self, candidates, node):
+        # workers take jobs from the queues in `fill`, this is not used there
+        return candidates[0]
+
+    def submit(self, msg):
+        needs = self.needs(msg.node)
+        able = [w for w in self.workers if self.can_run(w, needs)]
+        if not able:
+            raise ValueError(
+                "No worker has the resources {} needed by {}.".format(
+                    needs, msg.node))
+
+        home = able[self.next % len(able)]
+        self.next += 1
+        self.queues[home].append((msg, needs))
+        return self.fill()
+
+    def _take(self, worker, queue, reverse):
+        """Take the first job from `queue` that fits on `worker`, searching
+        from the back if `reverse` is set. Only the first (or last) job of
+        each bucket is looked at."""
+        keys = [k for k, (msg, needs) in queue.heads(reverse)
+                if self.fits(worker, needs) and self.admissible(msg.node)]
+        if not keys:
+            return None
+        return queue.pop(queue.first(keys, reverse), reverse)
+
+    def fill(self):
+        sends = []
+        progress = True
+        while progress:
+            progress = False
+            for w in self.workers:
+                if self.full(w):
+                    continue
+
+                item = self._take(w, self.queues[w], False)
+                if item is None:
+                    victims = sorted(
+                        (q for v, q in self.queues.items() if v != w and q),
+                        key=len, reverse=True)
+                    for q in victims:
+                        item = self._take(w, q, True)
+                        if item is not None:
+                            self.steals += 1
+                            break
+
+                if item is not None:
+                    msg, needs = item
+                    self.assign(w, msg, needs)
+                    sends.append((w, msg))
+                    progress = True
+
+        return sends
+
+    def flush(self):
+        for q in self.queues.values():
+            q.clear()
+
+
+selectors = {
+    'random': RandomSelector,
+    'round-robin': RoundRobinSelector,
+    'least-loaded': LeastLoadedSelector,
+    'work-stealing': WorkStealingSelector}
+"""Selector classes by name."""
+
+
+def get_selector(selector, **kwargs):
+    """Get a :py:class:`Selector`: if `selector` is a name from
+    :py:data:`selectors`, a new instance is created with `kwargs`."""
+    if isinstance(selector, Selector):
+        return selector
+    try:
+        return selectors[selector](**kwargs)
+    except KeyError:
+        raise ValueError("Unknown selector: {}".format(selector)) from None
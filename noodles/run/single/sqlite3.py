@@ -12,7 +12,9 @@ from ...prov.sqlite import (JobDB)
 from ...lib import (Queue, pull, pull_map, push_map, Connection)
 
 
-def run_single(workflow, *, registry, db_file, always_cache=True):
+def run_single(workflow, *, registry, db_file, always_cache=True,
+               write_behind=False, pragmas=None, cache=True,
+               hash_function='md5'):
     """"Run workflow in a single thread, storing results in a Sqlite3
     database.
 
@@ -21,9 +23,19 @@ def run_single(workflow, *, registry, db_file, always_cache=True):
     :param db_file: filename of Sqlite3 database, give `':memory:'` to
         keep the database in memory only.
     :param always_cache: Currently ignored. always_cache is true.
+    :param write_behind: write to the database from a separate thread, in
+        batches (see :py:class:`JobDB`).
+    :param pragmas: pragmas for the database connections, for instance
+        :py:data:`noodles.prov.sqlite.wal_pragmas`.
+    :param cache: give `False` to disable the in-memory provenance cache,
+        or a :py:class:`noodles.prov.ProvCache` to set its bounds.
+    :param hash_function: name of the hash function for provenance keys,
+        see :py:data:`noodles.prov.key.hash_functions`.
     :return: Evaluated result.
     """
-    with JobDB(db_file, registry) as db:
+    with JobDB(db_file, registry, write_behind=write_behind,
+               pragmas=pragmas, cache=cache,
+               hash_function=hash_function) as db:
         job_logger = make_logger("worker", push_map, db)
         result_logger = make_logger("worker", pull_map, db)
 
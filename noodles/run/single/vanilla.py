@@ -1,15 +1,30 @@
 from ..worker import (worker)
 from ..scheduler import (Scheduler)
+from ..spill import (ResultStore)
 from ...lib import (Queue)
 from ...workflow import (get_workflow)
 
 
-def run_single(workflow):
+def run_single(workflow, *, release_results=False, memory_budget=None,
+               window=None):
     """"Run workflow in a single thread (same as the scheduler).
 
     :param workflow: Workflow or PromisedObject to be evaluated.
+    :param release_results: free intermediate results as soon as no job
+        needs them anymore (see :py:class:`Scheduler`).
+    :param memory_budget: if given, intermediate results above this many
+        bytes are written to disk until needed (see
+        :py:class:`noodles.run.spill.ResultStore`).
+    :param window: maximum number of jobs in the job queue; other ready
+        jobs wait in the scheduler (see :py:class:`Scheduler`).
     :return: Evaluated result.
     """
-    return Scheduler().run(
-        Queue() >> worker,
-        get_workflow(workflow))
+    if memory_budget is None:
+        return Scheduler(release_results=release_results, window=window).run(
+            Queue() >> worker,
+            get_workflow(workflow))
+
+    with ResultStore(memory_budget) as store:
+        return Scheduler(result_store=store, window=window).run(
+            Queue() >> worker,
+            get_workflow(workflow))
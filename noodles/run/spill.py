@@ -0,0 +1,267 @@
+"""
+Spilling results to disk
+========================
+
+When the :py:class:`Scheduler` releases results (see `release_results`), a
+result stays in memory only while some node still needs it as an argument.
+If the results that are still needed don't fit in memory, a
+:py:class:`ResultStore` can keep them on disk instead:
+
+    - the store estimates the size of each result with
+      :py:func:`result_size`,
+    - once the total size of the results in memory is above the
+      `memory_budget`, the results that were needed least recently are
+      encoded with a serialisation registry and written to a file; in the
+      arguments of the nodes that need them they are replaced by a
+      :py:class:`Spilled` placeholder,
+    - when a node is sent to a worker, the results it needs are read back
+      in; they stay in memory until the job is done.
+
+A result that is needed by a running job is never spilled, so the memory
+budget may be exceeded by the arguments of the running jobs. ::
+
+    with ResultStore(memory_budget=1 << 30) as store:
+        result = Scheduler(result_store=store).run(
+            Queue() >> worker, get_workflow(wf))
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+from collections import OrderedDict
+
+from .. import serial
+from ..workflow import (insert_result)
+
+
+def result_size(obj):
+    """Estimate the memory used by a result: the `nbytes` of arrays, or
+    :py:func:`sys.getsizeof` for other objects, adding the items of lists,
+    tuples, sets and dictionaries."""
+    nbytes = getattr(obj, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+
+    size = sys.getsizeof(obj)
+    t = type(obj)
+    if t is list or t is tuple or t is set or t is frozenset:
+        size += sum(result_size(x) for x in obj)
+    elif t is dict:
+        size += sum(result_size(k) + result_size(v) for k, v in obj.items())
+    return size
+
+
+def default_registry(directory):
+    """Registry used to spill results if none is given: NumPy arrays are
+    saved to .npy files in `directory`, other objects are pickled if the
+    base registry has no serialiser for them."""
+    registry = serial.pickle() + serial.base()
+    if serial.numpy is not None:
+        from ..serial.numpy import arrays_to_file
+        registry = registry + arrays_to_file(
+            file_prefix=os.path.join(directory, ''))
+    return registry
+
+
+def _record_files(obj):
+    """Find the files written while encoding `obj`, from the records
+    returned by :py:meth:`Registry.deep_encode`."""
+    if isinstance(obj, dict):
+        if '_noodles' in obj:
+            return list(obj.get('files', ()))
+        return [f for v in obj.values() for f in _record_files(v)]
+    if isinstance(obj, list):
+        return [f for v in obj for f in _record_files(v)]
+    return []
+
+
+class Spilled:
+    """Placeholder in the arguments of a node for a result on disk."""
+    __slots__ = ('path',)
+
+    def __init__(self, path):
+        self.path = path
+
+    def __repr__(self):
+        return "<spilled result: {}>".format(self.path)
+
+
+class StoreEntry:
+    """A result tracked by a :py:class:`ResultStore`.
+
+    .. py:attribute:: holders
+
+        List of `(node_key, node, address)` of the arguments that take this
+        result.
+
+    .. py:attribute:: pinned
+
+        Number of holders that were sent to a worker.
+    """
+    __slots__ = ('value', 'size', 'holders', 'pinned', 'spilled', 'files')
+
+    def __init__(self, value, size, holders):
+        self.value = value
+        self.size = size
+        self.holders = holders
+        self.pinned = 0
+        self.spilled = None
+        self.files = []
+
+
+class ResultStore:
+    """Keeps the results a scheduler still needs within a memory budget, by
+    writing them to disk.
+
+    :param memory_budget: maximum total size in bytes of the results kept
+        in memory, as estimated by `size_of`.
+    :param directory: directory in which to make a temporary directory for
+        the spilled results; by default the system temporary directory.
+    :param registry: function returning the serialisation registry to
+        encode spilled results with; by default :py:func:`default_registry`
+        is used.
+    :param size_of: function estimating the size of a result in bytes.
+
+    Use the store as a context manager, or call :py:meth:`close`, to remove
+    the spilled files.
+
+    .. py:attribute:: memory
+
+        Total size of the results in memory.
+
+    .. py:attribute:: n_spilled
+
+        Number of times a result was written to disk.
+
+    .. py:attribute:: n_loaded
+
+        Number of times a result was read back in.
+    """
+    def __init__(self, memory_budget, directory=None, registry=None,
+                 size_of=result_size):
+        self.memory_budget = memory_budget
+        self.directory = tempfile.mkdtemp(
+            prefix='noodles-spill-', dir=directory)
+        self.registry = registry() if registry \
+            else default_registry(self.directory)
+        self.size_of = size_of
+
+        self.entries = OrderedDict()
+        self.held = {}
+        self.memory = 0
+        self.n_spilled = 0
+        self.n_loaded = 0
+        self.counter = 0
+
+    def add(self, key, value, holders):
+        """Track a result that was just inserted in the arguments of other
+        nodes. The result is not spilled before the next call to
+        :py:meth:`evict`, so that nodes that are ready to run can be loaded
+        first.
+
+        :param key: a key unique to the result.
+        :param value: the result.
+        :param holders: list of `(node_key, node, address)`, giving the
+            arguments holding the result; `node_key` is passed to
+            :py:meth:`load` and :py:meth:`release`.
+        """
+        entry = StoreEntry(value, self.size_of(value), holders)
+        self.entries[key] = entry
+        for node_key in {h[0] for h in holders}:
+            self.held.setdefault(node_key, []).append(key)
+
+        self.memory += entry.size
+
+    def load(self, node_key):
+        """Called before a node is sent to a worker: reads back the results
+        it needs and keeps them in memory until :py:meth:`release`."""
+        for key in self.held.get(node_key, ()):
+            entry = self.entries[key]
+            entry.pinned += 1
+            self.entries.move_to_end(key)
+            if entry.spilled is not None:
+                self._reload(entry)
+
+        self.evict()
+
+    def release(self, node_key):
+        """Called when the job of a node is done, and its arguments were
+        cleared; forgets results that no other node needs."""
+        for key in self.held.pop(node_key, ()):
+            entry = self.entries[key]
+            entry.pinned -= 1
+            entry.holders = [h for h in entry.holders if h[0] != node_key]
+            if entry.holders:
+                continue
+
+            del self.entries[key]
+            if entry.spilled is None:
+                self.memory -= entry.size
+            else:
+                self._remove_files(entry)
+
+    def evict(self):
+        """Spill the least recently needed results, until the results in
+        memory fit the budget."""
+        if self.memory <= self.memory_budget:
+            return
+
+        for entry in list(self.entries.values()):
+            if self.memory <= self.memory_budget:
+                return
+            if entry.pinned or entry.spilled is not None:
+                continue
+            self._spill(entry)
+
+    def _spill(self, entry):
+        self.counter += 1
+        path = os.path.join(
+            self.directory, 'result-{}.json'.format(self.counter))
+        encoded = self.registry.deep_encode(entry.value)
+        with open(path, 'w') as f:
+            json.dump(encoded, f)
+
+        entry.files = _record_files(encoded) + [path]
+        entry.spilled = Spilled(path)
+        entry.value = None
+        for _, node, address in entry.holders:
+            insert_result(node, address, entry.spilled)
+
+        self.memory -= entry.size
+        self.n_spilled += 1
+
+    def _reload(self, entry):
+        with open(entry.spilled.path) as f:
+            value = self.registry.from_json(f.read(), deref=True)
+
+        for _, node, address in entry.holders:
+            insert_result(node, address, value)
+
+        self._remove_files(entry)
+        entry.value = value
+        entry.spilled = None
+        self.memory += entry.size
+        self.n_loaded += 1
+
+    def _remove_files(self, entry):
+        for path in entry.files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        entry.files = []
+
+    def close(self):
+        """Remove all spilled results from disk."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.entries.clear()
+        self.held.clear()
+        self.memory = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -70,7 +70,8 @@ def pass_result(db: JobDB, always_cache=False):
 
 def run_parallel(
         workflow, *, n_threads, registry, db_file, echo_log=True,
-        always_cache=False):
+        always_cache=False, write_behind=False, pragmas=None, cache=True,
+        hash_function='md5'):
     """Run a workflow in parallel threads, storing results in a Sqlite3
     database.
 
@@ -81,13 +82,23 @@ def run_parallel(
         keep the database in memory only.
     :param echo_log: set log-level high enough
     :param always_cache: enable caching by schedule hint.
+    :param write_behind: write to the database from a separate thread, in
+        batches (see :py:class:`JobDB`).
+    :param pragmas: pragmas for the database connections, for instance
+        :py:data:`noodles.prov.sqlite.wal_pragmas`.
+    :param cache: give `False` to disable the in-memory provenance cache,
+        or a :py:class:`noodles.prov.ProvCache` to set its bounds.
+    :param hash_function: name of the hash function for provenance keys,
+        see :py:data:`noodles.prov.key.hash_functions`.
     :return: Evaluated result.
     """
     if echo_log:
         logging.getLogger('noodles').setLevel(logging.DEBUG)
         logging.debug("--- start log ---")
 
-    with JobDB(db_file, registry) as db:
+    with JobDB(db_file, registry, write_behind=write_behind,
+               pragmas=pragmas, cache=cache,
+               hash_function=hash_function) as db:
         job_queue = Queue()
         result_queue = Queue()
 
@@ -1,20 +1,58 @@
 from ..worker import worker
 from ..scheduler import Scheduler
+from ..hybrid import hybrid_balanced_worker
+from ..selectors import LeastLoadedSelector
+from ..spill import ResultStore
 from ...lib import (Queue, thread_pool)
 from ...workflow import get_workflow
 
 from itertools import repeat
 
 
-def run_parallel(workflow, n_threads):
+def run_parallel(workflow, n_threads, release_results=False,
+                 memory_budget=None, priority=None, window=None,
+                 resources=None):
     """Run a workflow in parallel threads.
 
     :param workflow: Workflow or PromisedObject to evaluate.
     :param n_threads: number of threads to use (in addition to the scheduler).
+    :param release_results: free intermediate results as soon as no job
+        needs them anymore (see :py:class:`Scheduler`).
+    :param memory_budget: if given, intermediate results above this many
+        bytes are written to disk until needed (see
+        :py:class:`noodles.run.spill.ResultStore`).
+    :param priority: a :py:class:`noodles.run.priority.CriticalPath`, to run
+        the jobs on the critical path first.
+    :param window: maximum number of jobs in flight; other ready jobs wait
+        in the scheduler (see :py:class:`Scheduler`), and the queues between
+        scheduler and threads are bounded to this size.
+    :param resources: if given, jobs are only passed to the threads when
+        their resource hints fit in these resources, like
+        `{'n_cores': 8, 'memory': 32e9}`, counting the jobs that are running
+        already, and when their `max_concurrent` hint allows (see
+        :py:mod:`noodles.run.selectors`). Give an empty `dict` to only
+        honour `max_concurrent` hints.
     :returns: evaluated workflow.
     """
-    scheduler = Scheduler()
-    threaded_worker = Queue() >> thread_pool(
-        *repeat(worker, n_threads))
+    maxsize = 0 if window is None else window
+    jobs = Queue(maxsize=maxsize) if priority is None \
+        else priority.queue(maxsize=maxsize)
+    threaded_worker = jobs >> thread_pool(
+        *repeat(worker, n_threads), maxsize=maxsize)
 
-    return scheduler.run(threaded_worker, get_workflow(workflow))
+    if resources is not None:
+        selector = LeastLoadedSelector(
+            max_in_flight=n_threads, resources=resources, priority=priority)
+        threaded_worker = hybrid_balanced_worker(
+            selector, {'threads': threaded_worker})
+
+    if memory_budget is None:
+        scheduler = Scheduler(
+            release_results=release_results, priority=priority,
+            window=window)
+        return scheduler.run(threaded_worker, get_workflow(workflow))
+
+    with ResultStore(memory_budget) as store:
+        scheduler = Scheduler(
+            result_store=store, priority=priority, window=window)
+        return scheduler.run(threaded_worker, get_workflow(workflow))
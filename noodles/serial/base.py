@@ -16,7 +16,8 @@ except ImportError:
 from ..interface import (Fail, PromisedObject, Quote)
 from ..lib import (object_name, look_up, importable, unwrap, is_unwrapped)
 from ..workflow import (Workflow, NodeData, FunctionNode, ArgumentAddress,
-                        ArgumentKind, reset_workflow, get_workflow)
+                        ArgumentKind, reset_workflow, get_workflow,
+                        CompactWorkflow, CompactNode, ArgumentLayout, Empty)
 
 from .registry import (Registry, Serialiser, SerUnknown)
 from .reasonable import (Reasonable, SerReasonableObject)
@@ -155,6 +156,48 @@ class SerWorkflow(Serialiser):
         return reset_workflow(Workflow(root, nodes, links))
 
 
+class SerCompactWorkflow(Serialiser):
+    """Encodes a :py:class:`CompactWorkflow` by its tables; each function
+    and argument layout is encoded only once. Empty arguments are stored as
+    `None` and reset to `Empty` from the links on decoding."""
+    def __init__(self):
+        super(SerCompactWorkflow, self).__init__(CompactWorkflow)
+
+    def encode(self, obj, make_rec):
+        layout_index = {id(layout): i for i, layout in enumerate(obj.layouts)}
+        nodes = [[obj.function_index[i], layout_index[id(node.layout)],
+                  [None if v is Empty else v for v in node.values],
+                  node.hints]
+                 for i, node in enumerate(obj.nodes.values())]
+
+        return make_rec({
+            'root': obj.root,
+            'functions': obj.functions,
+            'layouts': [list(layout.addresses) for layout in obj.layouts],
+            'nodes': nodes,
+            'addresses': obj.addresses,
+            'offsets': list(obj.links.offsets),
+            'targets': list(obj.links.targets),
+            'address_index': list(obj.links.address_index)})
+
+    def decode(self, cls, data):
+        functions = data['functions']
+        layouts = [ArgumentLayout(tuple(addresses))
+                   for addresses in data['layouts']]
+        nodes = [CompactNode(functions[f], layouts[k], values, hints)
+                 for f, k, values, hints in data['nodes']]
+
+        offsets = data['offsets']
+        link_list = [(i, data['targets'][j],
+                      data['addresses'][data['address_index'][j]])
+                     for i in range(len(nodes))
+                     for j in range(offsets[i], offsets[i+1])]
+        for _, tgt, address in link_list:
+            nodes[tgt].set_argument(address, Empty)
+
+        return CompactWorkflow.from_nodes(data['root'], nodes, link_list)
+
+
 class SerPromisedObject(Serialiser):
     def __init__(self):
         super(SerPromisedObject, self).__init__(PromisedObject)
@@ -260,8 +303,10 @@ def registry():
             Reasonable: SerReasonableObject(Reasonable),
             ArgumentKind: SerEnum(ArgumentKind),
             FunctionNode: SerNode(),
+            CompactNode: SerNode(),
             ArgumentAddress: SerNamedTuple(ArgumentAddress),
             Workflow: SerWorkflow(),
+            CompactWorkflow: SerCompactWorkflow(),
             PromisedObject: SerPromisedObject(),
             Quote: SerReasonableObject(Quote),
             Path: SerPath(),
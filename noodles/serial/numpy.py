@@ -4,8 +4,16 @@ Implements serialisers for Numpy objects.
 
 import uuid
 import io
+import os
+import atexit
 import base64
+import glob
 import hashlib
+import tempfile
+import weakref
+from copy import deepcopy
+from contextlib import contextmanager
+from threading import Lock
 
 import filelock
 import h5py
@@ -13,21 +21,35 @@ import numpy
 
 from .registry import (Serialiser, Registry)
 from ..lib import look_up
+from ..workflow.capture import (capture_policy)
 
 
-class SerNumpyArray(Serialiser):
-    """Serialise Numpy array as a Base64 file."""
+class ArrayContentHash:
+    """Mixin for serialisers of Numpy arrays: provenance keys use the hash
+    of the array contents (see :py:func:`array_sha256`), so that arrays
+    are not encoded just to compute the key. Arrays of Python objects are
+    encoded as usual."""
+    def content_hash(self, obj):
+        if obj.dtype.hasobject:
+            return None
+        return array_sha256(obj)
+
+
+class SerNumpyArray(ArrayContentHash, Serialiser):
+    """Serialise Numpy array as the bytes of a .npy file. These are
+    Base64 encoded in JSON, but stored as is in binary formats."""
     def __init__(self):
         super(SerNumpyArray, self).__init__(numpy.ndarray)
 
     def encode(self, obj, make_rec):
         fo = io.BytesIO()
         numpy.save(fo, obj, allow_pickle=False)
-        return make_rec(base64.b64encode(fo.getvalue()).decode())
+        return make_rec(fo.getvalue())
 
     def decode(self, cls, data):
-        fi = io.BytesIO(base64.b64decode(data.encode()))
-        return numpy.load(fi)
+        if isinstance(data, str):
+            data = base64.b64decode(data.encode())
+        return numpy.load(io.BytesIO(data))
 
 
 class SerNumpyScalar(Serialiser):
@@ -44,11 +66,14 @@ class SerNumpyScalar(Serialiser):
         return numpy.frombuffer(data['bytes'], dtype=data['dtype'])[0]
 
 
-class SerNumpyArrayToFile(Serialiser):
-    """Serialises a Numpy array to a .npy file."""
-    def __init__(self, file_prefix=None):
+class SerNumpyArrayToFile(ArrayContentHash, Serialiser):
+    """Serialises a Numpy array to a .npy file. If `mmap` is true, arrays
+    are decoded as read-only memory maps of the file, so that only the
+    parts that are used are read."""
+    def __init__(self, file_prefix=None, mmap=False):
         super(SerNumpyArrayToFile, self).__init__(numpy.ndarray)
         self.file_prefix = file_prefix if file_prefix else ''
+        self.mmap = mmap
 
     def encode(self, obj, make_rec):
         filename = self.file_prefix + str(uuid.uuid4()) + '.npy'
@@ -56,41 +81,104 @@ class SerNumpyArrayToFile(Serialiser):
         return make_rec(filename, ref=True, files=[filename])
 
     def decode(self, cls, data):
-        return numpy.load(data)
+        return numpy.load(data, mmap_mode='r' if self.mmap else None)
 
 
-def array_sha256(a):
-    """Create a SHA256 hash from a Numpy array."""
+def array_sha256(a, chunk_size=1 << 24):
+    """Create a SHA256 hash from a Numpy array. Large arrays are hashed in
+    chunks of about `chunk_size` bytes, so that no full copy is made."""
     dtype = str(a.dtype).encode()
     shape = numpy.array(a.shape)
     sha = hashlib.sha256()
     sha.update(dtype)
     sha.update(shape)
-    sha.update(a.tobytes())
+
+    if a.flags.c_contiguous:
+        sha.update(a.reshape(-1).view(numpy.uint8))
+    else:
+        step = max(1, chunk_size // max(1, a[0].nbytes))
+        for i in range(0, a.shape[0], step):
+            sha.update(numpy.ascontiguousarray(a[i:i+step]).reshape(-1)
+                       .view(numpy.uint8))
+
     return sha.hexdigest()
 
 
-class SerNumpyArrayToHDF5(Serialiser):
-    """Serialises Numpy array to HDF5 file."""
-    def __init__(self, filename, lockfile):
+class SerNumpyArrayToHDF5(ArrayContentHash, Serialiser):
+    """Serialises Numpy array to HDF5 file. If `mmap` is true, arrays
+    are decoded as read-only memory maps into the HDF5 file, so that only
+    the parts that are used are read.
+
+    Arrays are stored only once. Datasets are found by the SHA256 hash of
+    their contents, through soft links in the `index_group` of the HDF5
+    file. Files written without an index are indexed when first opened.
+
+    If `keep_open` is true the HDF5 file stays open between calls. Only
+    do this if no other process uses the file at the same time."""
+    index_group = 'noodles-index'
+
+    def __init__(self, filename, lockfile, mmap=False, keep_open=False):
         super(SerNumpyArrayToHDF5, self).__init__(numpy.ndarray)
         self.filename = filename
         self.lock = filelock.FileLock(lockfile)
+        self.mmap = mmap
+        self.keep_open = keep_open
+        self._file = None
+
+    @contextmanager
+    def _open(self, mode):
+        """Open the HDF5 file with `mode`, `'r'` or `'a'`, or reuse the open
+        file if `keep_open` is set. A file that is open for reading only is
+        opened again for writing. Call this while holding the lock."""
+        f = self._file
+        if f is not None and mode != 'r' and f.mode == 'r':
+            f.close()
+            f = None
+        if f is None:
+            f = h5py.File(self.filename, mode)
+        try:
+            yield f
+        finally:
+            if self.keep_open:
+                f.flush()
+                self._file = f
+            else:
+                f.close()
+
+    def _index(self, f):
+        """Get the index group, creating it from the `hash` attributes
+        of existing datasets if needed."""
+        if self.index_group in f:
+            return f[self.index_group]
+
+        found = []
+
+        def visit(name, obj):
+            if isinstance(obj, h5py.Dataset) and 'hash' in obj.attrs:
+                found.append((obj.attrs['hash'], name))
+
+        f.visititems(visit)
+        index = f.create_group(self.index_group)
+        for key, name in found:
+            if key not in index:
+                index[key] = h5py.SoftLink('/' + name)
+
+        return index
 
     def encode(self, obj, make_rec):
         key = array_sha256(obj)
-        with self.lock:
-            f = h5py.File(self.filename, 'a')
-            path = next(
-                (ds for ds in f if f[ds].attrs.get('hash') == key),
-                False)
-            if not path:
+        with self.lock, self._open('a') as f:
+            index = self._index(f)
+            link = index.get(key, getlink=True)
+            if link is not None:
+                path = link.path[1:]
+            else:
                 path = base64.b64encode(uuid.uuid4().bytes).decode()
                 dataset = f.create_dataset(
                     path, shape=obj.shape, dtype=obj.dtype)
                 dataset[...] = obj
                 dataset.attrs['hash'] = key
-                f.close()
+                index[key] = h5py.SoftLink('/' + path)
 
         return make_rec({
             "filename": self.filename,
@@ -98,14 +186,192 @@ class SerNumpyArrayToHDF5(Serialiser):
         }, files=[self.filename], ref=True)
 
     def decode(self, cls, data):
-        with self.lock:
-            f = h5py.File(self.filename, 'r')
-            obj = f[data["path"]][:]
-            f.close()
+        with self.lock, self._open('r') as f:
+            dataset = f[data["path"]]
+            offset = dataset.id.get_offset() if self.mmap else None
+            if offset is None:
+                # chunked or empty datasets can't be mapped
+                obj = dataset[:]
+            else:
+                obj = numpy.memmap(
+                    self.filename, mode='r', dtype=dataset.dtype,
+                    offset=offset, shape=dataset.shape)
 
         return obj
 
 
+def scheduler_pid():
+    """The process id of the scheduler that this process works for. Worker
+    processes started by :py:func:`noodles.run.process.process_worker` find
+    it in the `NOODLES_SCHEDULER_PID` environment variable, otherwise it is
+    the id of the current process."""
+    return int(os.environ.get('NOODLES_SCHEDULER_PID', os.getpid()))
+
+
+class SharedArrays:
+    """Keeps track of arrays in this process that live in shared memory
+    files, so that they can be sent on without copying.
+
+    Each file is owned by the scheduler process. The owner keeps a count of
+    the arrays in its memory that use a file: the array that was copied into
+    it, and the arrays decoded from it. Once the count drops to zero, the
+    file is removed. Processes that already mapped the file keep their
+    data.
+
+    A worker process creates files for the scheduler, which only takes
+    ownership when it decodes the message. To remove the files of messages
+    that were dropped, for instance after an error, the name of a file
+    holds the process id of its owner, and the owner removes all files
+    named for it when it exits."""
+    def __init__(self):
+        self.lock = Lock()
+        self.handles = {}
+        self.refs = {}
+        self.directories = set()
+        atexit.register(self.cleanup)
+
+    def add_directory(self, directory):
+        """Remove files owned by this process from `directory` on exit."""
+        with self.lock:
+            self.directories.add(directory)
+
+    def track(self, obj, path, owner, reuse=True):
+        """Register array `obj` as being stored in the file at `path`. If
+        `reuse` is set, `obj` is sent on as the same file; only do this
+        for arrays that can not change. Otherwise the file is only kept
+        while `obj` lives."""
+        owned = owner == os.getpid()
+        with self.lock:
+            if reuse:
+                self.handles[id(obj)] = (path, owner)
+            if owned:
+                self.refs[path] = self.refs.get(path, 0) + 1
+
+        weakref.finalize(
+            obj, self._release, id(obj) if reuse else None, path, owned)
+
+    def lookup(self, obj):
+        """Find the `(path, owner)` handle of `obj`, if it is stored in a
+        shared memory file, or a full view of such an array. Arrays that
+        can be written to have no handle, as their contents may have
+        changed since they were stored."""
+        if not _is_frozen(obj):
+            return None
+
+        with self.lock:
+            if id(obj) in self.handles:
+                return self.handles[id(obj)]
+
+            base = obj.base
+            if isinstance(base, numpy.ndarray) and id(base) in self.handles \
+                    and obj.dtype == base.dtype and obj.shape == base.shape \
+                    and obj.strides == base.strides \
+                    and obj.ctypes.data == base.ctypes.data:
+                return self.handles[id(base)]
+
+        return None
+
+    def _release(self, key, path, owned):
+        with self.lock:
+            if key is not None:
+                self.handles.pop(key, None)
+            # after `cleanup` the path is gone already
+            if not owned or path not in self.refs:
+                return
+
+            self.refs[path] -= 1
+            if self.refs[path] > 0:
+                return
+
+            del self.refs[path]
+
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self):
+        """Remove all files owned by this process, including the files that
+        workers created for it that were never decoded."""
+        with self.lock:
+            paths = set(self.refs)
+            self.refs.clear()
+            for directory in self.directories:
+                paths.update(glob.glob(os.path.join(
+                    directory, shared_file_name(os.getpid(), '*'))))
+
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+def shared_file_name(owner, tag):
+    """Name of a shared memory file owned by the process with id `owner`."""
+    return 'noodles-{}-{}.npy'.format(owner, tag)
+
+
+shared_arrays = SharedArrays()
+
+
+def _shared_memory_dir():
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+
+    return tempfile.gettempdir()
+
+
+class SerNumpyArrayToSharedMemory(ArrayContentHash, Serialiser):
+    """Serialises Numpy arrays to .npy files in shared memory, passing only
+    the filename. Decoded arrays are read-only, memory mapped views of
+    the file. A read-only array that is already in shared memory is passed
+    on without copying; arrays that can be written to are copied to a new
+    file every time. Arrays of Python objects and empty arrays are encoded
+    as bytes, like :py:class:`SerNumpyArray` does.
+
+    Files are removed when the scheduler process no longer holds any
+    array using them, or when it exits. Handles are only valid on the
+    local machine and while the file is in use, so don't use this
+    serialiser to store results in a persistent database."""
+    def __init__(self, directory=None):
+        super(SerNumpyArrayToSharedMemory, self).__init__(numpy.ndarray)
+        self.directory = directory or _shared_memory_dir()
+        self.fallback = SerNumpyArray()
+        shared_arrays.add_directory(self.directory)
+
+    def encode(self, obj, make_rec):
+        handle = shared_arrays.lookup(obj)
+        if handle is None:
+            if obj.dtype.hasobject or obj.size == 0:
+                return self.fallback.encode(obj, make_rec)
+
+            owner = scheduler_pid()
+            path = os.path.join(self.directory, shared_file_name(
+                owner, uuid.uuid4().hex))
+            out = numpy.lib.format.open_memmap(
+                path, mode='w+', dtype=obj.dtype, shape=obj.shape)
+            out[...] = obj
+            out.flush()
+            del out
+
+            handle = (path, owner)
+            if handle[1] == os.getpid():
+                shared_arrays.track(obj, *handle, reuse=_is_frozen(obj))
+            # otherwise the scheduler takes ownership on decoding
+
+        path, owner = handle
+        return make_rec({'path': path, 'owner': owner})
+
+    def decode(self, cls, data):
+        if not isinstance(data, dict):
+            return self.fallback.decode(cls, data)
+
+        mapped = numpy.load(data['path'], mmap_mode='r')
+        shared_arrays.track(mapped, data['path'], data['owner'])
+        return numpy.asarray(mapped)
+
+
 class SerUFunc(Serialiser):
     """Serialiser for Numpy UFuncs."""
     def __init__(self):
@@ -118,6 +384,54 @@ class SerUFunc(Serialiser):
         return look_up(data)
 
 
+def _is_frozen(a):
+    """Check that neither the array, nor any array it is a view of, can
+    be written to."""
+    while isinstance(a, numpy.ndarray):
+        if a.flags.writeable:
+            return False
+        if isinstance(a, numpy.memmap) and a.mode == 'r':
+            return True
+        a = a.base
+
+    return a is None or isinstance(a, bytes)
+
+
+def capture_array(obj, memo):
+    """Capture policy for Numpy arrays: arrays that can not be written to are
+    shared between workflows, other arrays are copied."""
+    if obj.dtype != object and _is_frozen(obj):
+        return obj
+
+    if id(obj) not in memo:
+        memo[id(obj)] = obj.copy() if obj.dtype != object \
+            else deepcopy(obj, memo)
+
+    return memo[id(obj)]
+
+
+def capture_array_view(obj, memo):
+    """Capture policy that passes Numpy arrays to scheduled functions as
+    read-only views, without copying any data. This is only safe if arrays
+    are not modified after they are given to a scheduled function. Enable
+    this policy with::
+
+        capture_policy(numpy.ndarray, capture_array_view)
+    """
+    if obj.dtype == object:
+        return capture_array(obj, memo)
+
+    if id(obj) not in memo:
+        view = obj.view()
+        view.flags.writeable = False
+        memo[id(obj)] = view
+
+    return memo[id(obj)]
+
+
+capture_policy(numpy.ndarray, capture_array)
+
+
 def _numpy_hook(obj):
     """If an object is a ufunc, return '<ufunc>'"""
     if isinstance(obj, numpy.ufunc):
@@ -126,13 +440,16 @@ def _numpy_hook(obj):
     return None
 
 
-def arrays_to_file(file_prefix=None):
+def arrays_to_file(file_prefix=None, mmap=False):
     """Returns a serialisation registry for serialising NumPy data and
     as well as any UFuncs that have no normal way of retrieving
-    qualified names."""
+    qualified names.
+
+    :param file_prefix: prefix to the names of the .npy files.
+    :param mmap: decode arrays as read-only memory maps."""
     return Registry(
         types={
-            numpy.ndarray: SerNumpyArrayToFile(file_prefix)
+            numpy.ndarray: SerNumpyArrayToFile(file_prefix, mmap)
         },
         hooks={
             '<ufunc>': SerUFunc()
@@ -155,11 +472,35 @@ def arrays_to_string(file_prefix=None):
     )
 
 
-def arrays_to_hdf5(filename="cache.hdf5"):
-    """Returns registry for serialising arrays to a HDF5 reference."""
+def arrays_to_hdf5(filename="cache.hdf5", mmap=False, keep_open=False):
+    """Returns registry for serialising arrays to a HDF5 reference.
+
+    :param filename: name of the HDF5 file.
+    :param mmap: decode arrays as read-only memory maps.
+    :param keep_open: keep the HDF5 file open between calls; only use this
+        if a single process uses the file."""
     return Registry(
         types={
-            numpy.ndarray: SerNumpyArrayToHDF5(filename, "cache.lock")
+            numpy.ndarray: SerNumpyArrayToHDF5(
+                filename, "cache.lock", mmap, keep_open)
+        },
+        hooks={
+            '<ufunc>': SerUFunc()
+        },
+        hook_fn=_numpy_hook
+    )
+
+
+def arrays_to_shared_memory(directory=None):
+    """Returns registry for passing arrays between processes on the same
+    machine through shared memory (see
+    :py:class:`SerNumpyArrayToSharedMemory`).
+
+    :param directory: where to create the files, by default `/dev/shm`."""
+    return Registry(
+        types={
+            numpy.ndarray: SerNumpyArrayToSharedMemory(directory),
+            numpy.floating: SerNumpyScalar()
         },
         hooks={
             '<ufunc>': SerUFunc()
@@ -1,15 +1,67 @@
 from abc import (ABC, abstractmethod)
-from queue import Queue
+from collections import deque
 from ..lib import (
-    object_name, look_up, deep_map, inverse_deep_map)
+    object_name, look_up, inverse_deep_map)
 
 import noodles
 
+import json as std_json
+from json.encoder import encode_basestring_ascii
+
 try:
     import ujson as json
 except ImportError:
     import json
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+_plain_types = frozenset([dict, list, str, int, float, bool])
+_scalar_types = frozenset([str, int, float, bool, type(None)])
+
+
+def _json_float(x):
+    if x != x:
+        return 'NaN'
+    if x == float('inf'):
+        return 'Infinity'
+    if x == -float('inf'):
+        return '-Infinity'
+    return float.__repr__(x)
+
+
+def _json_scalar(x, t):
+    """JSON representation of scalar `x` of type `t`, or `None` if `x` is
+    not a builtin scalar."""
+    if t is str:
+        return encode_basestring_ascii(x)
+    if t is int:
+        return int.__repr__(x)
+    if t is float:
+        return _json_float(x)
+    if t is bool:
+        return 'true' if x else 'false'
+    if x is None:
+        return 'null'
+    return None
+
+
+def _json_key(k):
+    t = type(k)
+    if t is str:
+        return encode_basestring_ascii(k)
+
+    s = _json_scalar(k, t)
+    if s is None:
+        raise TypeError(
+            "keys must be str, int, float, bool or None, not {}"
+            .format(t.__name__))
+
+    return '"' + s + '"'
+
 
 def _chain_fn(a, b):
     def f(obj):
@@ -49,6 +101,9 @@ class Registry(object):
     overrides and augments the Serialisers present. The `hook` functions
     are being chained, such that the right-hand registry takes precedence.
     The default serialiser is inherrited from the left-hand argument.
+
+    The result of looking up a serialiser by type is cached; the cache is
+    cleared when a serialiser is set.
     """
     def __init__(self, parent=None, types=None, hooks=None, hook_fn=None,
                  default=None):
@@ -78,6 +133,7 @@ class Registry(object):
             The default fall-back for the new Registry.
         :type default: `Serialiser`"""
         self._sers = parent._sers.copy() if parent else {}
+        self._cache = {}
 
         if types:
             for k, v in types.items():
@@ -117,25 +173,33 @@ class Registry(object):
     def __getitem__(self, key):
         """Searches the most fitting serialiser based on the inheritance tree
         of the given class. We search this tree breadth-first."""
-        q = Queue()  # use a queue for breadth-first decent
-
-        q.put(key)
-        while not q.empty():
-            cls = q.get()
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        ser = None
+        q = deque([key])  # use a queue for breadth-first decent
+        while q:
+            cls = q.popleft()
             m_n = object_name(cls)
 
             if m_n in self._sers:
-                return self._sers[m_n]
+                ser = self._sers[m_n]
+                break
             else:
-                for base in cls.__bases__:
-                    q.put(base)
+                q.extend(cls.__bases__)
+
+        self._cache[key] = ser
+        return ser
 
     def __setitem__(self, cls, value):
         """Sets a new Serialiser for the given class."""
         m_n = object_name(cls)
         self._sers[m_n] = value
+        self._cache.clear()
 
-    def encode(self, obj, host=None):
+    def encode(self, obj, host=None, binary=False):
         """Encode an object using the serialisers available
         in this registry. Objects that have a type that is one of
         [dict, list, str, int, float, bool, tuple] are send back unchanged.
@@ -151,11 +215,19 @@ class Registry(object):
         :param host:
             The name of the encoding host.
         :type host: str
+
+        :param binary:
+            If the target format supports binary data (like MessagePack does),
+            `bytes` objects are sent back unchanged as well.
+        :type binary: bool
         """
         if obj is None:
             return None
 
-        if type(obj) in [dict, list, str, int, float, bool]:
+        if type(obj) in _plain_types:
+            return obj
+
+        if binary and type(obj) is bytes:
             return obj
 
         if isinstance(obj, RefObject):
@@ -227,12 +299,123 @@ class Registry(object):
         else:
             return self._sers[typename].decode(cls, rec['data'])
 
-    def deep_encode(self, obj, host=None):
-        return deep_map(lambda o: self.encode(o, host), obj)
+    def deep_encode(self, obj, host=None, binary=False):
+        """Encode `obj` recursively, like :py:func:`deep_map` does, but
+        passing builtin scalars and containers without calling
+        :py:meth:`encode`."""
+        return self._deep_encoder(host, binary)(obj)
+
+    def hash_encode(self, obj):
+        """Encode `obj` recursively for computing a provenance key. This
+        works like :py:meth:`deep_encode`, except that objects for which
+        the serialiser gives a :py:meth:`Serialiser.content_hash` are
+        replaced by a record `{'class': ..., 'content_hash': ...}`, so that
+        they are never encoded in full."""
+        return self._deep_encoder(None, False, hashing=True)(obj)
+
+    def _content_hash(self, obj):
+        if isinstance(obj, RefObject):
+            return None
+
+        hook = self._hook(obj) if self._hook else None
+        ser = self._sers[hook] if hook else self[type(obj)]
+        digest = ser.content_hash(obj)
+        if digest is None:
+            return None
+
+        return {'class': object_name(type(obj)), 'content_hash': digest}
+
+    def _deep_encoder(self, host, binary, hashing=False):
+        def walk(o):
+            t = type(o)
+            if t in _scalar_types:
+                return o
+
+            if t is not dict and t is not list:
+                if hashing:
+                    rec = self._content_hash(o)
+                    if rec is not None:
+                        return rec
+                o = self.encode(o, host, binary)
+                t = type(o)
+
+            if t is dict or isinstance(o, dict):
+                return {k: walk(v) for k, v in o.items()}
+
+            if t is list or isinstance(o, (list, tuple)):
+                return [walk(v) for v in o]
+
+            return o
+
+        return walk
 
     def deep_decode(self, rec, deref=False):
         return inverse_deep_map(lambda r: self.decode(r, deref), rec)
 
+    def dump_json(self, obj, write, host=None, chunk_size=256):
+        """Recursively encode `obj` and write it as JSON in pieces, by
+        calling `write` with strings. Objects are encoded while writing, so
+        the encoded structure is never held in memory as a whole: lists are
+        encoded and written in chunks of `chunk_size` items.
+
+        :param obj:
+            Object to encode.
+
+        :param write:
+            Function taking a string, for instance the `write` method of a
+            file.
+
+        :param host:
+            hostname where this object is being encoded.
+        :type host: str"""
+        encode = self.encode
+        deep_encode = self._deep_encoder(host, False)
+
+        def walk(o):
+            t = type(o)
+            s = _json_scalar(o, t)
+            if s is not None:
+                write(s)
+                return
+
+            if t is not dict and t is not list:
+                o = encode(o, host)
+                t = type(o)
+                s = _json_scalar(o, t)
+                if s is not None:
+                    write(s)
+                    return
+
+            if t is dict or isinstance(o, dict):
+                sep = '{'
+                for k, v in o.items():
+                    write(sep + _json_key(k) + ':')
+                    walk(v)
+                    sep = ','
+                write('{}' if sep == '{' else '}')
+                return
+
+            if t is list or isinstance(o, (list, tuple)):
+                if not isinstance(o, list):
+                    o = list(o)
+                if not o:
+                    write('[]')
+                    return
+
+                sep = '['
+                for i in range(0, len(o), chunk_size):
+                    chunk = [deep_encode(x) for x in o[i:i+chunk_size]]
+                    write(sep + json.dumps(chunk)[1:-1])
+                    sep = ','
+                write(']')
+                return
+
+            raise TypeError(
+                "Object of type {} can not be written as JSON"
+                .format(t.__name__))
+
+        walk(obj)
+
     def to_json(self, obj, host=None, indent=None):
         """Recursively encode `obj` and convert it to a JSON string.
 
@@ -243,15 +426,16 @@ class Registry(object):
             hostname where this object is being encoded.
         :type host: str"""
         if indent:
-            return json.dumps(deep_map(lambda o: self.encode(o, host), obj),
-                              indent=indent)
-        else:
-            return json.dumps(deep_map(lambda o: self.encode(o, host), obj))
+            return json.dumps(self.deep_encode(obj, host), indent=indent)
+
+        chunks = []
+        self.dump_json(obj, chunks.append, host)
+        return ''.join(chunks)
 
     def from_json(self, data, deref=False):
         """Decode the string from JSON to return the original object (if
         `deref` is true. Uses the `json.loads` function with `self.decode`
-        as object_hook.
+        as object_hook, so records are decoded while parsing.
 
         :param data:
             JSON encoded string.
@@ -260,8 +444,37 @@ class Registry(object):
         :param deref:
             Whether to decode records that gave `ref=True` at encoding.
         :type deref: bool"""
-        return self.deep_decode(json.loads(data), deref)
-        # return json.loads(data, object_hook=lambda o: self.decode(o, deref))
+        return std_json.loads(
+            data, object_hook=lambda rec: self.decode(rec, deref))
+
+    def to_msgpack(self, obj, host=None):
+        """Recursively encode `obj` and convert it to MessagePack. Unlike
+        :py:meth:`to_json`, `bytes` objects are stored as raw binary data.
+        This needs the `msgpack` package to be installed.
+
+        :param obj:
+            Object to encode.
+
+        :param host:
+            hostname where this object is being encoded.
+        :type host: str"""
+        return msgpack.packb(
+            self.deep_encode(obj, host, binary=True), use_bin_type=True)
+
+    def from_msgpack(self, data, deref=False):
+        """Decode a MessagePack message to return the original object (if
+        `deref` is true).
+
+        :param data:
+            MessagePack encoded bytes.
+        :type data: bytes
+
+        :param deref:
+            Whether to decode records that gave `ref=True` at encoding.
+        :type deref: bool"""
+        return msgpack.unpackb(
+            data, raw=False, strict_map_key=False,
+            object_hook=lambda rec: self.decode(rec, deref))
 
     def dereference(self, data, host=None):
         """Dereferences RefObjects stuck in the hierarchy. This is a bit
@@ -334,6 +547,17 @@ class Serialiser(ABC):
             the encoder."""
         pass
 
+    def content_hash(self, obj):
+        """May give a hash of the contents of `obj` as a string, to compute
+        provenance keys without encoding the object (see
+        :py:meth:`Registry.hash_encode`). Objects that are equal should
+        give the same hash. The default returns `None`, meaning the encoded
+        object is hashed.
+
+        :param obj:
+            Object to be hashed."""
+        return None
+
 
 class SerUnknown(Serialiser):
     def encode(self, obj, make_rec):
@@ -1,12 +1,18 @@
 from .arguments import (Empty, ArgumentKind, Argument, ArgumentAddress)
 from .model import (
-    Workflow, FunctionNode, NodeData, get_workflow, is_workflow, is_node_ready)
+    Workflow, FunctionNode, NodeData, get_workflow, is_workflow, is_node_ready,
+    n_empty_arguments, node_arguments)
 from .mutations import (reset_workflow, insert_result)
 from .create import (from_call)
 from .graphs import (invert_links)
+from .compact import (CompactWorkflow, CompactNode, ArgumentLayout)
+from .capture import (capture, capture_policy, share)
 
 __all__ = ['invert_links', 'from_call',
            'Workflow', 'FunctionNode', 'NodeData',
+           'CompactWorkflow', 'CompactNode', 'ArgumentLayout',
            'get_workflow', 'is_workflow', 'reset_workflow',
-           'insert_result', 'Empty', 'is_node_ready',
-           'Argument', 'ArgumentAddress', 'ArgumentKind']
+           'insert_result', 'Empty', 'is_node_ready', 'n_empty_arguments',
+           'node_arguments',
+           'Argument', 'ArgumentAddress', 'ArgumentKind',
+           'capture', 'capture_policy', 'share']
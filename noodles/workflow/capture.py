@@ -0,0 +1,147 @@
+"""
+Capturing arguments
+===================
+
+When a scheduled function is called, the plain (non-promised) arguments are
+copied into the workflow, so that changing an object after the call does not
+change the workflow (*call by value*). Doing this with :func:`deepcopy` is
+safe but wasteful: immutable objects don't need copying at all.
+
+The |capture| function copies an object according to a *policy* that is
+looked up by the type of the object, searching the method resolution order
+of the type, much like a serialisation :py:class:`Registry` does. A policy
+is a function taking the object and a `memo` dictionary (entirely analogous
+to :func:`deepcopy`) and returning the captured object. Built-in policies
+are:
+
+    * |share| for immutable objects: numbers, strings, bytes, `None`, types
+      and functions,
+    * tuples, frozen sets and frozen dataclasses are shared if all their
+      items are shared, and deep-copied otherwise,
+    * lists and dictionaries are copied, capturing their items,
+    * any other object is copied with :func:`deepcopy`.
+
+More policies can be set with |capture_policy|; for instance, the NumPy
+serialisation module shares read-only arrays, and offers a policy to capture
+arrays as read-only views.
+
+.. |capture| replace:: :py:func:`capture`
+.. |share| replace:: :py:func:`share`
+.. |capture_policy| replace:: :py:func:`capture_policy`
+"""
+
+from copy import deepcopy
+from dataclasses import (is_dataclass, fields)
+from enum import Enum
+import types
+
+
+def share(obj, memo):
+    """Capture policy for immutable objects: the object is not copied."""
+    return obj
+
+
+def deep_copy(obj, memo):
+    """Default capture policy, using :func:`deepcopy`."""
+    return deepcopy(obj, memo)
+
+
+def _capture_items(obj, items, memo):
+    """Share `obj` if all of `items` are shared, otherwise deep-copy it,
+    reusing the captured items through `memo`."""
+    if all(capture(x, memo) is x for x in items):
+        return obj
+
+    return deepcopy(obj, memo)
+
+
+def _capture_tuple(obj, memo):
+    return _capture_items(obj, obj, memo)
+
+
+def _capture_frozen_dataclass(obj, memo):
+    return _capture_items(
+        obj, [getattr(obj, f.name) for f in fields(obj)], memo)
+
+
+def _capture_list(obj, memo):
+    if type(obj) is not list:
+        return deepcopy(obj, memo)
+
+    if id(obj) in memo:
+        return memo[id(obj)]
+
+    result = []
+    memo[id(obj)] = result
+    result.extend(capture(x, memo) for x in obj)
+    return result
+
+
+def _capture_dict(obj, memo):
+    if type(obj) is not dict:
+        return deepcopy(obj, memo)
+
+    if id(obj) in memo:
+        return memo[id(obj)]
+
+    result = {}
+    memo[id(obj)] = result
+    for k, v in obj.items():
+        result[capture(k, memo)] = capture(v, memo)
+    return result
+
+
+_policies = {
+    int: share, float: share, complex: share, str: share, bytes: share,
+    type(None): share, range: share, slice: share, type: share, Enum: share,
+    types.FunctionType: share, types.BuiltinFunctionType: share,
+    tuple: _capture_tuple, frozenset: _capture_tuple,
+    list: _capture_list, dict: _capture_dict,
+}
+
+_policy_cache = {}
+
+
+def capture_policy(cls, policy):
+    """Set the capture policy for objects of type `cls` and derived types.
+
+    :param cls: type of objects to apply the policy to.
+    :param policy: a function taking an object and a `memo` dictionary,
+        returning the captured object. Use :py:func:`share` for immutable
+        types."""
+    _policies[cls] = policy
+    _policy_cache.clear()
+
+
+def get_capture_policy(cls):
+    """Find the capture policy for objects of type `cls`."""
+    try:
+        return _policy_cache[cls]
+    except KeyError:
+        pass
+
+    policy = next(
+        (_policies[base] for base in cls.__mro__ if base in _policies),
+        None)
+
+    if policy is None:
+        if is_dataclass(cls) and cls.__dataclass_params__.frozen:
+            policy = _capture_frozen_dataclass
+        else:
+            policy = deep_copy
+
+    _policy_cache[cls] = policy
+    return policy
+
+
+def capture(obj, memo=None):
+    """Capture the value of `obj` to be stored in a workflow. This has the
+    same effect as :func:`deepcopy`, but objects that are known to be
+    immutable are not copied.
+
+    :param obj: any object.
+    :param memo: used for internal caching (similar to :func:`deepcopy`)."""
+    if memo is None:
+        memo = {}
+
+    return get_capture_policy(type(obj))(obj, memo)
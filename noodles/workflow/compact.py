@@ -0,0 +1,305 @@
+"""
+Compact workflows
+=================
+
+A |Workflow| keeps its nodes in a `dict` keyed by `id(node)` and its links in
+a `dict` of `set` objects, while every |FunctionNode| carries an
+:py:class:`inspect.BoundArguments` object. For workflows of millions of nodes
+most of the memory is spent on these per-node objects.
+
+A |CompactWorkflow| is a frozen form of the same graph:
+
+    * nodes are numbered densely, from 0 to `len(nodes) - 1`,
+    * links and inverse links are stored in CSR (compressed sparse row)
+      layout, using flat :py:class:`array.array` objects,
+    * functions, argument layouts and argument addresses are interned in
+      tables shared by all nodes,
+    * each node is a |CompactNode| with `__slots__`, storing its argument
+      values in a flat list.
+
+The structure of the graph can not be changed, but arguments and results can
+be filled in, so the |Scheduler| can run a |CompactWorkflow| like any other
+workflow. Use :py:meth:`CompactWorkflow.from_workflow` and
+:py:meth:`CompactWorkflow.to_workflow` to convert between both forms.
+
+.. |Workflow| replace:: :py:class:`Workflow`
+.. |FunctionNode| replace:: :py:class:`FunctionNode`
+.. |CompactWorkflow| replace:: :py:class:`CompactWorkflow`
+.. |CompactNode| replace:: :py:class:`CompactNode`
+.. |Scheduler| replace:: :py:class:`Scheduler`
+"""
+
+from array import array
+from collections.abc import Mapping
+
+from .arguments import (
+    serialize_arguments, ref_argument, bind_arguments, ArgumentKind, Empty)
+from .model import (Workflow, FunctionNode, NodeData, _sugar, _arg_to_str)
+
+
+class ArgumentLayout:
+    """The addresses of all arguments of a function call, in the order
+    given by :py:func:`serialize_arguments`. Nodes calling the same function
+    with the same number of variadic and keyword arguments share a layout.
+
+    .. py:attribute:: addresses
+
+        Tuple of :py:class:`ArgumentAddress`.
+
+    .. py:attribute:: position
+
+        A `dict` giving the index of each address in `addresses`.
+    """
+    __slots__ = ('addresses', 'position')
+
+    def __init__(self, addresses):
+        self.addresses = addresses
+        self.position = {a: i for i, a in enumerate(addresses)}
+
+
+class CompactNode:
+    """Counterpart of :py:class:`FunctionNode` in a |CompactWorkflow|. The
+    argument values are stored in a flat list, matching the addresses in
+    `layout`."""
+    __slots__ = ('foo', 'layout', 'values', 'hints', 'result', 'prov',
+                 'local_prov')
+
+    def __init__(self, foo, layout, values, hints, result=Empty, prov=None):
+        self.foo = foo
+        self.layout = layout
+        self.values = values
+        self.hints = hints
+        self.result = result
+        self.prov = prov
+        self.local_prov = None
+
+    def arguments(self):
+        """Iterates over `(address, value)` pairs of all arguments."""
+        return zip(self.layout.addresses, self.values)
+
+    def set_argument(self, address, value):
+        self.values[self.layout.position[address]] = value
+
+    def apply(self):
+        bound_args = bind_arguments(self.foo, self.data.arguments)
+        return self.foo(*bound_args.args, **bound_args.kwargs)
+
+    @property
+    def data(self):
+        """Convert to a :py:class:`NodeData` for subsequent serial."""
+        return NodeData(
+            self.foo, [(a, v) for a, v in self.arguments() if v is not Empty],
+            self.hints)
+
+    def __str__(self):
+        args = (v for a, v in self.arguments()
+                if a.kind is not ArgumentKind.keyword)
+        s = self.foo.__name__ + '(' + ", ".join(map(_arg_to_str, args)) + ')'
+        if self.result is not Empty:
+            s += ' -> ' + _sugar(str(self.result))
+        return s
+
+
+class NodeTable(Mapping):
+    """Read-only mapping from node index to |CompactNode|, so that a
+    |CompactWorkflow| can be used where the `nodes` of a |Workflow| are
+    expected."""
+    __slots__ = ('_nodes',)
+
+    def __init__(self, nodes):
+        self._nodes = nodes
+
+    def __getitem__(self, i):
+        if not isinstance(i, int) or i < 0:
+            raise KeyError(i)
+        try:
+            return self._nodes[i]
+        except IndexError:
+            raise KeyError(i) from None
+
+    def __iter__(self):
+        return iter(range(len(self._nodes)))
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def values(self):
+        return iter(self._nodes)
+
+
+class LinkTable(Mapping):
+    """Read-only adjacency table in CSR layout. The entries for node `i`
+    are found at `offsets[i]` up to `offsets[i+1]` in `targets`, and, if
+    `addresses` is given, in `address_index`.
+
+    Looking up node `i` gives a tuple of `(target, address)` pairs, if
+    addresses are stored, or a tuple of node indices otherwise."""
+    __slots__ = ('offsets', 'targets', 'address_index', 'addresses')
+
+    def __init__(self, offsets, targets, address_index=None, addresses=None):
+        self.offsets = offsets
+        self.targets = targets
+        self.address_index = address_index
+        self.addresses = addresses
+
+    def __getitem__(self, i):
+        if not isinstance(i, int) or not 0 <= i < len(self):
+            raise KeyError(i)
+
+        begin, end = self.offsets[i], self.offsets[i+1]
+        if self.addresses is None:
+            return tuple(self.targets[begin:end])
+
+        return tuple(
+            (self.targets[j], self.addresses[self.address_index[j]])
+            for j in range(begin, end))
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+def _csr(n, edges):
+    """Sort a list of `(source, target, ...)` tuples into CSR offsets."""
+    edges.sort(key=lambda e: e[0])
+    offsets = array('q', [0]) * (n + 1)
+    for e in edges:
+        offsets[e[0] + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+    return offsets
+
+
+class CompactWorkflow(Workflow):
+    """Frozen, array backed |Workflow|. Nodes are indexed by integers.
+
+    .. py:attribute:: functions
+
+        Table of unique functions called in this workflow.
+
+    .. py:attribute:: function_index
+
+        Array giving the index into `functions` for each node.
+
+    .. py:attribute:: layouts
+
+        Table of unique |ArgumentLayout| objects.
+
+    .. py:attribute:: addresses
+
+        Table of unique :py:class:`ArgumentAddress` objects that appear in
+        the links.
+    """
+    def __init__(self, root, nodes, functions, function_index, layouts,
+                 links, inverse_links):
+        super(CompactWorkflow, self).__init__(
+            root, NodeTable(nodes), links)
+        self.functions = functions
+        self.function_index = function_index
+        self.layouts = layouts
+        self.addresses = links.addresses
+        self._inverse_links = inverse_links
+
+    @property
+    def inverse_links(self):
+        return self._inverse_links
+
+    @staticmethod
+    def from_nodes(root, nodes, link_list):
+        """Build a |CompactWorkflow| from a list of |CompactNode| and a list
+        of `(source, target, address)` tuples; sets up the function and
+        address tables and the CSR link arrays."""
+        functions = []
+        function_ids = {}
+        function_index = array('l')
+        for node in nodes:
+            k = id(node.foo)
+            if k not in function_ids:
+                function_ids[k] = len(functions)
+                functions.append(node.foo)
+            function_index.append(function_ids[k])
+
+        layouts = list({id(node.layout): node.layout
+                        for node in nodes}.values())
+
+        addresses = []
+        address_ids = {}
+        for _, _, address in link_list:
+            if address not in address_ids:
+                address_ids[address] = len(addresses)
+                addresses.append(address)
+
+        n = len(nodes)
+        link_offsets = _csr(n, link_list)
+        links = LinkTable(
+            link_offsets,
+            array('q', (tgt for _, tgt, _ in link_list)),
+            array('l', (address_ids[a] for _, _, a in link_list)),
+            addresses)
+
+        inverse = sorted((tgt, src) for src, tgt, _ in link_list)
+        inverse_links = LinkTable(
+            _csr(n, inverse), array('q', (src for _, src in inverse)))
+
+        return CompactWorkflow(
+            root, nodes, functions, function_index, layouts,
+            links, inverse_links)
+
+    def copy(self):
+        """Copy the workflow. The nodes, holding arguments and results, are
+        copied; the tables and links, which can not be changed, are
+        shared."""
+        nodes = [CompactNode(node.foo, node.layout, list(node.values),
+                             node.hints, node.result, node.prov)
+                 for node in self.nodes.values()]
+        return CompactWorkflow(
+            self.root, nodes, self.functions, self.function_index,
+            self.layouts, self.links, self.inverse_links)
+
+    @staticmethod
+    def from_workflow(wf):
+        """Convert a |Workflow| to a |CompactWorkflow|. The nodes are copied,
+        so the original workflow is left untouched; a |CompactWorkflow| is
+        copied with :py:meth:`copy`."""
+        if isinstance(wf, CompactWorkflow):
+            return wf.copy()
+
+        index = {k: i for i, k in enumerate(wf.nodes)}
+        layout_table = {}
+        nodes = []
+
+        for node in wf.nodes.values():
+            addresses = tuple(serialize_arguments(node.bound_args))
+            key = (id(node.foo), addresses)
+            if key not in layout_table:
+                layout_table[key] = ArgumentLayout(addresses)
+            layout = layout_table[key]
+            values = [ref_argument(node.bound_args, a) for a in addresses]
+            nodes.append(CompactNode(
+                node.foo, layout, values, node.hints, node.result, node.prov))
+
+        link_list = [(index[src], index[tgt], address)
+                     for src, targets in wf.links.items()
+                     for tgt, address in targets]
+
+        return CompactWorkflow.from_nodes(index[wf.root], nodes, link_list)
+
+    def to_workflow(self):
+        """Convert back to a mutable |Workflow|."""
+        new_nodes = []
+        for node in self.nodes.values():
+            new_node = FunctionNode.from_node_data(
+                NodeData(node.foo, list(node.arguments()), node.hints))
+            new_node.result = node.result
+            new_node.prov = node.prov
+            new_nodes.append(new_node)
+
+        ids = [id(node) for node in new_nodes]
+        nodes = dict(zip(ids, new_nodes))
+        links = {ids[i]: {(ids[tgt], address)
+                          for tgt, address in self.links[i]}
+                 for i in self.links}
+
+        return Workflow(ids[self.root], nodes, links)
@@ -3,8 +3,7 @@ from .model import (
     Workflow, FunctionNode, get_workflow, is_workflow)
 from .arguments import (
     ref_argument, serialize_arguments, set_argument, Empty)
-
-from copy import deepcopy
+from .capture import (capture)
 
 
 def from_call(foo, args, kwargs, hints, call_by_value=True):
@@ -24,13 +23,14 @@ def from_call(foo, args, kwargs, hints, call_by_value=True):
     evaluating a workflow.
 
     If an argument is a promised value, the workflow representing the value
-    is added to the new workflow. First all the nodes in the original workflow,
-    if not already present in the new workflow from an earlier argument,
-    are copied to the new workflow, and a new entry is made into the link
-    dictionary. Then the links in the old workflow are also added to the
-    link dictionary. Since the link dictionary points from nodes to a
-    :py:class:`set` of :py:class:`ArgumentAddress` es, no links are
-    duplicated.
+    is kept as a *part* of the new workflow, together with the address of
+    the argument that it links to. The nodes and links of all the parts are
+    only merged into the dictionaries of the new workflow when these are first
+    accessed (see :py:class:`Workflow`). Nodes that are present in several
+    parts are merged only once, and since the link dictionary points from
+    nodes to a :py:class:`set` of :py:class:`ArgumentAddress` es, no links
+    are duplicated. Building a workflow out of `N` calls therefore takes
+    time linear in `N`.
 
     In the ``bound_args`` object the promised value is replaced by the
     ``Empty`` object, so that we can see which arguments still have to be
@@ -83,37 +83,29 @@ def from_call(foo, args, kwargs, hints, call_by_value=True):
 
     # setup the new workflow
     root = id(node)
-    nodes = {root: node}
-    links = {root: set()}
+    parts = []
 
     # walk the arguments to the function call
     for address in serialize_arguments(node.bound_args):
         arg = ref_argument(node.bound_args, address)
 
         # the argument may still become a workflow if it
-        # has the __deepcopy__ operator overloaded to return a workflow
+        # has the __deepcopy__ operator overloaded to return a workflow;
+        # objects known to be immutable are not copied (see `capture`)
         call_by_ref = 'call_by_ref' in hints and \
             (hints['call_by_ref'] is True or
              address.name in hints['call_by_ref'])
 
         if not is_workflow(arg) and call_by_value and not call_by_ref:
-            arg = deepcopy(arg)
+            arg = capture(arg)
 
         # if still not a workflow, we have a plain value!
         if not is_workflow(arg):
             set_argument(node.bound_args, address, arg)
             continue
 
-        # merge the argument workflow into the new workflow
-        workflow = get_workflow(arg)
+        # keep a reference to the argument workflow, to be merged later
         set_argument(node.bound_args, address, Empty)
-        for n in workflow.nodes:
-            if n not in nodes:
-                nodes[n] = workflow.nodes[n]
-                links[n] = set()
-
-            links[n].update(workflow.links[n])
-
-        links[workflow.root].add((root, address))
+        parts.append((get_workflow(arg), address))
 
-    return Workflow(root, nodes, links)
+    return Workflow(root, {root: node}, {root: set()}, parts)
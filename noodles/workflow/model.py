@@ -39,6 +39,16 @@ class FunctionNode:
 
     A :py:class:`BoundArguments` object storing the arguments to
     the function.
+
+    .. py:attribute:: prov
+
+    The global provenance key, see :py:func:`set_global_provenance`.
+
+    .. py:attribute:: local_prov
+
+    Cached tuple of the registry, the name of the hash function and the
+    local provenance key computed with them, see
+    :py:func:`node_prov_key`; cleared when an argument is inserted.
     """
     @staticmethod
     def from_node_data(data):
@@ -52,6 +62,7 @@ class FunctionNode:
         self.hints = hints
         self.result = result
         self.prov = None
+        self.local_prov = None
 
     def apply(self):
         return self.foo(*self.bound_args.args, **self.bound_args.kwargs)
@@ -86,18 +97,78 @@ class Workflow:
     .. py:attribute:: links
 
         A `dict` giving a `set` of links from each node.
+
+    A workflow may also be given as a root node together with a list of
+    `parts`: pairs of a workflow and the |ArgumentAddress| of the root node
+    that it links to. In that case `nodes` and `links` are only collected
+    from the parts when they are first accessed. This way, building up a
+    workflow from function calls takes time linear in the number of calls,
+    in stead of copying the entire graph of the arguments at each call.
+
+    .. |ArgumentAddress| replace:: :py:class:`ArgumentAddress`
     """
-    def __init__(self, root, nodes, links):
+    def __init__(self, root, nodes, links, parts=None):
         self.root = root
-        self.nodes = nodes
-        self.links = links
+        self._nodes = nodes
+        self._links = links
+        self._parts = parts
 
     def __iter__(self):
         return iter((self.root, self.nodes, self.links))
 
+    @property
+    def nodes(self):
+        if self._parts:
+            self._resolve()
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes):
+        self._nodes = nodes
+
+    @property
+    def links(self):
+        if self._parts:
+            self._resolve()
+        return self._links
+
+    @links.setter
+    def links(self, links):
+        self._links = links
+
+    def _resolve(self):
+        """Collect the nodes and links of all parts, walking the graph of
+        workflows depth-first. Each workflow is visited only once."""
+        nodes = {}
+        links = {}
+        visited = set()
+        stack = [self]
+
+        while stack:
+            wf = stack.pop()
+            if id(wf) in visited:
+                continue
+            visited.add(id(wf))
+
+            if not wf._parts:
+                for n, node in wf.nodes.items():
+                    nodes.setdefault(n, node)
+                    links.setdefault(n, set()).update(wf.links[n])
+                continue
+
+            nodes.setdefault(wf.root, wf._nodes[wf.root])
+            links.setdefault(wf.root, set())
+            for sub, address in wf._parts:
+                links.setdefault(sub.root, set()).add((wf.root, address))
+            stack.extend(sub for sub, _ in reversed(wf._parts))
+
+        self._nodes = nodes
+        self._links = links
+        self._parts = None
+
     @property
     def root_node(self):
-        return self.nodes[self.root]
+        return self._nodes[self.root]
 
     @property
     def prov(self):
@@ -134,8 +205,26 @@ def get_workflow(x):
     return None
 
 
+def node_arguments(node):
+    """Iterates over `(address, value)` pairs of all arguments of a node.
+    Besides :py:class:`FunctionNode` this accepts any node that has an
+    `arguments` method doing the same, like the nodes of a
+    :py:class:`CompactWorkflow`."""
+    if isinstance(node, FunctionNode):
+        return ((a, ref_argument(node.bound_args, a))
+                for a in serialize_arguments(node.bound_args))
+
+    return node.arguments()
+
+
 def is_node_ready(node):
     """Returns True if none of the argument holders contain any `Empty` object.
     """
-    return all(ref_argument(node.bound_args, a) is not Empty
-               for a in serialize_arguments(node.bound_args))
+    return all(v is not Empty for _, v in node_arguments(node))
+
+
+def n_empty_arguments(node):
+    """Returns the number of argument holders that still contain an `Empty`
+    object. A node is ready to be evaluated once this number reaches zero.
+    """
+    return sum(1 for _, v in node_arguments(node) if v is Empty)
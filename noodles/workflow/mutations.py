@@ -1,10 +1,13 @@
 from .arguments import set_argument, Empty
+from .model import FunctionNode
 
 
 def reset_workflow(workflow):
     for tgt in workflow.links.values():
         for m, a in tgt:
-            set_argument(workflow.nodes[m].bound_args, a, Empty)
+            node = workflow.nodes[m]
+            set_argument(node.bound_args, a, Empty)
+            node.local_prov = None
 
     return workflow
 
@@ -14,6 +17,11 @@ def insert_result(node, address, value):
     already filled with some data. In any normal circumstance this checking
     is redundant, but if we don't give an error here the program would continue
     with unexpected results.
+
+    Nodes other than :py:class:`FunctionNode` should provide their own
+    `set_argument` method.
+
+    The cached provenance key of the node is cleared.
     """
     # a = ref_argument(node.bound_args, address)
     # if a != Empty:
@@ -22,4 +30,10 @@ def insert_result(node, address, value):
     #        .format(arg=format_address(address),
     #                name=node.foo.__name__))
 
+    node.local_prov = None
+
+    if not isinstance(node, FunctionNode):
+        node.set_argument(address, value)
+        return
+
     set_argument(node.bound_args, address, value)
@@ -34,6 +34,7 @@ setup(
     extras_require={
         'xenon': ['pyxenon'],
         'numpy': ['numpy', 'h5py', 'filelock'],
+        'msgpack': ['msgpack'],
         'develop': [
             'pytest', 'pytest', 'coverage', 'pep8', 'numpy', 'tox',
             'sphinx', 'sphinx_rtd_theme', 'nbsphinx', 'flake8'],
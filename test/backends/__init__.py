@@ -8,8 +8,14 @@ from noodles import run_process, serial
 from noodles.run.single.sqlite3 import run_single as run_single_sqlite
 from noodles.serial.numpy import arrays_to_string
 from noodles.run.threading.sqlite3 import run_parallel as run_parallel_sqlite
+from noodles.run.pool import run_pool
 from .backend_factory import backend_factory
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 
 def registry():
     """Serialisation registry for matrix testing backends."""
@@ -27,13 +33,33 @@ backends = {
     'threads-4-sqlite': backend_factory(
         run_parallel_sqlite, supports=['local', 'prov'],
         n_threads=4, db_file=':memory:', registry=registry, always_cache=True),
+    'threads-4-sqlite-write-behind': backend_factory(
+        run_parallel_sqlite, supports=['local', 'prov'],
+        n_threads=4, db_file=':memory:', registry=registry, always_cache=True,
+        write_behind=True),
     'threads-4-sqlite-optional': backend_factory(
         run_parallel_sqlite, supports=['local', 'prov'],
         n_threads=4, db_file=':memory:', registry=registry,
         always_cache=False),
     'processes-2': backend_factory(
         run_process, supports=['remote'], n_processes=2, registry=registry,
-        verbose=True)
+        verbose=True),
+    'processes-1-threads-4': backend_factory(
+        run_process, supports=['remote'], n_processes=1, registry=registry,
+        n_threads=4),
+    'processes-2-work-stealing': backend_factory(
+        run_process, supports=['remote'], n_processes=2, registry=registry,
+        selector='work-stealing'),
+    'pool-2': backend_factory(
+        run_pool, supports=['remote'], n_processes=2),
+    'pool-2-json-recycle': backend_factory(
+        run_pool, supports=['remote'], n_processes=2, registry=registry,
+        transport='json', max_jobs_per_worker=3)
 }
 
+if msgpack is not None:
+    backends['processes-2-msgpack'] = backend_factory(
+        run_process, supports=['remote'], n_processes=2, registry=registry,
+        format='msgpack')
+
 __all__ = ['backends']
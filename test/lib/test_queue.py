@@ -1,3 +1,5 @@
+import threading
+
 from noodles.lib import Queue, EndOfQueue, patch, pull_from
 from pytest import raises
 
@@ -19,3 +21,26 @@ def test_queue_chaining():
     except StopIteration:
         pass
     assert list(Q.source) == [i*i for i in range(10)]
+
+
+def test_bounded_queue():
+    Q = Queue(maxsize=2)
+    sink = Q.sink()
+    sink.send(1)
+    sink.send(2)
+
+    sent = threading.Event()
+
+    def producer():
+        sink.send(3)
+        sent.set()
+
+    threading.Thread(target=producer, daemon=True).start()
+    assert not sent.wait(0.05)
+
+    source = Q.source()
+    assert next(source) == 1
+    assert sent.wait(1)
+    assert next(source) == 2
+    Q.close()
+    assert list(source) == [3]
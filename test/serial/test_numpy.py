@@ -3,7 +3,8 @@ import pytest
 try:
     import numpy as np
     from numpy import (random, fft, exp)
-    from noodles.serial.numpy import arrays_to_hdf5
+    from noodles.serial.numpy import (
+        arrays_to_hdf5, arrays_to_file, array_sha256)
 
     from noodles.run.threading.sqlite3 import (
         run_parallel
@@ -63,3 +64,74 @@ def test_hdf5():
 
     assert isinstance(result, np.ndarray)
     assert result.size == 256
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_mmap(tmpdir):
+    a = np.arange(1000.).reshape(10, 100)
+    for reg in [serial.base() + arrays_to_file(str(tmpdir) + '/', mmap=True),
+                serial.base() + arrays_to_hdf5(
+                    str(tmpdir.join('cache.hdf5')), mmap=True)]:
+        b = reg.from_json(reg.to_json(a), deref=True)
+        assert isinstance(b, np.memmap)
+        assert not b.flags.writeable
+        assert np.all(b == a)
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_hdf5_dedup(tmpdir):
+    import h5py
+    filename = str(tmpdir.join('cache.hdf5'))
+
+    # a file written without index
+    with h5py.File(filename, 'w') as f:
+        f['old'] = np.arange(5)
+        f['old'].attrs['hash'] = array_sha256(np.arange(5))
+
+    for keep_open in [False, True]:
+        reg = serial.base() + arrays_to_hdf5(filename, keep_open=keep_open)
+        path = reg.deep_encode(np.arange(5))['data']['path']
+        assert path == 'old'
+
+        a = np.random.random((20, 30))
+        first = reg.deep_encode(a)['data']['path']
+        assert reg.deep_encode(a.copy())['data']['path'] == first
+        assert reg.deep_encode(a.T)['data']['path'] != first
+        assert np.all(reg.from_json(reg.to_json(a.T), deref=True) == a.T)
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_hdf5_modes(tmpdir, monkeypatch):
+    import h5py
+
+    modes = []
+    h5py_file = h5py.File
+
+    def open_file(name, mode):
+        modes.append(mode)
+        return h5py_file(name, mode)
+
+    monkeypatch.setattr(h5py, 'File', open_file)
+    filename = str(tmpdir.join('modes.hdf5'))
+    a = np.arange(10)
+
+    for keep_open in [False, True]:
+        del modes[:]
+        reg = serial.base() + arrays_to_hdf5(filename, keep_open=keep_open)
+        msg = reg.to_json(a)
+        assert np.all(reg.from_json(msg, deref=True) == a)
+        assert np.all(reg.from_json(msg, deref=True) == a)
+        reg.to_json(a + 1)
+        if keep_open:
+            assert modes == ['a']
+        else:
+            assert modes == ['a', 'r', 'r', 'a']
+
+    # a file that is open for reading is opened again to write
+    other = str(tmpdir.join('other.hdf5'))
+    msg = (serial.base() + arrays_to_hdf5(other)).to_json(a)
+    reg = serial.base() + arrays_to_hdf5(other, keep_open=True)
+    del modes[:]
+    reg.from_json(msg, deref=True)
+    reg.to_json(a + 2)
+    assert modes == ['r', 'a']
@@ -0,0 +1,59 @@
+import json
+
+from noodles import serial
+from noodles.serial import (Registry, Serialiser)
+
+
+class A:
+    def __init__(self, value):
+        self.value = value
+
+
+class B(A):
+    pass
+
+
+class SerA(Serialiser):
+    def __init__(self, tag):
+        super(SerA, self).__init__(A)
+        self.tag = tag
+
+    def encode(self, obj, make_rec):
+        return make_rec({'tag': self.tag, 'value': obj.value})
+
+    def decode(self, cls, data):
+        return cls(data['value'])
+
+
+def test_lookup_cache():
+    reg = serial.base()
+    default = reg[B]
+    assert reg[B] is default
+
+    reg[A] = SerA('first')
+    assert reg[B] is not default
+    assert reg.deep_encode(B(1))['data']['tag'] == 'first'
+
+    other = reg + Registry(types={B: SerA('second')})
+    assert other.deep_encode(B(1))['data']['tag'] == 'second'
+    assert reg.deep_encode(B(1))['data']['tag'] == 'first'
+
+    decoded = other.from_json(other.to_json([B(2), {'x': (B(3),)}]))
+    assert isinstance(decoded[0], B) and decoded[1]['x'][0].value == 3
+
+
+def test_dump_json():
+    reg = serial.base()
+    obj = {'a': [(i, str(i)) for i in range(10)], 1: [], 'b': [[], {}],
+           'c': {'d': None, 'e': [1.5, True, 'x\n"']}}
+
+    chunks = []
+    reg.dump_json(obj, chunks.append, chunk_size=3)
+    assert len(chunks) > 1
+    text = ''.join(chunks)
+    assert json.loads(text) == json.loads(json.dumps(reg.deep_encode(obj)))
+    assert reg.to_json(obj) == text
+
+    decoded = reg.from_json(text)
+    assert decoded['a'] == [(i, str(i)) for i in range(10)]
+    assert decoded['1'] == []
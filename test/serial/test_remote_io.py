@@ -1,12 +1,22 @@
 """
-Testing JSON serialisation writer and reader.
+Testing JSON and MessagePack serialisation writer and reader.
 """
 
 import io
 import math
 
-from noodles.run.remote.io import (JSONObjectReader, JSONObjectWriter)
-from noodles.serial import base as registry
+import pytest
+
+from noodles.run.remote.io import (
+    JSONObjectReader, JSONObjectWriter,
+    MsgPackObjectReader, MsgPackObjectWriter)
+from noodles.serial import base as registry, Registry, Serialiser
+
+try:
+    import msgpack  # noqa
+    has_msgpack = True
+except ImportError:
+    has_msgpack = False
 
 
 objects = ["Hello", 42, [3, 4], (5, 6), {"hello": "world"},
@@ -27,3 +37,50 @@ def test_json():
     new_objects = list(input_stream)
 
     assert new_objects == objects
+
+
+class Broken:
+    pass
+
+
+class SerBroken(Serialiser):
+    def __init__(self):
+        super(SerBroken, self).__init__(Broken)
+
+    def encode(self, obj, make_rec):
+        raise RuntimeError("can't encode")
+
+    def decode(self, cls, data):
+        return Broken()
+
+
+def test_json_error():
+    """An object that fails to encode writes nothing."""
+    reg = registry() + Registry(types={Broken: SerBroken()})
+    f = io.StringIO()
+    output_stream = JSONObjectWriter(reg, f)
+    output_stream.send(objects[:3])
+
+    with pytest.raises(RuntimeError):
+        output_stream.send({"hello": "world", "broken": Broken()})
+
+    f.seek(0)
+    assert list(JSONObjectReader(reg, f)) == [objects[:3]]
+
+
+@pytest.mark.skipif(not has_msgpack, reason="msgpack not installed")
+def test_msgpack():
+    """Test streaming MessagePack objects, with raw binary data."""
+    f = io.BytesIO()
+    output_stream = MsgPackObjectWriter(registry(), f)
+
+    for obj in objects + [b"\x00\xff binary"]:
+        output_stream.send(obj)
+
+    f.seek(0)
+    input_stream = MsgPackObjectReader(registry(), f)
+
+    new_objects = list(input_stream)
+
+    assert new_objects == objects + [b"\x00\xff binary"]
+    assert b"\x00\xff binary" in f.getvalue()
@@ -0,0 +1,59 @@
+import time
+
+from noodles import (run_process, gather, serial)
+from noodles.tutorial import (add, mul)
+from noodles.lib import (coroutine)
+from noodles.run.messages import (BatchMessage, JobMessage)
+from noodles.run.remote.batch import (BatchWriter, unbatch)
+
+
+def collector():
+    received = []
+
+    @coroutine
+    def sink():
+        while True:
+            received.append((yield))
+
+    return received, sink()
+
+
+def test_batch_size():
+    received, sink = collector()
+    writer = BatchWriter(sink, max_size=4, max_linger=10)
+    for i in range(10):
+        writer.send(i)
+
+    assert [len(b) for b in received] == [4, 4]
+    writer.close('end')
+    assert isinstance(received[2], BatchMessage)
+    assert list(received[2]) == [8, 9]
+    assert received[3] == 'end'
+    assert list(unbatch(received)) == list(range(10)) + ['end']
+
+
+def test_batch_linger():
+    received, sink = collector()
+    writer = BatchWriter(sink, max_size=100, max_linger=0.01)
+    writer.send(JobMessage(1, None))
+    writer.send(JobMessage(2, None))
+    assert received == []
+
+    time.sleep(0.1)
+    assert len(received) == 1
+    assert [msg.key for msg in received[0]] == [1, 2]
+
+    writer.send(3)
+    writer.close()
+    assert received[1:] == [3]
+
+
+def registry():
+    return serial.base()
+
+
+def test_run_process_batched():
+    wf = gather(*(mul(add(i, 1), 2) for i in range(100)))
+    result = run_process(wf, n_processes=2, registry=registry,
+                         batch_size=16, batch_linger=0.005)
+    assert result == [2 * (i + 1) for i in range(100)]
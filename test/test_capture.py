@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+
+import pytest
+
+from noodles import (schedule, run_single)
+from noodles.workflow import (
+    capture, capture_policy, share, get_workflow)
+from noodles.workflow.capture import (
+    get_capture_policy, _policies, _policy_cache)
+
+
+@dataclass(frozen=True)
+class Point:
+    x: int
+    y: int
+
+
+@dataclass(frozen=True)
+class Box:
+    items: list
+
+
+def test_immutables_are_shared():
+    for obj in [42, 3.14, 1j, "hello", b"bytes", None, (1, ("a", 2.0)),
+                frozenset([1, 2]), Point(1, 2), len, Point]:
+        assert capture(obj) is obj
+
+
+def test_mutables_are_copied():
+    items = [1, [2, 3]]
+    obj = {'a': items, 'b': (items, 4), 'c': Box(items)}
+    result = capture(obj)
+
+    assert result == obj
+    assert result is not obj
+    assert result['a'] is not items
+    assert result['a'][1] is not items[1]
+    # aliasing is preserved, like `deepcopy` does
+    assert result['b'][0] is result['a']
+    assert result['c'].items is result['a']
+
+
+class Frozen:
+    def __init__(self, value):
+        self.value = value
+
+
+@pytest.fixture
+def frozen_policy():
+    """Restore the policies after the test sets one for `Frozen`."""
+    previous = dict(_policies)
+    yield
+    _policies.clear()
+    _policies.update(previous)
+    _policy_cache.clear()
+
+
+def test_capture_policy(frozen_policy):
+    assert get_capture_policy(Frozen) is not share
+    capture_policy(Frozen, share)
+    obj = Frozen([1, 2, 3])
+    assert capture(obj) is obj
+
+
+@schedule
+def append(lst, x):
+    lst.append(x)
+    return lst
+
+
+def test_call_by_value():
+    lst = [1, 2]
+    p = Point(3, 4)
+    a = append(lst, p)
+    lst.append(5)
+
+    node = get_workflow(a).root_node
+    assert node.bound_args.arguments['x'] is p
+    assert run_single(a) == [1, 2, p]
+    assert lst == [1, 2, 5]
+
+
+def test_hints_are_copied():
+    a = append([], 1)
+    b = append([], 2)
+    assert get_workflow(a).root_node.hints is not \
+        get_workflow(b).root_node.hints
+
+
+try:
+    import numpy as np
+    from noodles.serial.numpy import (capture_array, capture_array_view)
+except ImportError:
+    has_numpy = False
+else:
+    has_numpy = True
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_numpy_arrays():
+    a = np.arange(10)
+    b = capture(a)
+    assert b is not a and (b == a).all()
+
+    a.flags.writeable = False
+    assert capture(a) is a
+    assert capture(a[2:]).base is a
+
+    # a read-only view on a writeable array may still change
+    c = np.arange(10)
+    view = c[:5]
+    view.flags.writeable = False
+    assert capture(view).base is None
+
+    try:
+        capture_policy(np.ndarray, capture_array_view)
+        d = capture(c)
+        assert d.base is c
+        assert not d.flags.writeable
+    finally:
+        capture_policy(np.ndarray, capture_array)
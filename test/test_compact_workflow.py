@@ -0,0 +1,87 @@
+from noodles import (gather, gather_dict, run_parallel, run_process, serial)
+from noodles.tutorial import (add, sub, mul)
+from noodles.workflow import (
+    get_workflow, is_workflow, is_node_ready, CompactWorkflow, Workflow,
+    Empty)
+from noodles.run.scheduler import Scheduler
+from noodles.run.worker import worker
+from noodles.lib import Queue
+
+import pytest
+
+
+def make_workflow():
+    a = add(1, 2)
+    b = sub(a, 3)
+    c = gather(a, b, mul(a, b))
+    return gather_dict(x=c, y=add(b, 7), z=5)
+
+
+result = {'x': [3, 0, 0], 'y': 7, 'z': 5}
+
+
+def test_compact_structure():
+    wf = get_workflow(make_workflow())
+    cwf = CompactWorkflow.from_workflow(wf)
+
+    assert is_workflow(cwf)
+    assert len(cwf.nodes) == len(wf.nodes)
+    assert list(cwf.nodes) == list(range(len(wf.nodes)))
+    assert len(cwf.functions) == 5
+    assert sum(len(cwf.links[i]) for i in cwf.links) == \
+        sum(len(wf.links[i]) for i in wf.links)
+
+    for i in cwf.nodes:
+        for j, address in cwf.links[i]:
+            assert i in cwf.inverse_links[j]
+            assert cwf.nodes[j].values[
+                cwf.nodes[j].layout.position[address]] is Empty
+
+    assert [is_node_ready(n) for n in cwf.nodes.values()].count(True) == 1
+
+
+def test_compact_copy():
+    cwf = CompactWorkflow.from_workflow(get_workflow(make_workflow()))
+    new_cwf = CompactWorkflow.from_workflow(cwf)
+
+    assert new_cwf is not cwf
+    assert new_cwf.links is cwf.links
+    assert Scheduler().run(Queue() >> worker, new_cwf) == result
+    assert all(n.result is Empty for n in cwf.nodes.values())
+    assert [is_node_ready(n) for n in cwf.nodes.values()].count(True) == 1
+    assert Scheduler().run(Queue() >> worker, cwf) == result
+
+
+def test_compact_round_trip():
+    wf = get_workflow(make_workflow())
+    new_wf = CompactWorkflow.from_workflow(wf).to_workflow()
+
+    assert type(new_wf) is Workflow
+    assert len(new_wf.nodes) == len(wf.nodes)
+    assert Scheduler().run(Queue() >> worker, new_wf) == result
+
+
+@pytest.mark.parametrize('count_pending', [True, False])
+def test_compact_scheduler(count_pending):
+    cwf = CompactWorkflow.from_workflow(get_workflow(make_workflow()))
+    assert Scheduler(count_pending=count_pending).run(
+        Queue() >> worker, cwf) == result
+
+
+def test_compact_serialisation():
+    registry = serial.base()
+    cwf = CompactWorkflow.from_workflow(get_workflow(make_workflow()))
+    new_cwf = registry.from_json(registry.to_json(cwf), deref=True)
+
+    assert isinstance(new_cwf, CompactWorkflow)
+    assert new_cwf.root == cwf.root
+    assert run_parallel(new_cwf, n_threads=2) == result
+
+
+def registry():
+    return serial.base()
+
+
+def test_compact_process():
+    cwf = CompactWorkflow.from_workflow(get_workflow(make_workflow()))
+    assert run_process(cwf, n_processes=1, registry=registry) == result
@@ -1,4 +1,6 @@
-from noodles.prov.workflow import (set_global_provenance)
+from noodles.prov.workflow import (
+    set_global_provenance, node_prov_key)
+from noodles.workflow import (insert_result)
 from noodles.tutorial import (add, sub, mul)
 from noodles.serial import base
 
@@ -24,3 +26,32 @@ def test_global_prov():
     assert c._workflow.prov == d._workflow.prov
     assert b._workflow.prov != e._workflow.prov
     assert f._workflow.prov != e._workflow.prov
+
+
+def test_prov_cache_on_node():
+    registry = base()
+    a = add(1, 2)
+    b = sub(a, 3)
+    set_global_provenance(b._workflow, registry)
+
+    wf = b._workflow
+    node_a = a._workflow.root_node
+    node_b = wf.root_node
+    assert node_a.local_prov == (registry, 'md5', node_a.prov)
+    # nodes that are not ready keep no encoding of their arguments
+    assert node_b.local_prov is None
+
+    # the key is cached per registry
+    other = base()
+    assert node_prov_key(node_a, other) == node_a.prov
+    assert node_a.local_prov[0] is other
+
+    address = next(iter(wf.links[a._workflow.root]))[1]
+    insert_result(node_b, address, 3)
+    node_prov_key(node_b, registry)
+    assert node_b.local_prov is not None
+    insert_result(node_b, address, 3)
+    assert node_b.local_prov is None
+    key = node_prov_key(node_b, registry)
+    assert key == node_prov_key(sub(3, 3)._workflow.root_node, registry)
+    assert key != node_b.prov
@@ -133,3 +133,34 @@ def test_tuple_unpack():
     result = run_single(b)
     assert result.x == -1
     assert result.y == 1
+
+
+def test_merge_shared_nodes():
+    A = value(1)
+    B = add(A, A)
+    C = add(B, sub(A, B))
+
+    C = get_workflow(C)
+    A = get_workflow(A)
+    B = get_workflow(B)
+
+    assert len(C.nodes) == 4
+    assert set(C.links) == set(C.nodes)
+    assert len(C.links[A.root]) == 3
+    assert len(C.links[B.root]) == 2
+    assert C.links[C.root] == set()
+
+    # resolving a workflow doesn't touch the workflows it was built from
+    assert len(B.nodes) == 2
+    assert len(C.nodes) == 4
+    assert run_single(C) == 1
+
+
+def test_deep_chain():
+    n = 10000
+    x = value(0)
+    for _ in range(n):
+        x = add(x, 1)
+
+    assert len(get_workflow(x).nodes) == n + 1
+    assert run_single(x) == n
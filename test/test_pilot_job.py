@@ -0,0 +1,58 @@
+import os
+import threading
+import time
+
+from noodles import (schedule, gather, run_process, serial)
+
+
+@schedule
+def where(delay):
+    time.sleep(delay)
+    print("this goes to stderr")
+    return os.getpid(), threading.get_ident()
+
+
+def registry():
+    return serial.base()
+
+
+def test_threads():
+    wf = gather(*(where(0.1) for _ in range(8)))
+    result = run_process(wf, n_processes=1, registry=registry, n_threads=4)
+    assert len(result) == 8
+    assert len({pid for pid, _ in result}) == 1
+    assert len({tid for _, tid in result}) == 4
+
+
+def test_subprocesses():
+    wf = gather(*(where(0.1) for _ in range(8)))
+    result = run_process(wf, n_processes=1, registry=registry, n_threads=2,
+                         subprocesses=True, batch_size=4)
+    assert len(result) == 8
+    assert len({pid for pid, _ in result}) == 2
+
+
+@schedule
+def big(i):
+    return bytes([i]) * (1 << 22)
+
+
+@schedule
+def grow(data):
+    time.sleep(0.5)
+    return data + data[:1]
+
+
+def test_subprocesses_large_payloads():
+    # jobs and results larger than the pipe buffers of the pool in the
+    # pilot job, with two jobs in flight per pool process
+    wf = gather(*(grow(big(i)) for i in range(8)))
+    result = []
+    t = threading.Thread(target=lambda: result.append(run_process(
+        wf, n_processes=1, registry=registry, n_threads=2,
+        subprocesses=True)), daemon=True)
+    t.start()
+    t.join(120)
+    assert not t.is_alive(), "deadlock"
+    assert [len(x) for x in result[0]] == [(1 << 22) + 1] * 8
+    assert [x[0] for x in result[0]] == list(range(8))
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+from noodles import (schedule, gather)
+from noodles.run.pool import (run_pool)
+
+
+@schedule
+def get_pid(delay):
+    time.sleep(delay)
+    return os.getpid()
+
+
+@schedule
+def crash():
+    os._exit(1)
+
+
+def test_recycling():
+    wf = gather(*(get_pid(0.01) for _ in range(12)))
+    result = run_pool(wf, n_processes=2, max_jobs_per_worker=3)
+    assert len(result) == 12
+    assert max(Counter(result).values()) <= 3
+    assert len(set(result)) >= 4
+
+
+def test_least_loaded():
+    wf = gather(get_pid(0.5), *(get_pid(0.01) for _ in range(10)))
+    slow, *quick = run_pool(wf, n_processes=2, max_in_flight=1)
+    assert slow not in quick
+
+
+def test_crash():
+    with pytest.raises(RuntimeError):
+        run_pool(crash(), n_processes=2)
+
+
+@schedule
+def big(i):
+    return bytes([i]) * (1 << 22)
+
+
+@schedule
+def grow(data):
+    return data + data[:1]
+
+
+def run_in_thread(f, timeout):
+    """Run `f` in a thread, failing if it doesn't finish in time."""
+    result = []
+    t = threading.Thread(target=lambda: result.append(f()), daemon=True)
+    t.start()
+    t.join(timeout)
+    assert not t.is_alive(), "deadlock"
+    return result[0]
+
+
+def test_large_payloads():
+    # jobs and results larger than the pipe buffer, two in flight per worker
+    wf = gather(*(grow(big(i)) for i in range(6)))
+    result = run_in_thread(lambda: run_pool(wf, n_processes=1), 60)
+    assert [len(x) for x in result] == [(1 << 22) + 1] * 6
+    assert [x[0] for x in result] == list(range(6))
@@ -0,0 +1,149 @@
+import time
+
+from noodles import (gather, schedule, schedule_hint, run_process, serial)
+from noodles.lib import (PriorityQueue, EndOfQueue, thread_pool)
+from noodles.run.hybrid import run_hybrid
+from noodles.run.messages import JobMessage
+from noodles.run.priority import (CriticalPath, ReadyQueue, path_lengths)
+from noodles.run.selectors import LeastLoadedSelector
+from noodles.run.threading.vanilla import run_parallel
+from noodles.run.worker import worker
+from noodles.workflow import (get_workflow, NodeData)
+
+
+log = []
+
+
+def job(key):
+    return JobMessage(key, NodeData(None, [], None))
+
+
+@schedule
+def step(x):
+    log.append(x)
+    return x + 1
+
+
+@schedule
+def total(xs):
+    return sum(xs)
+
+
+def unbalanced(n_short, n_long):
+    """A chain of `n_long` steps next to `n_short` independent ones; the
+    chain is added last."""
+    short = [step(i) for i in range(n_short)]
+    x = 1000
+    for _ in range(n_long):
+        x = step(x)
+    return total(gather(*short, x))
+
+
+def test_path_lengths():
+    wf = get_workflow(unbalanced(2, 3))
+    lengths = path_lengths(wf, lambda node: 1)
+    by_name = sorted((node.foo.__name__, lengths[n])
+                     for n, node in wf.nodes.items())
+    # total and gather, two short steps, three steps in the chain
+    assert by_name == [
+        ('gather', 2), ('step', 3), ('step', 3), ('step', 3), ('step', 4),
+        ('step', 5), ('total', 1)]
+
+
+def test_ready_queue():
+    items = {x: (x, None) for x in ['a', 'bb', 'c', 'dd', 'e', 'f']}
+    q = ReadyQueue(len)
+    q.extend(items[x] for x in ['a', 'bb', 'c', 'dd'])
+    assert [x for x, _ in q] == ['bb', 'dd', 'a', 'c']
+    assert q.popleft() == ('bb', None)
+    q.extendleft(reversed([items['e'], items['f']]))
+    assert [x for x, _ in q] == ['dd', 'e', 'f', 'a', 'c']
+    q.remove(items['a'])
+    assert [x for x, _ in reversed(q)] == ['c', 'f', 'e', 'dd']
+    assert len(q) == 4
+
+
+def test_priority_queue():
+    taken = []
+    q = PriorityQueue(len, on_get=taken.append)
+    sink = q.sink()
+    for x in ['a', 'ccc', 'bb', 'dd']:
+        sink.send(x)
+    q.close()
+    assert list(q.source()) == ['ccc', 'bb', 'dd', 'a']
+    assert taken == ['ccc', 'bb', 'dd', 'a']
+    assert q._queue.heap[0][2] is EndOfQueue
+
+
+def test_critical_path_first():
+    log.clear()
+    wf = unbalanced(20, 5)
+    assert run_parallel(wf, n_threads=1, priority=CriticalPath()) == \
+        sum(range(1, 21)) + 1005
+    # the chain starts before the short steps
+    assert log[0] == 1000
+
+    log.clear()
+    run_parallel(unbalanced(20, 5), n_threads=1)
+    assert log[0] == 0
+
+
+def test_learned_durations():
+    priority = CriticalPath()
+    run_parallel(unbalanced(4, 2), n_threads=2, priority=priority)
+    assert priority.version > 0
+    assert priority.stats.mean('step') is not None
+    assert not priority.priorities and not priority.workflows
+
+
+@schedule_hint(priority=100)
+def urgent(x):
+    log.append('urgent')
+    return x
+
+
+def test_priority_hint():
+    log.clear()
+    wf = total(gather(*[step(i) for i in range(5)], urgent(0)))
+    run_parallel(wf, n_threads=1, priority=CriticalPath())
+    assert log[0] == 'urgent'
+
+
+def test_selector_priority():
+    s = LeastLoadedSelector(max_in_flight=1, priority=lambda msg: msg.key)
+    s.setup(['a'])
+    sends = [m.key for i in [1, 2, 5, 3] for _, m in s.submit(job(i))]
+    assert sends == [1]
+    assert [m.key for _, m in s.complete(1)] == [5]
+    assert [m.key for _, m in s.complete(5)] == [3]
+
+
+def test_hybrid_selector():
+    priority = CriticalPath()
+    selector = LeastLoadedSelector(max_in_flight=1, priority=priority)
+    workers = {k: PriorityQueue(priority) >> thread_pool(worker)
+               for k in 'ab'}
+    assert run_hybrid(unbalanced(10, 5), selector, workers,
+                      priority=priority) == sum(range(1, 11)) + 1005
+    assert priority.stats.mean('step') is not None
+
+
+@schedule
+def sleep_step(x, dt):
+    time.sleep(dt)
+    return x + 1
+
+
+def registry():
+    return serial.base()
+
+
+def test_run_process():
+    short = [sleep_step(i, 0.05) for i in range(6)]
+    x = 0
+    for _ in range(4):
+        x = sleep_step(x, 0.05)
+    wf = total(gather(*short, x))
+    result = run_process(wf, n_processes=2, registry=registry,
+                         priority=CriticalPath())
+    assert result == sum(range(1, 7)) + 4
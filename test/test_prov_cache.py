@@ -0,0 +1,39 @@
+from noodles.prov.cache import (BloomFilter, ProvCache)
+from noodles.prov.sqlite import (JobEntry)
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(size=1 << 12)
+    keys = ['%032x' % (i * 7919) for i in range(1000)]
+    for k in keys:
+        bloom.add(k)
+
+    assert all(k in bloom for k in keys)
+    false_positives = sum('other-%d' % i in bloom for i in range(1000))
+    assert false_positives < 50
+
+
+def entry(i, result):
+    return JobEntry(i, 1, 'f', 2, 'p%d' % i, None, None, None, result, None)
+
+
+def test_lru_bounds():
+    cache = ProvCache(max_entries=3, max_bytes=100, refresh_interval=None)
+    for i in range(5):
+        cache.put('p%d' % i, entry(i, 'x'))
+
+    assert cache.get('p0') is None
+    assert cache.get('p4').id == 4
+    assert cache.stats()['entries'] == 3
+    assert cache.stats()['evictions'] == 2
+    assert cache.may_contain('p0')
+
+    cache.put('big', entry(5, 'x' * 90))
+    assert cache.stats()['bytes'] <= 100
+    assert cache.get('big') is not None
+    assert cache.get('p3') is None
+
+    cache.put('huge', entry(6, 'x' * 200))
+    assert cache.get('huge') is None
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 3
@@ -0,0 +1,56 @@
+import hashlib
+
+import pytest
+
+from noodles import serial
+from noodles.prov.key import (
+    update_object_hash, prov_key, get_hash_function, json)
+from noodles.prov.workflow import (set_global_provenance)
+from noodles.tutorial import (add)
+
+try:
+    import numpy as np
+except ImportError:
+    has_numpy = False
+else:
+    has_numpy = True
+
+
+def test_update_object_hash():
+    obj = {'b': [1, 2.5, None, 'x/y'] * 10,
+           'a': {'z': [{'q': True, 'p': []}] * 7, 'y': {}},
+           'c': list(range(100))}
+    expected = hashlib.md5(json.dumps(obj, sort_keys=True).encode())
+    m = update_object_hash(hashlib.md5(), obj, chunk_size=3)
+    assert m.hexdigest() == expected.hexdigest()
+
+
+def test_hash_functions():
+    msg = serial.base().hash_encode(add(1, 2)._workflow.root_node)
+    md5 = prov_key(msg)
+    blake = prov_key(msg, hash_function='blake2b')
+    assert len(md5) == len(blake) == 32
+    assert md5 != blake
+    assert blake == prov_key(msg, hash_function='blake2b')
+
+    with pytest.raises(ValueError):
+        get_hash_function('crc')
+
+
+@pytest.mark.skipif(not has_numpy, reason="No NumPy installed.")
+def test_array_content_hash():
+    registry = serial.base() + serial.numpy()
+    a = np.arange(100000.)
+
+    msg = registry.hash_encode(add(a, 1)._workflow.root_node)
+    assert 'content_hash' in json.dumps(msg)
+    assert len(json.dumps(msg)) < 2000
+
+    def key(x):
+        wf = add(x, 1)._workflow
+        set_global_provenance(wf, registry, hash_function='blake2b')
+        return wf.prov
+
+    assert key(a) == key(a.copy())
+    assert key(a) != key(a + 1)
+    assert key(a) != key(a.astype('float32'))
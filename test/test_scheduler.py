@@ -0,0 +1,132 @@
+import weakref
+
+from noodles import (gather, schedule)
+from noodles.tutorial import (add, mul, sub)
+from noodles.workflow import (get_workflow, n_empty_arguments, Empty)
+from noodles.run.job_keeper import JobKeeper
+from noodles.run.priority import CriticalPath
+from noodles.run.scheduler import Scheduler
+from noodles.run.threading.vanilla import run_parallel
+from noodles.run.worker import worker
+from noodles.lib import (Queue, thread_pool)
+
+import pytest
+
+
+def run(wf, count_pending):
+    return Scheduler(count_pending=count_pending).run(
+        Queue() >> worker, get_workflow(wf))
+
+
+def test_n_empty_arguments():
+    a = add(1, 2)
+    b = gather(a, 3, a, add(a, 4))
+
+    assert n_empty_arguments(get_workflow(a).root_node) == 0
+    assert n_empty_arguments(get_workflow(b).root_node) == 3
+
+
+@pytest.mark.parametrize('count_pending', [True, False])
+def test_wide_gather(count_pending):
+    xs = [add(i, i) for i in range(100)]
+    assert run(gather(*xs), count_pending) == list(range(0, 200, 2))
+
+
+@pytest.mark.parametrize('count_pending', [True, False])
+def test_shared_arguments(count_pending):
+    a = add(1, 1)
+    b = mul(a, a)
+    c = sub(b, a)
+    assert run(c, count_pending) == 2
+
+
+def test_pending_cleared():
+    scheduler = Scheduler()
+    xs = [add(i, 1) for i in range(10)]
+    scheduler.run(Queue() >> worker, get_workflow(gather(*xs)))
+    assert scheduler.pending == {}
+
+
+class Big:
+    alive = weakref.WeakSet()
+    max_alive = 0
+
+    def __init__(self, n):
+        self.n = n
+        Big.alive.add(self)
+        Big.max_alive = max(Big.max_alive, len(Big.alive))
+
+
+@schedule
+def make_big(n):
+    return Big(n)
+
+
+@schedule
+def grow(big):
+    return Big(big.n + 1)
+
+
+@schedule
+def size(big):
+    return big.n
+
+
+@pytest.mark.parametrize('release_results', [True, False])
+def test_release_results(release_results):
+    Big.max_alive = 0
+    xs = [size(grow(make_big(i))) for i in range(10)]
+    wf = get_workflow(gather(*xs))
+    scheduler = Scheduler(release_results=release_results)
+    assert scheduler.run(Queue() >> worker, wf) == list(range(1, 11))
+
+    # all `make_big` jobs run first; with `release_results` each is freed
+    # once `grow` is done with it
+    if release_results:
+        assert Big.max_alive <= 11
+        assert not Big.alive
+        assert all(node.result is Empty for i, node in wf.nodes.items()
+                   if i != wf.root)
+        assert scheduler.filled == {}
+    else:
+        assert Big.max_alive == 20
+        assert len(Big.alive) == 20
+
+
+class CountingKeeper(JobKeeper):
+    def __init__(self):
+        super(CountingKeeper, self).__init__()
+        self.max_in_flight = 0
+
+    def register(self, job):
+        self.max_in_flight = max(self.max_in_flight, len(self) + 1)
+        return super(CountingKeeper, self).register(job)
+
+
+@pytest.mark.parametrize('priority', [None, CriticalPath()])
+def test_window(priority):
+    keeper = CountingKeeper()
+    xs = [add(i, 1) for i in range(100)]
+    wf = get_workflow(gather(*xs))
+    scheduler = Scheduler(job_keeper=keeper, window=5, priority=priority)
+    threaded_worker = Queue(maxsize=5) >> thread_pool(
+        *[worker] * 4, maxsize=5)
+    assert scheduler.run(threaded_worker, wf) == list(range(1, 101))
+    assert keeper.max_in_flight <= 5
+    assert scheduler.in_flight == 0 and not scheduler.held
+
+
+def test_window_error():
+    xs = [add(i, 1) for i in range(10)]
+    wf = get_workflow(gather(*xs, sub(1, 'a'), *xs))
+    scheduler = Scheduler(window=2)
+    with pytest.raises(TypeError):
+        scheduler.run(Queue() >> worker, wf)
+
+
+@pytest.mark.parametrize('window', [0, -1])
+def test_window_invalid(window):
+    with pytest.raises(ValueError):
+        Scheduler(window=window)
+    with pytest.raises(ValueError):
+        run_parallel(gather(add(1, 1)), n_threads=2, window=window)
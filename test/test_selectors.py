@@ -0,0 +1,245 @@
+import threading
+import time
+
+import pytest
+
+from noodles import schedule, schedule_hint, gather
+from noodles.lib import Queue, Connection, thread_pool, push
+from noodles.run.hybrid import run_hybrid
+from noodles.run.messages import JobMessage
+from noodles.run.selectors import (
+    Selector, LeastLoadedSelector, RoundRobinSelector, WorkStealingSelector,
+    get_selector)
+from noodles.run.threading.vanilla import run_parallel
+from noodles.run.worker import worker
+from noodles.workflow import NodeData
+
+
+def job(key, **hints):
+    return JobMessage(key, NodeData(None, [], hints or None))
+
+
+def test_round_robin():
+    s = RoundRobinSelector()
+    s.setup(['a', 'b', 'c'])
+    sends = [w for i in range(5) for w, _ in s.submit(job(i))]
+    assert sends == ['a', 'b', 'c', 'a', 'b']
+
+
+def test_least_loaded():
+    s = LeastLoadedSelector(max_in_flight=2)
+    s.setup(['a', 'b'])
+    sends = [w for i in range(5) for w, _ in s.submit(job(i))]
+    assert sends == ['a', 'b', 'a', 'b']
+    assert len(s.pending) == 1
+
+    # job 1 finished on 'b', which gets the waiting job
+    assert [(w, m.key) for w, m in s.complete(1)] == [('b', 4)]
+    assert s.complete(1) == []
+    s.flush()
+    assert not s.pending and not s.idle()
+
+
+def test_resources():
+    s = LeastLoadedSelector(resources={
+        'a': {'n_cores': 4}, 'b': {'n_cores': 2}})
+    s.setup(['a', 'b'])
+
+    assert [w for w, _ in s.submit(job(0, n_cores=4))] == ['a']
+    # job 1 only fits 'a', which is full; job 2 passes it
+    assert s.submit(job(1, n_cores=3)) == []
+    assert [w for w, _ in s.submit(job(2))] == ['b']
+    assert [(w, m.key) for w, m in s.complete(0)] == [('a', 1)]
+
+    with pytest.raises(ValueError):
+        s.submit(job(3, n_cores=8))
+
+
+def test_abstract():
+    with pytest.raises(TypeError):
+        Selector()
+
+
+def test_full():
+    s = LeastLoadedSelector(resources={'n_cores': 2})
+    s.setup(['a', 'b'])
+    assert len(s.submit(job(0, n_cores=2))) == 1
+    assert len(s.submit(job(1, n_cores=1))) == 1
+    assert s.has_room()
+    assert len(s.submit(job(2, n_cores=1))) == 1
+    assert not s.has_room()
+
+    # with all workers full, waiting jobs are not looked at
+    checked = []
+    s.admissible = lambda node: checked.append(node) or True
+    for i in range(3, 100):
+        assert s.submit(job(i)) == []
+    assert checked == []
+    assert [m.key for _, m in s.complete(1)] == [3]
+
+
+def test_work_stealing():
+    s = WorkStealingSelector()
+    s.setup(['a', 'b'])
+    sends = [w for i in range(6) for w, _ in s.submit(job(i))]
+    assert sends == ['a', 'b']
+
+    # 'a' runs through its own queue (jobs 2 and 4), then steals job 5
+    assert [m.key for _, m in s.complete(0)] == [2]
+    assert [m.key for _, m in s.complete(2)] == [4]
+    assert [m.key for _, m in s.complete(4)] == [5]
+    assert s.steals == 1
+    assert [m.key for _, m in s.complete(1)] == [3]
+
+
+@schedule_hint(n_cores=2)
+def delayed(a, dt):
+    time.sleep(dt)
+    return a
+
+
+@schedule
+def total(a):
+    return sum(a)
+
+
+def threaded_worker(n_threads):
+    return Queue() >> thread_pool(*[worker] * n_threads)
+
+
+@pytest.mark.parametrize('selector', [
+    'round-robin', 'least-loaded', 'work-stealing', 'random'])
+def test_run_hybrid(selector):
+    wf = total(gather(*[delayed(1, 0.02) for _ in range(8)]))
+    workers = {k: threaded_worker(4) for k in 'ab'}
+
+    # the resources let each worker run two of four threads
+    s = get_selector(selector, resources={'n_cores': 4})
+    start = time.time()
+    assert run_hybrid(wf, s, workers) == 8
+    assert time.time() - start > 0.039
+
+
+def test_run_hybrid_error():
+    wf = total(gather(delayed(1, 0.01), delayed(2, 0.01)))
+    s = get_selector('least-loaded', resources={'n_cores': 1})
+    with pytest.raises(ValueError):
+        run_hybrid(wf, s, {'a': threaded_worker(1)})
+
+
+def stopped_worker():
+    @push
+    def sink():
+        yield
+
+    return Connection(lambda: iter([]), sink)
+
+
+def test_run_hybrid_stopped_worker():
+    s = get_selector('least-loaded')
+    with pytest.raises(RuntimeError):
+        run_hybrid(total(gather(delayed(1, 0.01))), s,
+                   {'a': stopped_worker()})
+
+
+def test_max_concurrent():
+    def limited(key):
+        return JobMessage(key, NodeData(total, [], {'max_concurrent': 1}))
+
+    s = LeastLoadedSelector()
+    s.setup(['a', 'b'])
+    assert [m.key for _, m in s.submit(limited(0))] == [0]
+    # job 1 waits for job 0; other jobs pass it
+    assert s.submit(limited(1)) == []
+    assert [m.key for _, m in s.submit(job(2))] == [2]
+    assert s.running == {total: 1}
+    assert [m.key for _, m in s.complete(0)] == [1]
+    assert [m.key for _, m in s.complete(1)] == []
+    assert s.running == {total: 0}
+
+
+def test_blocked_buckets():
+    def limited(key):
+        return JobMessage(key, NodeData(total, [], {'max_concurrent': 1}))
+
+    s = LeastLoadedSelector(resources={'n_cores': 4})
+    s.setup(['a'])
+    assert len(s.submit(limited(0))) == 1
+    assert len(s.submit(job(1, n_cores=3))) == 1
+    for i in range(2, 1000):
+        assert s.submit(limited(i) if i % 2 else job(i, n_cores=2)) == []
+    assert len(s.pending.buckets) == 2
+
+    # only the first job of each bucket is looked at
+    checked = []
+    admissible = s.admissible
+    s.admissible = lambda node: checked.append(node) or admissible(node)
+    assert [m.key for _, m in s.complete(1)] == [2]
+    assert len(checked) == 3
+    # job 0 frees a slot of `total`; job 3 came before job 4
+    assert [m.key for _, m in s.complete(0)] == [3]
+    assert len(checked) == 6
+    assert len(s.pending) == 996
+
+
+running = []
+max_running = {}
+lock = threading.Lock()
+
+
+@schedule_hint(max_concurrent=2, memory=4)
+def solve(x):
+    with lock:
+        running.append('solve')
+        max_running['solve'] = max(max_running.get('solve', 0),
+                                   running.count('solve'))
+    time.sleep(0.01)
+    with lock:
+        running.remove('solve')
+    return x
+
+
+@schedule_hint(memory=6)
+def big(x):
+    with lock:
+        running.append('big')
+        max_running['big'] = max(max_running.get('big', 0),
+                                 running.count('big'))
+        max_running['memory'] = max(
+            max_running.get('memory', 0),
+            4 * running.count('solve') + 6 * running.count('big'))
+    time.sleep(0.01)
+    with lock:
+        running.remove('big')
+    return x
+
+
+def test_run_parallel_resources():
+    max_running.clear()
+    wf = total(gather(*[solve(1) for _ in range(8)],
+                      *[big(1) for _ in range(4)]))
+    assert run_parallel(wf, n_threads=8, resources={'memory': 14}) == 12
+    assert max_running['solve'] <= 2
+    assert max_running['memory'] <= 14
+    assert max_running['solve'] == 2
+
+
+@schedule
+def fail(x):
+    raise ValueError(x)
+
+
+@pytest.mark.parametrize('resources', [None, {}])
+def test_run_parallel_error_threads(resources):
+    n_threads = threading.active_count()
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            run_parallel(total(gather(fail(1), delayed(1, 0.01))),
+                         n_threads=4, resources=resources)
+
+    # the threads of the pool, dispatcher and readers have stopped
+    for _ in range(100):
+        if threading.active_count() <= n_threads:
+            break
+        time.sleep(0.01)
+    assert threading.active_count() <= n_threads
@@ -0,0 +1,150 @@
+import gc
+import os
+import subprocess
+import sys
+
+import pytest
+
+import noodles
+from noodles import (schedule, run_process, gather, serial)
+
+try:
+    import numpy as np
+    from noodles.serial.numpy import (
+        arrays_to_shared_memory, shared_arrays, SharedArrays)
+    from noodles.run.threading.sqlite3 import (run_parallel)
+except ImportError:
+    has_numpy = False
+else:
+    has_numpy = True
+
+
+def registry():
+    return serial.base() + arrays_to_shared_memory()
+
+
+@schedule
+def make_range(n):
+    return np.arange(n, dtype=float)
+
+
+@schedule
+def total(a):
+    return a.sum()
+
+
+@schedule
+def identity(a):
+    return a
+
+
+@schedule
+def scale(a, x):
+    return a * x
+
+
+def files_in_use():
+    return set(shared_arrays.refs)
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_round_trip():
+    reg = registry()
+    # only arrays that can not change are stored once
+    a = np.arange(100)
+    a.flags.writeable = False
+    a = a.reshape(10, 10)
+    obj = {'a': a, 'b': [a[::2], np.array([], dtype=float)]}
+    msg = reg.to_json(obj)
+    path = reg.deep_encode(a)['data']['path']
+    assert os.path.exists(path)
+
+    b = reg.from_json(msg, deref=True)
+    assert np.all(b['a'] == a)
+    assert np.all(b['b'][0] == a[::2])
+    assert b['b'][1].size == 0
+    assert not b['a'].flags.writeable
+
+    # the decoded array is sent on without copying
+    assert reg.deep_encode(b['a'])['data']['path'] == path
+
+    del a, b, obj
+    gc.collect()
+    assert not os.path.exists(path)
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_run_process_shared_memory():
+    wf = gather(total(identity(make_range(1000))),
+                scale(make_range(10), 2.0))
+    result = run_process(wf, n_processes=2, registry=registry)
+    assert result[0] == 999 * 1000 / 2
+    assert np.all(result[1] == np.arange(10) * 2.0)
+
+    del result, wf
+    gc.collect()
+    assert files_in_use() == set()
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_sqlite_shared_memory():
+    wf = gather(total(make_range(1000)), scale(make_range(10), 2.0))
+    result = run_parallel(
+        wf, n_threads=2, registry=registry, db_file=':memory:',
+        always_cache=False)
+    assert result[0] == 999 * 1000 / 2
+    assert np.all(result[1] == np.arange(10) * 2.0)
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_dropped_message(tmpdir):
+    # a worker process encodes an array for this process, which never
+    # decodes the message
+    script = (
+        "import numpy\n"
+        "from noodles import serial\n"
+        "from noodles.serial.numpy import arrays_to_shared_memory\n"
+        "reg = serial.base() + arrays_to_shared_memory({!r})\n"
+        "print(reg.to_json(numpy.arange(10)))\n").format(str(tmpdir))
+    env = dict(os.environ, NOODLES_SCHEDULER_PID=str(os.getpid()),
+               PYTHONPATH=os.path.dirname(os.path.dirname(noodles.__file__)))
+    subprocess.run([sys.executable, '-c', script], env=env, check=True,
+                   stdout=subprocess.DEVNULL)
+    assert len(tmpdir.listdir()) == 1
+
+    # the owner removes the file when it exits
+    owner = SharedArrays()
+    owner.add_directory(str(tmpdir))
+    owner.cleanup()
+    assert tmpdir.listdir() == []
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_writeable_arrays():
+    reg = registry()
+    a = np.zeros(4)
+    first = reg.to_json(a)
+    a[:] = 7
+    second = reg.to_json(a)
+
+    # an array that can change is stored again
+    assert second != first
+    assert np.all(reg.from_json(first, deref=True) == 0)
+    assert np.all(reg.from_json(second, deref=True) == 7)
+
+    # a read-only array is sent on as is
+    a.flags.writeable = False
+    assert reg.to_json(a) == reg.to_json(a)
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_release_after_cleanup(tmpdir):
+    owner = SharedArrays()
+    path = str(tmpdir.join('a.npy'))
+    a = np.zeros(4)
+    owner.track(a, path, os.getpid())
+    owner.cleanup()
+
+    # the finalizer finds the file gone
+    owner._release(id(a), path, True)
+    assert owner.refs == {}
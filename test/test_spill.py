@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from noodles import (gather, schedule, run_single)
+from noodles.lib import Queue
+from noodles.run.scheduler import Scheduler
+from noodles.run.spill import (ResultStore, Spilled, result_size)
+from noodles.run.threading.vanilla import run_parallel
+from noodles.run.worker import worker
+from noodles.workflow import get_workflow
+
+try:
+    import numpy as np
+except ImportError:
+    has_numpy = False
+else:
+    has_numpy = True
+
+
+@schedule
+def make_block(i, n):
+    return [i] * n
+
+
+@schedule
+def block_sum(block, offset=0):
+    assert not isinstance(block, Spilled)
+    return sum(block) + offset
+
+
+def waiting_blocks(n):
+    """The blocks are made first, but wait for a chain of `n` jobs."""
+    chain = [0]
+    for i in range(n - 1):
+        chain.append(block_sum([i + 1], chain[-1]))
+    return gather(*(block_sum(make_block(i, 1000), c)
+                    for i, c in enumerate(chain)))
+
+
+def expected(n):
+    return [i * 1000 + i * (i + 1) // 2 for i in range(n)]
+
+
+def test_result_size():
+    assert result_size([1] * 100) > result_size([1])
+    assert result_size({'a': [1] * 100}) > result_size([1] * 100)
+
+
+def test_spill_scheduler():
+    with ResultStore(memory_budget=20000) as store:
+        result = Scheduler(result_store=store).run(
+            Queue() >> worker, get_workflow(waiting_blocks(20)))
+        assert result == expected(20)
+        assert store.n_spilled > 0
+        assert store.n_loaded == store.n_spilled
+        assert store.memory == 0 and not store.entries
+        assert os.listdir(store.directory) == []
+        directory = store.directory
+
+    assert not os.path.exists(directory)
+
+
+def test_shared_result():
+    a = make_block(1, 1000)
+    wf = gather(block_sum(a), block_sum(a), make_block(2, 1000))
+    assert run_single(wf, memory_budget=1) == [1000, 1000, [2] * 1000]
+
+
+def test_run_parallel():
+    result = run_parallel(waiting_blocks(20), n_threads=4,
+                          memory_budget=20000)
+    assert result == expected(20)
+
+
+@schedule
+def make_array(i, n):
+    return np.full(n, i, dtype=float)
+
+
+@schedule
+def array_sum(a, offset=0):
+    return float(a.sum()) + offset
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_spill_arrays():
+    chain = [0]
+    for i in range(9):
+        chain.append(block_sum([1], chain[-1]))
+    xs = [array_sum(make_array(i, 1000), c) for i, c in enumerate(chain)]
+    with ResultStore(memory_budget=16000) as store:
+        result = Scheduler(result_store=store).run(
+            Queue() >> worker, get_workflow(gather(*xs)))
+        assert result == [i * 1001.0 for i in range(10)]
+        assert store.n_spilled > 0
+        assert os.listdir(store.directory) == []
+
+
+def test_window():
+    # without a window, every `block_sum` is sent out as soon as its block
+    # is made, and needs it in memory
+    xs = [block_sum(make_block(i, 1000)) for i in range(20)]
+    with ResultStore(memory_budget=20000) as store:
+        result = Scheduler(result_store=store, window=2).run(
+            Queue() >> worker, get_workflow(gather(*xs)))
+        assert result == [i * 1000 for i in range(20)]
+        assert store.n_spilled > 0
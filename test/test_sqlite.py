@@ -1,14 +1,27 @@
-# import pytest
+import multiprocessing
 
-from noodles.prov.sqlite import JobDB
-from noodles import serial
+import pytest
+
+from noodles.prov.sqlite import (JobDB, wal_pragmas)
+from noodles.prov.cache import (ProvCache)
+from noodles import (serial, gather)
 from noodles.tutorial import (sub, add)
+from noodles.run.threading.sqlite3 import (run_parallel)
 from noodles.run.scheduler import Job
 from noodles.run.messages import (ResultMessage)
 
+try:
+    import numpy as np
+    from noodles.serial.numpy import arrays_to_string
+except ImportError:
+    has_numpy = False
+else:
+    has_numpy = True
+
 
-def test_add_job():
-    db = JobDB(':memory:', registry=serial.base)
+@pytest.mark.parametrize('write_behind', [False, True])
+def test_add_job(write_behind):
+    db = JobDB(':memory:', registry=serial.base, write_behind=write_behind)
 
     wf = sub(1, 1)
     job = Job(wf._workflow, wf._workflow.root)
@@ -25,8 +38,9 @@ def test_add_job():
     assert result.value == 0
 
 
-def test_attaching():
-    db = JobDB(':memory:', registry=serial.base)
+@pytest.mark.parametrize('write_behind', [False, True])
+def test_attaching(write_behind):
+    db = JobDB(':memory:', registry=serial.base, write_behind=write_behind)
 
     wf = add(1, 1)
     job = Job(wf._workflow, wf._workflow.root)
@@ -45,3 +59,169 @@ def test_attaching():
     msg, result = db.add_job_to_db(key3, node3)
     assert msg == 'retrieved'
     assert result.value == 2
+
+
+def test_write_behind(tmpdir):
+    path = str(tmpdir.join('cache.db'))
+    wf = sub(5, 3)
+    job = Job(wf._workflow, wf._workflow.root)
+
+    with JobDB(path, registry=serial.base, write_behind=True,
+               commit_interval=0.01) as db:
+        keys = []
+        for _ in range(10):
+            key, node = db.register(job)
+            db.add_job_to_db(key, node)
+            keys.append(key)
+        db.store_result_in_db(ResultMessage(keys[0], 'done', 2, None))
+        assert db.get_result(keys[0]) == 2
+        db.flush()
+        assert len(db.list_jobs()) == 10
+
+    with JobDB(path, registry=serial.base, write_behind=True) as db:
+        key, node = db.register(job)
+        assert key > keys[-1]
+        msg, result = db.add_job_to_db(key, node)
+        assert msg == 'retrieved'
+        assert result.value == 2
+
+
+def run_session(args):
+    path, offset = args
+    wf = gather(*(add(i, 1) for i in range(offset, offset + 100)))
+    return run_parallel(
+        wf, n_threads=2, registry=serial.base, db_file=path,
+        echo_log=False, always_cache=True, pragmas=wal_pragmas)
+
+
+def test_concurrent_sessions(tmpdir):
+    """Stress test: overlapping workflows in several processes at once,
+    sharing one database."""
+    path = str(tmpdir.join('cache.db'))
+    offsets = [25 * i for i in range(8)]
+
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        results = pool.map(run_session, [(path, i) for i in offsets])
+
+    for offset, result in zip(offsets, results):
+        assert result == [i + 1 for i in range(offset, offset + 100)]
+
+    with JobDB(path, registry=serial.base, pragmas=wal_pragmas) as db:
+        wf = add(0, 1)
+        key, node = db.register(Job(wf._workflow, wf._workflow.root))
+        msg, result = db.add_job_to_db(key, node)
+        assert msg == 'retrieved'
+        assert result.value == 1
+
+
+def test_prov_cache(tmpdir):
+    path = str(tmpdir.join('cache.db'))
+
+    def run(db, wf):
+        key, node = db.register(Job(wf._workflow, wf._workflow.root))
+        return key, db.add_job_to_db(key, node)
+
+    with JobDB(path, registry=serial.base) as db:
+        key, (msg, _) = run(db, add(1, 2))
+        assert msg == 'initialized'
+        db.store_result_in_db(ResultMessage(key, 'done', 3, None))
+        assert db.cache.stats()['negatives'] == 1
+
+    with JobDB(path, registry=serial.base) as db:
+        assert db.cache.stats()['bloom_keys'] == 1
+        for _ in range(3):
+            _, (msg, result) = run(db, add(1, 2))
+            assert msg == 'retrieved'
+            assert result.value == 3
+        _, (msg, _) = run(db, add(2, 2))
+        assert msg == 'initialized'
+
+        stats = db.cache.stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] == 2
+        assert stats['negatives'] == 1
+
+    with JobDB(path, registry=serial.base, cache=False) as db:
+        _, (msg, result) = run(db, add(1, 2))
+        assert msg == 'retrieved'
+        assert db.cache is None
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_result_blobs(tmpdir, compress):
+    path = str(tmpdir.join('cache.db'))
+    value = list(range(1000))
+
+    with JobDB(path, registry=serial.base, compress=compress,
+               cache=False) as db:
+        for i in range(3):
+            wf = add(i, 1)
+            key, node = db.register(Job(wf._workflow, wf._workflow.root))
+            db.add_job_to_db(key, node)
+            db.store_result_in_db(ResultMessage(key, 'done', value, None))
+            assert db.get_result(key) == value
+
+        wf = add(10, 1)
+        key, node = db.register(Job(wf._workflow, wf._workflow.root))
+        db.add_job_to_db(key, node)
+        db.store_result_in_db(ResultMessage(key, 'done', 11, None))
+
+        db.flush()
+        assert db.connection.execute(
+            'select count(*) from "results"').fetchone()[0] == 1
+        results = [r for r, in db.connection.execute(
+            'select "result" from "jobs" order by "id"')]
+        assert all(r.startswith('sha256:') for r in results[:3])
+        assert results[3] == '11'
+
+    with JobDB(path, registry=serial.base, cache=False) as db:
+        wf = add(2, 1)
+        key, node = db.register(Job(wf._workflow, wf._workflow.root))
+        msg, result = db.add_job_to_db(key, node)
+        assert msg == 'retrieved'
+        assert result.value == value
+
+
+@pytest.mark.skipif(not has_numpy, reason="NumPy needed.")
+def test_list_jobs_arrays():
+    db = JobDB(':memory:', registry=lambda: serial.base() + arrays_to_string())
+    wf = add(np.arange(5), 1)
+    job = Job(wf._workflow, wf._workflow.root)
+    key, node = db.register(job)
+    db.add_job_to_db(key, node)
+
+    # the arguments are stored in full, not by their content hash
+    x = db.list_jobs()[key].bound_args.arguments['x']
+    assert isinstance(x, np.ndarray)
+    assert np.all(x == np.arange(5))
+
+
+def test_prov_cache_concurrent(tmpdir):
+    path = str(tmpdir.join('cache.db'))
+
+    def run(db, wf):
+        key, node = db.register(Job(wf._workflow, wf._workflow.root))
+        return key, db.add_job_to_db(key, node)
+
+    with JobDB(path, registry=serial.base, pragmas=wal_pragmas) as db1, \
+            JobDB(path, registry=serial.base, pragmas=wal_pragmas,
+                  cache=ProvCache(refresh_interval=3600)) as db2:
+        for i in range(3):
+            key, _ = run(db1, add(i, 2))
+            db1.store_result_in_db(ResultMessage(key, 'done', i + 2, None))
+        db1.flush()
+
+        # the filter of db2 doesn't know the results yet
+        assert not db2.cache.may_contain(db1.rows[key].prov)
+        _, (msg, result) = run(db2, add(2, 2))
+        assert msg == 'retrieved'
+        assert result.value == 4
+
+        # a refresh only reads the results stored since the last one
+        assert db2.cache.stats()['bloom_keys'] == 1
+        db2.cache.refresh_interval = 0
+        db2.last_stored = 1
+        _, (msg, _) = run(db2, add(5, 2))
+        assert msg == 'initialized'
+        assert db2.cache.stats()['bloom_keys'] == 2
+        assert db2.last_stored == 3